@@ -1,5 +1,7 @@
 #!/bin/bash
 declare -r num_client=1
+# clients started together record their rates under one results store run
+declare -r run_id=influx_insert_line_protocol-$(date +%Y%m%dT%H%M%S)
 # declare -r num_measurements=10000
 rm data*
 rm system_info
@@ -7,7 +9,7 @@ rm system_info
 for i in $(seq 1 $num_client)
 do
    echo "Running # $i"
-   (pypy ./influx_insert_line_protocol.py --port 8086 --client_num $i >> data.txt) &
+   (pypy ./influx_insert_line_protocol.py --port 8086 --client_num $i --run_id $run_id >> data.txt) &
 
    if (($i % $num_client == 0 ));
       then wait;
@@ -23,4 +25,4 @@ echo "Read system info..."
 python ./influxdb_system_info_parser.py
 
 echo "Calculate total insert rate..."
-python ./calculate_sum.py
+python ./calculate_sum.py --run_id $run_id
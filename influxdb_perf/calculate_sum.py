@@ -1,5 +1,8 @@
+import argparse
 import re
 
+import results_store
+
 
 def parse_data(path):
     try:
@@ -21,4 +24,36 @@ def parse_data(path):
     print "results = {}".format(results)
     print "sum_result = {}".format(sum_result)
 
-parse_data('/home/blank/python_repos/monasca-perf/influxdb_perf/data.txt')
+
+def sum_run(run_id=None, tool='influx_insert_line_protocol', path=results_store.RESULTS_FILENAME):
+    """Sum the per client insert rates recorded under one run, the latest run of tool by default."""
+    records = results_store.load(path)
+    if not run_id:
+        found = results_store.runs(records, tool)
+        if not found:
+            print "no {} runs in {}".format(tool, path)
+            return
+        run_id = found[-1][0]
+    for metric in ('measurements_per_sec', 'goodput_per_sec'):
+        results = [sample for record in records
+                   if record['run_id'] == run_id and record['metric'] == metric
+                   for sample in record['samples']]
+        print "run {} {}: results = {}".format(run_id, metric, results)
+        print "sum_result = {}".format(sum(results))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='total insert rate of the clients of one run')
+    parser.add_argument('--run_id', type=str, required=False, default=None,
+                        help='results store run id, the latest insert run by default')
+    parser.add_argument('--data', type=str, required=False, default=None,
+                        help='scrape a client output log instead of the results store')
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = parse_args()
+    if args.data:
+        parse_data(args.data)
+    else:
+        sum_run(args.run_id)
@@ -0,0 +1,282 @@
+import argparse
+import datetime
+import re
+import sys
+import time
+
+from influxdb import InfluxDBClient
+
+import influx_query_test
+import influx_stats
+import influxdb_definition_filler
+import query_bench
+import results_store
+
+""" downsampling_benchmark
+    Measures both sides of pre-aggregating the filler dataset into rollups.
+    Each cell refills a fresh database: a 'raw' cell with no rollups, then
+    one cell per resolution whose rollup retention policy is kept up either
+    by a continuous query running during the fill (mode continuous) or by one
+    SELECT INTO over the filled range afterwards (mode select_into). The cost
+    is the influxd CPU and time spent on top of the raw cell; the benefit is
+    the statistics queries of influx_query_test rerun against the rollups.
+
+    A continuous query only fires at interval boundaries, and one that ran
+    during the fill missed history written after it. So after the fill the
+    benchmark waits for the next boundary, whose RESAMPLE pass covers the
+    whole fill, when that is at most --max_cq_wait away. Otherwise it runs the
+    same pass itself with SELECT INTO. The filler writes vms that are still
+    running past now, which no rollup covers yet, so the rollup is built and
+    checked only up to the last resolution boundary. A cell whose rollup does
+    not count every raw point before that boundary fails instead of reporting
+    a speedup.
+"""
+
+DATABASE_NAME = influxdb_definition_filler.DATABASE_NAME
+RAW_POLICY = 'autogen'
+
+ROLLUP_MODES = ['continuous', 'select_into']
+RESOLUTIONS = '5m,1h'
+
+# Monasca statistics kept per rollup interval, as rollup field -> aggregate of the raw value
+ROLLUP_FIELDS = [('max', 'max(value)'),
+                 ('min', 'min(value)'),
+                 ('sum', 'sum(value)'),
+                 ('count', 'count(value)')]
+# statistic over raw values -> the same statistic over the rollup fields
+ROLLUP_REWRITES = {'max': 'max("max")',
+                   'min': 'min("min")',
+                   'sum': 'sum("sum")',
+                   'count': 'sum("count")'}
+
+RAW_AGGREGATE = re.compile(r'\b(max|min|sum|count)\(value\)', re.IGNORECASE)
+FROM_MEASUREMENT = re.compile(r'(FROM\s+)("[^"]+")', re.IGNORECASE)
+
+# seconds to wait after the fill so the cache is snapshotted to TSM before sizing
+SETTLE_TIME = 30
+# longest wait for a continuous query boundary before catching up with SELECT INTO instead
+MAX_CQ_WAIT = 600
+
+DURATION_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+
+
+def rollup_policy(resolution):
+    return 'rollup_{}'.format(resolution)
+
+
+def duration_seconds(resolution):
+    return int(resolution[:-1]) * DURATION_UNITS[resolution[-1]]
+
+
+def seconds_to_boundary(resolution):
+    """Seconds until the next epoch aligned multiple of resolution, when a continuous query fires."""
+    interval = duration_seconds(resolution)
+    return interval - time.time() % interval
+
+
+def last_boundary(resolution):
+    """The latest epoch aligned multiple of resolution, the end of the last whole rollup interval."""
+    interval = duration_seconds(resolution)
+    now = int(time.time())
+    return datetime.datetime.utcfromtimestamp(now - now % interval)
+
+
+def influx_time(timestamp):
+    return "'{}Z'".format(timestamp.strftime('%Y-%m-%dT%H:%M:%S'))
+
+
+def raw_point_count(client, end_timestamp):
+    query = 'SELECT count(value) FROM "{0}"."{1}"./.*/ WHERE time < {2}'.format(
+        DATABASE_NAME, RAW_POLICY, influx_time(end_timestamp))
+    return sum(point['count'] for point in client.query(query).get_points())
+
+
+def rollup_point_count(client, resolution, end_timestamp):
+    """Raw points the rollup accounts for before end_timestamp, the sum of its count field."""
+    query = 'SELECT sum("count") FROM "{0}"."{1}"./.*/ WHERE time < {2}'.format(
+        DATABASE_NAME, rollup_policy(resolution), influx_time(end_timestamp))
+    return sum(point['sum'] or 0 for point in client.query(query).get_points())
+
+
+def rollup_select(resolution, where=''):
+    fields = ', '.join('{0} AS "{1}"'.format(aggregate, field) for field, aggregate in ROLLUP_FIELDS)
+    return 'SELECT {0} INTO "{1}"."{2}".:MEASUREMENT FROM "{1}"."{3}"./.*/ {4}GROUP BY time({5}), *'.format(
+        fields, DATABASE_NAME, rollup_policy(resolution), RAW_POLICY, where, resolution)
+
+
+def statistics_queries():
+    """The influx_query_test queries that aggregate raw values and can be answered by a rollup."""
+    return [(name, query) for name, query in influx_query_test.QUERIES
+            if RAW_AGGREGATE.search(query) and 'group by *' not in query.lower()]
+
+
+def rollup_query(query, resolution):
+    query = RAW_AGGREGATE.sub(lambda m: ROLLUP_REWRITES[m.group(1).lower()], query)
+    return FROM_MEASUREMENT.sub(r'\1"{0}"."{1}".\2'.format(DATABASE_NAME, rollup_policy(resolution)),
+                                query, count=1)
+
+
+def create_database(client, resolution, mode, days_to_fill):
+    client.drop_database(DATABASE_NAME)
+    client.create_database(DATABASE_NAME)
+    if resolution is None:
+        return
+    client.query('CREATE RETENTION POLICY "{0}" ON "{1}" DURATION INF REPLICATION 1'.format(
+        rollup_policy(resolution), DATABASE_NAME))
+    if mode == 'continuous':
+        # the filler writes history, so the query has to resample the whole filled range
+        client.query('CREATE CONTINUOUS QUERY "cq_{0}" ON "{1}" RESAMPLE EVERY {0} FOR {2}d '
+                     'BEGIN {3} END'.format(resolution, DATABASE_NAME, days_to_fill + 1,
+                                            rollup_select(resolution)))
+
+
+def build_rollup(client, resolution, base_timestamp, end_timestamp):
+    """Aggregate what was written from base_timestamp to end_timestamp, returns (seconds, influxd cpu seconds)."""
+    cpu_before = influx_stats.influxd_cpu_seconds()
+    start_time = time.time()
+    client.query(rollup_select(resolution, 'WHERE time >= {0} AND time < {1} '.format(
+        influx_time(base_timestamp), influx_time(end_timestamp))))
+    elapsed = time.time() - start_time
+    cpu_after = influx_stats.influxd_cpu_seconds()
+    return elapsed, cpu_after - cpu_before if cpu_before is not None else None
+
+
+def bench_queries(queries, iterations):
+    results = query_bench.run_catalogue(queries, influx_query_test.bench_query, 1, iterations)
+    return dict((r['name'], r) for r in results)
+
+
+def run_cell(client, resolution, mode, days_to_fill, iterations, max_cq_wait=MAX_CQ_WAIT):
+    print("\n-- {} ------------------".format(rollup_policy(resolution) if resolution else 'raw'))
+    create_database(client, resolution, mode, days_to_fill)
+
+    base_timestamp = datetime.datetime.utcnow() - datetime.timedelta(days=days_to_fill)
+    cpu_before = influx_stats.influxd_cpu_seconds()
+    stats, elapsed = influxdb_definition_filler.fill_metrics(
+        base_timestamp, days_to_fill,
+        influxdb_definition_filler.NEW_VMS_PER_HOUR,
+        influxdb_definition_filler.VMS_BELOW_PROBATION)
+    catch_up = False
+    if mode == 'continuous' and resolution:
+        wait = seconds_to_boundary(resolution)
+        if wait <= max_cq_wait:
+            # the first pass after the fill resamples everything it wrote
+            print("waiting {0:.0f} secs for the continuous query to fire".format(wait))
+            time.sleep(wait + SETTLE_TIME)
+        else:
+            catch_up = True
+    # the continuous query resampled up to the boundary it fired at, a SELECT INTO stops at the same
+    end_timestamp = last_boundary(resolution) if resolution else None
+    cpu_after = influx_stats.influxd_cpu_seconds()
+
+    result = {'cell': rollup_policy(resolution) if resolution else 'raw',
+              'fill_sec': elapsed,
+              'goodput': stats.points_accepted / elapsed,
+              'fill_cpu_sec': cpu_after - cpu_before if cpu_before is not None else None,
+              'rollup_sec': 0.0,
+              'rollup_cpu_sec': 0}
+    if resolution and (mode == 'select_into' or catch_up):
+        result['rollup_sec'], result['rollup_cpu_sec'] = build_rollup(
+            client, resolution, base_timestamp, end_timestamp)
+
+    time.sleep(SETTLE_TIME)
+    result['disk_bytes'] = influx_stats.snapshot(db=DATABASE_NAME)['shard.diskBytes']
+
+    if resolution:
+        raw_points = raw_point_count(client, end_timestamp)
+        rollup_points = rollup_point_count(client, resolution, end_timestamp)
+        if not rollup_points or rollup_points < raw_points:
+            result['error'] = 'rollup covers {0} of {1} raw points'.format(rollup_points, raw_points)
+            print("FAILED: {}".format(result['error']))
+            return result
+
+    queries = statistics_queries()
+    result['raw_queries'] = bench_queries(queries, iterations)
+    if resolution:
+        result['rollup_queries'] = bench_queries(
+            [(name, rollup_query(query, resolution)) for name, query in queries], iterations)
+    return result
+
+
+def cpu_cost(cell, raw):
+    if cell['fill_cpu_sec'] is None or raw['fill_cpu_sec'] is None:
+        return None
+    return cell['fill_cpu_sec'] - raw['fill_cpu_sec'] + (cell['rollup_cpu_sec'] or 0)
+
+
+def print_report(results):
+    raw = results[0]
+    print("\n{:<16}| {:>10} | {:>12} | {:>12} | {:>12} | {:>12} | {:>14}".format(
+        "CELL", "fill sec", "goodput/s", "influxd cpu", "rollup sec", "extra cpu", "disk bytes"))
+    print("-" * 106)
+    for r in results:
+        extra = cpu_cost(r, raw)
+        print("{:<16}| {:>10.1f} | {:>12.0f} | {:>12} | {:>12.1f} | {:>12} | {:>14}".format(
+            r['cell'], r['fill_sec'], r['goodput'],
+            r['fill_cpu_sec'] if r['fill_cpu_sec'] is not None else 'n/a', r['rollup_sec'],
+            extra if extra is not None else 'n/a', r['disk_bytes']))
+
+    print("\n{:<16}| {:<60}| {:>10} | {:>10} | {:>8}".format(
+        "CELL", "STATISTICS QUERY (warm median sec)", "raw", "rollup", "speedup"))
+    print("-" * 116)
+    for r in results[1:]:
+        if 'error' in r:
+            print("{:<16}| FAILED: {}".format(r['cell'], r['error']))
+            continue
+        for name, raw_result in sorted(r['raw_queries'].items()):
+            rollup_result = r['rollup_queries'][name]
+            if not raw_result['warm']['count'] or not rollup_result['warm']['count']:
+                print("{:<16}| {:<60}| FAILED: {}".format(
+                    r['cell'], name[:60], rollup_result.get('error') or raw_result.get('error')))
+                continue
+            raw_median = raw_result['warm']['median']
+            rollup_median = rollup_result['warm']['median']
+            print("{:<16}| {:<60}| {:>10.3f} | {:>10.3f} | {:>7.1f}x".format(
+                r['cell'], name[:60], raw_median, rollup_median,
+                raw_median / rollup_median if rollup_median else 0.0))
+
+
+def main():
+    args = parse_args()
+    client = InfluxDBClient('localhost', 8086, 'root', 'root', DATABASE_NAME)
+
+    results = [run_cell(client, None, args.mode, args.days, args.iterations)]
+    for resolution in args.resolutions.split(','):
+        results.append(run_cell(client, resolution, args.mode, args.days, args.iterations,
+                                args.max_cq_wait))
+
+    print_report(results)
+    run = results_store.ResultsRun('downsampling_benchmark',
+                                   {'resolutions': args.resolutions, 'mode': args.mode,
+                                    'days': args.days},
+                                   results_store.influx_version())
+    for r in results:
+        run.add(r['cell'] + ' fill', 'goodput_per_sec', r['goodput'])
+        for source in ('raw_queries', 'rollup_queries'):
+            for name, query_result in r.get(source, {}).items():
+                run.add('{0} {1} | {2}'.format(r['cell'], source.split('_')[0], name), 'latency_sec',
+                        query_result['timings'])
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='benchmark the ingest cost and query benefit of downsampled rollups')
+    parser.add_argument('--resolutions', type=str, required=False, default=RESOLUTIONS,
+                        help='comma separated rollup intervals')
+    parser.add_argument('--mode', type=str, required=False, default='select_into',
+                        choices=ROLLUP_MODES,
+                        help='keep rollups up with a continuous query during the fill, '
+                             'or build them with SELECT INTO after it')
+    parser.add_argument('--days', type=int, required=False,
+                        default=influxdb_definition_filler.DAYS_TO_FILL,
+                        help='days of history to fill, ending now')
+    parser.add_argument('--max_cq_wait', type=int, required=False, default=MAX_CQ_WAIT,
+                        help='longest wait, in seconds, for a continuous query boundary after the '
+                             'fill before catching up with SELECT INTO')
+    parser.add_argument('--iterations', type=int, required=False,
+                        default=query_bench.TIMED_ITERATIONS,
+                        help='timed iterations per statistics query')
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    sys.exit(main())
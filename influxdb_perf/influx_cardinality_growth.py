@@ -0,0 +1,143 @@
+import argparse
+import csv
+import subprocess
+import sys
+import time
+
+from influxdb import InfluxDBClient
+
+import influx_stats
+import results_store
+from influx_writer import InfluxWriter
+
+""" influx_cardinality_growth
+    Writes steadily while adding new series at a controlled rate and samples
+    series cardinality, write rate and influxd RSS at each checkpoint, giving a
+    throughput vs cardinality curve for the index.
+"""
+
+MEASUREMENT_NAME = 'cardinality.test'
+
+BATCH_SIZE = 5000
+NUMBER_OF_BATCHES = 2000
+# new series introduced by every batch, the rest of the batch rewrites existing series
+NEW_SERIES_PER_BATCH = 500
+CHECKPOINT_EVERY = 20
+
+CURVE_FILENAME = './cardinality_curve.csv'
+
+
+def series_key(series_num):
+    return '{0},zone=nova,service=compute,component=vm,cloud_name=monasca,' \
+           'resource_id=res_{1},hostname=host_{2}'.format(MEASUREMENT_NAME, series_num,
+                                                          series_num / 250)
+
+
+def get_cardinality(client, host, port, db_name):
+    try:
+        result = client.query('SHOW SERIES CARDINALITY', database=db_name)
+        points = list(result.get_points())
+        if points:
+            return points[0].values()[0]
+    except Exception:
+        pass
+    # older servers have no SHOW SERIES CARDINALITY, fall back on the index stats
+    return influx_stats.snapshot(host, port, db=db_name)['database.numSeries']
+
+
+def get_influxd_rss(host, port):
+    """RSS in KB of a local influxd, or the runtime's Sys bytes / 1024 if not local."""
+    try:
+        output = subprocess.check_output(['ps', '-C', 'influxd', '-o', 'rss='])
+        return sum(int(line) for line in output.split())
+    except (subprocess.CalledProcessError, OSError, ValueError):
+        return influx_stats.snapshot(host, port)['memstats.Sys'] / 1024
+
+
+def main(host='localhost', port=8086, batch_size=BATCH_SIZE, batches=NUMBER_OF_BATCHES,
+         new_series_per_batch=NEW_SERIES_PER_BATCH, checkpoint_every=CHECKPOINT_EVERY,
+         output=CURVE_FILENAME):
+    print("influxDB cardinality growth test start-------------")
+    db_name = 'monasca'
+    client = InfluxDBClient(host, port, 'root', 'root', db_name)
+    client.create_database(db_name)
+    writer = InfluxWriter(host, port, db_name)
+
+    curve_file = open(output, 'w')
+    curve = csv.writer(curve_file)
+    curve.writerow(['elapsed_sec', 'series_written', 'cardinality', 'points_per_sec',
+                    'goodput_per_sec', 'influxd_rss_kb'])
+
+    total_series = 0
+    value = 0
+    start_time = time.time()
+    checkpoint_time = start_time
+    checkpoint_sent = 0
+    checkpoint_accepted = 0
+    for i in xrange(batches):
+        timestamp = int(time.time() * 1000000000)
+        batch_set = []
+        for j in xrange(new_series_per_batch):
+            batch_set.append('{0} value={1} {2}'.format(series_key(total_series), value, timestamp))
+            total_series += 1
+            value += 1
+        # existing series can appear more than once per batch, so offset the
+        # timestamps to keep every point distinct
+        for j in xrange(batch_size - new_series_per_batch):
+            batch_set.append('{0} value={1} {2}'.format(series_key(j % max(total_series, 1)),
+                                                        value, timestamp + j))
+            value += 1
+        writer.write(batch_set)
+
+        if (i + 1) % checkpoint_every == 0 or i + 1 == batches:
+            now = time.time()
+            interval = now - checkpoint_time
+            row = [round(now - start_time, 2),
+                   total_series,
+                   get_cardinality(client, host, port, db_name),
+                   round((writer.stats.points_sent - checkpoint_sent) / interval, 2),
+                   round((writer.stats.points_accepted - checkpoint_accepted) / interval, 2),
+                   get_influxd_rss(host, port)]
+            curve.writerow(row)
+            curve_file.flush()
+            print("cardinality = {0[2]}, measurements per sec = {0[3]}, rss = {0[5]} KB".format(row))
+            checkpoint_time = time.time()
+            checkpoint_sent = writer.stats.points_sent
+            checkpoint_accepted = writer.stats.points_accepted
+
+    writer.flush()
+    curve_file.close()
+    elapsed = time.time() - start_time
+    writer.stats.report(elapsed)
+    run = results_store.ResultsRun('influx_cardinality_growth',
+                                   {'batch_size': batch_size, 'batches': batches,
+                                    'new_series_per_batch': new_series_per_batch},
+                                   results_store.influx_version(host, port))
+    run.add_write_stats('cardinality growth', writer.stats, elapsed)
+    print("throughput vs cardinality curve written to {}".format(output))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='measure InfluxDB write throughput as series cardinality grows')
+    parser.add_argument('--host', type=str, required=False, default='localhost',
+                        help='hostname of InfluxDB http API')
+    parser.add_argument('--port', type=int, required=False, default=8086,
+                        help='port of InfluxDB http API')
+    parser.add_argument('--batch_size', type=int, required=False, default=BATCH_SIZE,
+                        help='points per write')
+    parser.add_argument('--batches', type=int, required=False, default=NUMBER_OF_BATCHES,
+                        help='number of writes')
+    parser.add_argument('--new_series_per_batch', type=int, required=False,
+                        default=NEW_SERIES_PER_BATCH, help='new series added by each write')
+    parser.add_argument('--checkpoint_every', type=int, required=False, default=CHECKPOINT_EVERY,
+                        help='writes between samples')
+    parser.add_argument('--output', type=str, required=False, default=CURVE_FILENAME,
+                        help='csv file for the curve')
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = parse_args()
+    main(host=args.host, port=args.port, batch_size=args.batch_size, batches=args.batches,
+         new_series_per_batch=args.new_series_per_batch, checkpoint_every=args.checkpoint_every,
+         output=args.output)
@@ -5,8 +5,11 @@ import subprocess
 import uuid
 
 from influxdb import InfluxDBClient
+from influx_writer import InfluxWriter
 from datetime import datetime
 
+import results_store
+
 NUMBER_OF_MEASUREMENTS = 2000000
 NUMBER_OF_UNIQUE_METRICS = 1000
 NUMBER_PER_BATCH = 5000
@@ -46,6 +49,7 @@ def main(host='localhost', port=8086, client_num=1):
 
     print "Switch user: {}".format(db_user)
     client.switch_user(db_user, db_user_password)
+    writer = InfluxWriter(host, port, db_name, db_user, db_user_password, precision='ms')
 
     # INSERT
     print "Write points: batch_size = {0}".format(NUMBER_PER_BATCH)
@@ -77,8 +81,8 @@ def main(host='localhost', port=8086, client_num=1):
                         'metric_id="{3}"'.format(metric_name, host_name, value, str(metric_id))
             batch_set.append(line_body)
             metric_count += 1
-        client.write_points(batch_set, batch_size=NUMBER_PER_BATCH,
-                            time_precision='ms', protocol='line')
+        writer.write(batch_set)
+    writer.flush()
     end_time = datetime.utcnow()
     elapsed = end_time - start_time
     if running_recording:
@@ -86,6 +90,12 @@ def main(host='localhost', port=8086, client_num=1):
     # Calculate Insert Rate
     print "elapsed time: {0}".format(str(elapsed))
     print "measurements per sec: {0}".format(str(float(NUMBER_OF_MEASUREMENTS) / elapsed.seconds))
+    writer.stats.report(elapsed.total_seconds())
+    run = results_store.ResultsRun('influx_insert_json_protocol',
+                                   {'client_num': client_num, 'measurements': NUMBER_OF_MEASUREMENTS,
+                                    'batch_size': NUMBER_PER_BATCH},
+                                   results_store.influx_version(host, port))
+    run.add_write_stats('json protocol insert', writer.stats, elapsed.total_seconds())
 
 
 def parse_args():
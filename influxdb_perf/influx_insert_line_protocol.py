@@ -1,6 +1,7 @@
 import argparse
 import datetime
 import hashlib
+import json
 import os
 import subprocess
 import time
@@ -8,6 +9,9 @@ import uuid
 
 from collections import defaultdict
 from influxdb import InfluxDBClient
+import influx_stats
+import influx_writer
+import results_store
 
 NUMBER_OF_MEASUREMENTS = 2000000
 NUMBER_PER_BATCH = 5000
@@ -16,12 +20,17 @@ NUMBER_OF_HOSTS = 10
 TENANT_ID = 'tenant_1'
 REGION = 'region_1'
 
+# per metric counts written by this client, read by influx_verify_insert_data
+EXPECTED_COUNTS_FILENAME = './expected_counts_client_{}.json'
 
-def main(host='localhost', port=8086, client_num=1):
+
+def main(host='localhost', port=8086, client_num=1, transport='http', udp_port=influx_writer.UDP_PORT,
+         run_id=None):
     print("influxDB test start-------------")
     print "host = {}".format(host)
     print "port = {}".format(port)
     print("LINE PROTOCOL")
+    print "transport = {}".format(transport)
 
     hostnames = []
     for i in xrange(0, NUMBER_OF_HOSTS):
@@ -47,12 +56,17 @@ def main(host='localhost', port=8086, client_num=1):
 
     print "Switch user: {}".format(db_user)
     client.switch_user(db_user, db_user_password)
+    writer = influx_writer.get_writer(transport, host, port, db_name, udp_port=udp_port,
+                                      username=db_user, password=db_user_password)
+    measurement_regex = 'metric_KS_{0}_.*'.format(client_num)
+    points_before = influx_stats.count_points(host, port, db_name, measurement_regex) if transport == 'udp' else 0
 
     # INSERT
     print "Write points: batch_size = {0}".format(NUMBER_PER_BATCH)
     start_timestamp = datetime.datetime.utcnow()
     print "Start time: {0}".format(start_timestamp)
     start_time = time.time()
+    start_cpu = influx_writer.cpu_time()
 
     dimension_keys_values_map = {'service': 'monitoring', 'host': 'localhost',
                                  'cloud': 'cloud_test'}
@@ -87,14 +101,34 @@ def main(host='localhost', port=8086, client_num=1):
                                                      timestamp)
             batch_set.append(line_body)
             metric_count += 1
-        client.write_points(batch_set, batch_size=NUMBER_PER_BATCH, protocol='line')
+        writer.write(batch_set)
+    writer.flush()
     end_time = time.time()
+    cpu_seconds = influx_writer.cpu_time() - start_cpu
     elapsed = end_time - start_time
     if running_recording:
         os.kill(top_process.pid, 9)
     # Calculate Insert Rate
     print "elapsed time: {0}".format(str(elapsed))
     print "measurements per sec: {0}".format(str(float(NUMBER_OF_MEASUREMENTS) / elapsed))
+    if transport == 'udp':
+        # nothing is acknowledged over udp, count what arrived to find the loss
+        print "Waiting for the udp listener to flush"
+        time.sleep(10)
+        writer.stats.reconcile(influx_stats.count_points(host, port, db_name, measurement_regex) -
+                               points_before)
+    writer.stats.report(elapsed, cpu_seconds)
+    run = results_store.ResultsRun('influx_insert_line_protocol',
+                                   {'client_num': client_num, 'transport': transport,
+                                    'measurements': NUMBER_OF_MEASUREMENTS,
+                                    'batch_size': NUMBER_PER_BATCH},
+                                   results_store.influx_version(host, port), run_id)
+    run.add_write_stats('line protocol insert', writer.stats, elapsed)
+
+    expected_counts_file = EXPECTED_COUNTS_FILENAME.format(client_num)
+    with open(expected_counts_file, 'w') as f:
+        json.dump(metric_name_dict, f)
+    print "expected counts written to {}".format(expected_counts_file)
 
 
 def parse_args():
@@ -106,8 +140,15 @@ def parse_args():
                         help='port of InfluxDB http API')
     parser.add_argument('--client_num', type=int, required=False, default=1,
                         help='client number')
+    parser.add_argument('--transport', type=str, required=False, default='http',
+                        choices=influx_writer.TRANSPORTS, help='write over http or udp')
+    parser.add_argument('--udp_port', type=int, required=False, default=influx_writer.UDP_PORT,
+                        help='port of the InfluxDB udp listener, which must write to monasca')
+    parser.add_argument('--run_id', type=str, required=False, default=None,
+                        help='results store run id, shared by clients started together')
     return parser.parse_args()
 
 if __name__ == '__main__':
     args = parse_args()
-    main(host=args.host, port=args.port, client_num=args.client_num)
+    main(host=args.host, port=args.port, client_num=args.client_num,
+         transport=args.transport, udp_port=args.udp_port, run_id=args.run_id)
@@ -1,135 +1,198 @@
+import argparse
 import json
 import requests
+import resource
 import time
 
+import query_bench
+import results_store
+
 resource_id = '0a988066-810e-4b23-a159-c733938f8614'
 timestamp = '1476546163030'
 limit = 10000
+influx_url = 'http://localhost:8086/query'
 
+TIMING_MODES = ['total', 'phases', 'chunked']
+# rows per chunk when the response is requested with chunked=true
+CHUNK_SIZE = 10000
+# bytes read per socket read when streaming a non chunked response
+READ_SIZE = 65536
 
-def main():
-    print "influxDB query test start-------------"
-    url = 'http://localhost:8086/query'
-    param = 'q=CREATE DATABASE monasca'
-    requests.get(url=url, params=param)
 
+# Named query catalogue, mirrors the query shapes in scale_perf/vertica_scale_queries.py
+QUERIES = [
     # Query Metrics
-    print("No filters query")
-    query = 'q=SHOW SERIES limit {}'.format(limit)
-    r, delta_time = run_query(query)
-    status_output(r, delta_time)
-
-    print("\nMetric-list | Name only ")
-    query = 'q=SHOW SERIES FROM "io.write_bytes_total_sec" limit {}'.format(limit)
-    r, delta_time = run_query(query)
-    status_output(r, delta_time)
-
-    print("\nMetric-list | Name and start time")
-    query = 'q=SELECT * FROM "io.write_bytes_total_sec" where time >= {} limit {}'.format(
-        timestamp, limit)
-    r, delta_time = run_query(query)
-    status_output(r, delta_time)
-
-    print("\nMetric-list | Name and resource_id (single result)")
-    query = 'q=SHOW SERIES FROM "io.write_bytes_total_sec" WHERE ' \
-            'resource_id=\'{}\' limit {}'.format(resource_id, limit)
-    r, delta_time = run_query(query)
-    status_output(r, delta_time)
-
-    print("\nMetric-list | Name and max dimensions (max results)")
-    query = 'q=SHOW SERIES FROM "io.write_bytes_total_sec" WHERE cloud_name=\'test_cloud\' and ' \
-            'cluster=\'test_cluster\' and component=\'vm\' and hostname=\'test_1200\' and ' \
-            'lifespan=\'1200\' and service=\'compute\' and zone=\'nova\' limit {}'.format(limit)
-    r, delta_time = run_query(query)
-    status_output(r, delta_time)
-
-    print("\nMetric-list | Dimensions only, resource_id (single vm results)")
-    query = 'q=SHOW SERIES WHERE resource_id=\'{}\' limit {}'.format(resource_id, limit)
-    r, delta_time = run_query(query)
-    status_output(r, delta_time)
-
-    print("\nMetric-list | Dimensions only, resource_id and device (single device result)")
-    query = 'q=SHOW SERIES WHERE resource_id=\'{}\' and ' \
-            'device=\'vs1\' limit {}'.format(resource_id, limit)
-    r, delta_time = run_query(query)
-    status_output(r, delta_time)
-
-    print("\nMetric-list | Dimensions only, device (one device over multiple vms result)")
-    query = 'q=SHOW SERIES WHERE device=\'vs1\' limit {}'.format(limit)
-    r, delta_time = run_query(query)
-    status_output(r, delta_time)
-
+    ('No filters query',
+     'SHOW SERIES limit {}'.format(limit)),
+    ('Metric-list | Name only',
+     'SHOW SERIES FROM "io.write_bytes_total_sec" limit {}'.format(limit)),
+    ('Metric-list | Name and start time',
+     'SELECT * FROM "io.write_bytes_total_sec" where time >= {} limit {}'.format(timestamp, limit)),
+    ('Metric-list | Name and resource_id (single result)',
+     'SHOW SERIES FROM "io.write_bytes_total_sec" WHERE '
+     'resource_id=\'{}\' limit {}'.format(resource_id, limit)),
+    ('Metric-list | Name and max dimensions (max results)',
+     'SHOW SERIES FROM "io.write_bytes_total_sec" WHERE cloud_name=\'test_cloud\' and '
+     'cluster=\'test_cluster\' and component=\'vm\' and hostname=\'test_1200\' and '
+     'lifespan=\'1200\' and service=\'compute\' and zone=\'nova\' limit {}'.format(limit)),
+    ('Metric-list | Dimensions only, resource_id (single vm results)',
+     'SHOW SERIES WHERE resource_id=\'{}\' limit {}'.format(resource_id, limit)),
+    ('Metric-list | Dimensions only, resource_id and device (single device result)',
+     'SHOW SERIES WHERE resource_id=\'{}\' and '
+     'device=\'vs1\' limit {}'.format(resource_id, limit)),
+    ('Metric-list | Dimensions only, device (one device over multiple vms result)',
+     'SHOW SERIES WHERE device=\'vs1\' limit {}'.format(limit)),
     # Query Measurements
-    print("\nMeasurement-list | Name only merged (non-vm metric)")
-    query = 'q=SELECT * FROM "cpu.time_ns" where time >= {} limit {}'.format(timestamp, limit)
-    r, delta_time = run_query(query)
-    status_output(r, delta_time)
-
-    print("\nMeasurement-list | Name only grouped (non-vm metric)")
-    query = 'q=SELECT * FROM "cpu.time_ns" where time >= {} group by * limit {}'.format(
-        timestamp, limit)
-    r, delta_time = run_query(query)
-    status_output(r, delta_time)
-
-    print("\nMeasurement-list | Name only merged (vm metric)")
-    query = 'q=SELECT * FROM "vm.mem.used_mb" where time >= {} limit {}'.format(timestamp, limit)
-    r, delta_time = run_query(query)
-    status_output(r, delta_time)
-
-    print("\nMeasurement-list | Name only grouped (vm metric)")
-    query = 'q=SELECT * FROM "vm.mem.used_mb" where time >= {} group by * limit {}'.format(
-        timestamp, limit)
-    r, delta_time = run_query(query)
-    status_output(r, delta_time)
-
-    print("\nMeasurement-list | Name and resource_id (single result)")
-    query = 'q=SELECT * FROM "vm.mem.used_mb" where time >= {0} and ' \
-            'resource_id=\'{1}\' limit {2}'.format(timestamp, resource_id, limit)
-    r, delta_time = run_query(query)
-    status_output(r, delta_time)
-
-    print("\nMeasurement-list | Name and max dimensions query (max results)")
-    query = 'q=SELECT * FROM "vm.mem.used_mb" where time >= {} and ' \
-            'cloud_name=\'test_cloud\' and cluster=\'test_cluster\' and component=\'vm\' and ' \
-            'hostname=\'test_1200\' and lifespan=\'1200\' and service=\'compute\' and ' \
-            'zone=\'nova\' limit {}'.format(timestamp, limit)
-    r, delta_time = run_query(query)
-    status_output(r, delta_time)
-
+    ('Measurement-list | Name only merged (non-vm metric)',
+     'SELECT * FROM "cpu.time_ns" where time >= {} limit {}'.format(timestamp, limit)),
+    ('Measurement-list | Name only grouped (non-vm metric)',
+     'SELECT * FROM "cpu.time_ns" where time >= {} group by * limit {}'.format(timestamp, limit)),
+    ('Measurement-list | Name only merged (vm metric)',
+     'SELECT * FROM "vm.mem.used_mb" where time >= {} limit {}'.format(timestamp, limit)),
+    ('Measurement-list | Name only grouped (vm metric)',
+     'SELECT * FROM "vm.mem.used_mb" where time >= {} group by * limit {}'.format(timestamp, limit)),
+    ('Measurement-list | Name and resource_id (single result)',
+     'SELECT * FROM "vm.mem.used_mb" where time >= {0} and '
+     'resource_id=\'{1}\' limit {2}'.format(timestamp, resource_id, limit)),
+    ('Measurement-list | Name and max dimensions query (max results)',
+     'SELECT * FROM "vm.mem.used_mb" where time >= {} and '
+     'cloud_name=\'test_cloud\' and cluster=\'test_cluster\' and component=\'vm\' and '
+     'hostname=\'test_1200\' and lifespan=\'1200\' and service=\'compute\' and '
+     'zone=\'nova\' limit {}'.format(timestamp, limit)),
     # Query Statistics
-    print("\nMetric-statistics | name only merged (non-vm metric)")
-    query = 'q=SELECT max(value) from "cpu.time_ns" where time >= {} limit {}'.format(
-        timestamp, limit)
-    r, delta_time = run_query(query)
-    status_output(r, delta_time)
+    ('Metric-statistics | name only merged (non-vm metric)',
+     'SELECT max(value) from "cpu.time_ns" where time >= {} limit {}'.format(timestamp, limit)),
+    ('Metric-statistics | name only merged (vm metric)',
+     'SELECT max(value) from "vm.mem.free_perc" where time >= {} limit {}'.format(timestamp, limit)),
+    ('Metric-statistics | name and resource_id (single result)',
+     'SELECT max(value) from "vm.mem.free_perc" where time >= {} and '
+     'resource_id=\'{}\' limit {}'.format(timestamp, resource_id, limit)),
+    ('Metric-statistics | name and max dimensions query (max results)',
+     'SELECT max(value) FROM "vm.mem.used_mb" where time >= {} and '
+     'cloud_name=\'test_cloud\' and cluster=\'test_cluster\' and component=\'vm\' and '
+     'hostname=\'test_1200\' and lifespan=\'1200\' and service=\'compute\' and '
+     'zone=\'nova\' limit {}'.format(timestamp, limit)),
+]
+
+
+def main(iterations=0, warmup=query_bench.WARMUP_ITERATIONS, baseline=None, timing='total'):
+    print "influxDB query test start-------------"
+    param = 'q=CREATE DATABASE monasca'
+    requests.get(url=influx_url, params=param)
+
+    if iterations:
+        runner = bench_query if timing == 'total' else bench_query_phases(timing == 'chunked')
+        results = query_bench.run_catalogue(QUERIES, runner, warmup, iterations)
+        query_bench.finish(results, baseline, {'tool': 'influx_query_test', 'limit': limit,
+                                               'timing': timing, 'url': influx_url,
+                                               'version': results_store.influx_version()})
+        return
+
+    for name, query in QUERIES:
+        print("\n{}".format(name))
+        if timing != 'total':
+            phases_output(timed_query(query, chunked=timing == 'chunked'))
+            continue
+        r, delta_time = run_query(query)
+        status_output(r, delta_time)
+
+
+def run_query(query):
+    start_time = time.time()
+    r = requests.get(url=influx_url, params={'db': 'monasca', 'q': query})
+    delta_time = time.time() - start_time
+    return r, delta_time
 
-    print("\nMetric-statistics | name only merged (vm metric)")
-    query = 'q=SELECT max(value) from "vm.mem.free_perc" where time >= {} limit {}'.format(
-        timestamp, limit)
-    r, delta_time = run_query(query)
-    status_output(r, delta_time)
 
-    print("\nMetric-statistics | name and resource_id (single result)")
-    query = 'q=SELECT max(value) from "vm.mem.free_perc" where time >= {} and ' \
-            'resource_id=\'{}\' limit {}'.format(timestamp, resource_id, limit)
+def bench_query(query):
     r, delta_time = run_query(query)
-    status_output(r, delta_time)
+    r.raise_for_status()
+    rows = 0
+    for result in r.json()['results']:
+        if 'error' in result:
+            raise Exception(result['error'])
+        for series in result.get('series', []):
+            rows += len(series.get('values', []))
+    return delta_time, len(r.content), rows
 
-    print("\nMetric-statistics | name and max dimensions query (max results)")
-    query = 'q=SELECT max(value) FROM "vm.mem.used_mb" where time >= {} and ' \
-            'cloud_name=\'test_cloud\' and cluster=\'test_cluster\' and component=\'vm\' and ' \
-            'hostname=\'test_1200\' and lifespan=\'1200\' and service=\'compute\' and ' \
-            'zone=\'nova\' limit {}'.format(timestamp, limit)
-    r, delta_time = run_query(query)
-    status_output(r, delta_time)
 
+def timed_query(query, chunked=False, chunk_size=CHUNK_SIZE):
+    """Run a query streaming the response, timing each part separately.
+
+    ttfb is the time to the first body byte (server execution), ttlb the time
+    to the last one (execution plus transfer), parse the time spent in
+    json.loads. A chunked=true response is parsed one chunk at a time, so the
+    peak buffered bytes is the largest chunk rather than the whole body.
+    maxrss_growth_kb is how far the query pushed the process peak RSS.
+    """
+    params = {'db': 'monasca', 'q': query}
+    if chunked:
+        params['chunked'] = 'true'
+        params['chunk_size'] = chunk_size
 
-def run_query(query_param):
-    query_url = 'http://localhost:8086/query?db=monasca'
+    start_maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
     start_time = time.time()
-    r = requests.get(url=query_url, params=query_param)
-    delta_time = time.time() - start_time
-    return r, delta_time
+    r = requests.get(url=influx_url, params=params, stream=True)
+    timing = {'ttfb': None, 'parse': 0.0, 'bytes': 0, 'rows': 0, 'peak_buffer_bytes': 0,
+              'error': None}
+
+    if chunked:
+        pieces = r.iter_lines()
+    else:
+        body = []
+        for data in r.iter_content(READ_SIZE):
+            if timing['ttfb'] is None:
+                timing['ttfb'] = time.time() - start_time
+            body.append(data)
+        pieces = [''.join(body)]
+
+    for piece in pieces:
+        if timing['ttfb'] is None:
+            timing['ttfb'] = time.time() - start_time
+        if not piece:
+            continue
+        timing['bytes'] += len(piece)
+        timing['peak_buffer_bytes'] = max(timing['peak_buffer_bytes'], len(piece))
+        parse_start = time.time()
+        response = json.loads(piece)
+        timing['parse'] += time.time() - parse_start
+        for result in response.get('results', []):
+            if 'error' in result:
+                timing['error'] = result['error']
+            for series in result.get('series', []):
+                timing['rows'] += len(series.get('values', []))
+        if 'error' in response:
+            timing['error'] = response['error']
+
+    timing['total'] = time.time() - start_time
+    timing['ttlb'] = timing['total'] - timing['parse']
+    timing['ttfb'] = timing['ttfb'] or timing['ttlb']
+    timing['maxrss_growth_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - start_maxrss
+    if r.status_code != 200 and not timing['error']:
+        timing['error'] = 'HTTP {}'.format(r.status_code)
+    return timing
+
+
+def bench_query_phases(chunked):
+    def runner(query):
+        timing = timed_query(query, chunked=chunked)
+        if timing['error']:
+            raise Exception(timing['error'])
+        phases = dict((key, timing[key]) for key in ('ttfb', 'ttlb', 'parse',
+                                                     'peak_buffer_bytes', 'maxrss_growth_kb'))
+        return timing['total'], timing['bytes'], timing['rows'], phases
+    return runner
+
+
+def phases_output(timing):
+    if timing['error']:
+        print "ERROR: {}".format(timing['error'])
+        return
+    print "query_time_sec = {}".format(timing['total'])
+    print "ttfb_sec = {0:.4f}, ttlb_sec = {1:.4f}, parse_sec = {2:.4f}".format(
+        timing['ttfb'], timing['ttlb'], timing['parse'])
+    print "bytes = {0}, rows = {1}, peak_buffer_bytes = {2}, maxrss_growth_kb = {3}\n".format(
+        timing['bytes'], timing['rows'], timing['peak_buffer_bytes'], timing['maxrss_growth_kb'])
 
 
 def status_output(req, delta_time):
@@ -141,5 +204,26 @@ def status_output(req, delta_time):
         else:
             print "query_time_sec = {}\n".format(delta_time)
 
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='time the Monasca query shapes against InfluxDB')
+    parser.add_argument('--iterations', type=int, required=False, default=0,
+                        help='timed iterations per query, 0 runs each query once')
+    parser.add_argument('--warmup', type=int, required=False,
+                        default=query_bench.WARMUP_ITERATIONS,
+                        help='untimed iterations after the cold run')
+    parser.add_argument('--baseline', type=str, required=False, default=None,
+                        help='json baseline to compare against and then replace')
+    parser.add_argument('--timing', type=str, required=False, default='total',
+                        choices=TIMING_MODES,
+                        help='total wall time, or ttfb/ttlb/parse/memory phases of a '
+                             'plain or chunked=true response')
+    parser.add_argument('--url', type=str, required=False, default=influx_url,
+                        help='InfluxDB query url, point it at query_cache_proxy to measure caching')
+    return parser.parse_args()
+
 if __name__ == '__main__':
-    main()
+    args = parse_args()
+    influx_url = args.url
+    main(iterations=args.iterations, warmup=args.warmup, baseline=args.baseline,
+         timing=args.timing)
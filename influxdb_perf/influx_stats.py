@@ -0,0 +1,95 @@
+import subprocess
+
+import requests
+
+""" influx_stats
+    Snapshots of the InfluxDB /debug/vars counters used by the perf tools to
+    measure server side cost (WAL, cache and TSM compactions, disk, series).
+"""
+
+# (stat name, value) pairs summed across all matching entries in /debug/vars
+TRACKED_STATS = [('write', 'pointReq'),
+                 ('write', 'pointReqLocal'),
+                 ('tsm1_wal', 'writeOk'),
+                 ('tsm1_wal', 'currentSegmentDiskBytes'),
+                 ('tsm1_wal', 'oldSegmentsDiskBytes'),
+                 ('tsm1_cache', 'memBytes'),
+                 ('tsm1_cache', 'snapshotCount'),
+                 ('tsm1_cache', 'WALCompactionTimeMs'),
+                 ('tsm1_engine', 'cacheCompactions'),
+                 ('tsm1_engine', 'cacheCompactionDuration'),
+                 ('tsm1_engine', 'tsmLevel1Compactions'),
+                 ('tsm1_engine', 'tsmLevel2Compactions'),
+                 ('tsm1_engine', 'tsmLevel3Compactions'),
+                 ('tsm1_engine', 'tsmOptimizeCompactions'),
+                 ('tsm1_engine', 'tsmFullCompactions'),
+                 ('tsm1_filestore', 'diskBytes'),
+                 ('tsm1_filestore', 'numFiles'),
+                 ('shard', 'diskBytes'),
+                 ('shard', 'writePointsOk'),
+                 ('shard', 'writePointsDropped'),
+                 ('database', 'numSeries'),
+                 ('database', 'numMeasurements')]
+
+
+def get_debug_vars(host='localhost', port=8086):
+    r = requests.get('http://{0}:{1}/debug/vars'.format(host, port))
+    r.raise_for_status()
+    return r.json()
+
+
+def snapshot(host='localhost', port=8086, db=None):
+    """Sum the tracked counters, limited to one database when db is given.
+
+    Returns a dict keyed by 'name.value', plus 'memstats.Sys' and
+    'memstats.HeapInuse' for the influxd process.
+    """
+    debug_vars = get_debug_vars(host, port)
+    result = dict(('{0}.{1}'.format(name, value), 0) for name, value in TRACKED_STATS)
+    for entry in debug_vars.itervalues():
+        if not isinstance(entry, dict) or 'values' not in entry:
+            continue
+        tags = entry.get('tags') or {}
+        if db is not None and tags.get('database', db) != db:
+            continue
+        for name, value in TRACKED_STATS:
+            if entry.get('name') == name:
+                result['{0}.{1}'.format(name, value)] += entry['values'].get(value, 0)
+
+    memstats = debug_vars.get('memstats', {})
+    result['memstats.Sys'] = memstats.get('Sys', 0)
+    result['memstats.HeapInuse'] = memstats.get('HeapInuse', 0)
+    return result
+
+
+def count_points(host='localhost', port=8086, db='monasca', measurement_regex='.*'):
+    """Total count(value) over the measurements matching measurement_regex."""
+    r = requests.get('http://{0}:{1}/query'.format(host, port),
+                     params={'db': db,
+                             'q': 'SELECT count(value) FROM /{0}/'.format(measurement_regex)})
+    r.raise_for_status()
+    total = 0
+    for result in r.json()['results']:
+        for series in result.get('series', []):
+            total += series['values'][0][1]
+    return total
+
+
+def influxd_cpu_seconds():
+    """Cumulative user + system CPU seconds of a local influxd, None if it is not local."""
+    try:
+        output = subprocess.check_output(['ps', '-C', 'influxd', '-o', 'times='])
+        return sum(int(line) for line in output.split())
+    except (subprocess.CalledProcessError, OSError, ValueError):
+        return None
+
+
+def diff(before, after):
+    return dict((key, after.get(key, 0) - before.get(key, 0)) for key in after)
+
+
+def print_stats(stats, title=None):
+    if title:
+        print(title)
+    for key in sorted(stats):
+        print("  {0:<40} {1}".format(key, stats[key]))
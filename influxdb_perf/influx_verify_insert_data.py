@@ -1,8 +1,37 @@
 import argparse
+import json
+import os
+import re
+import time
 
 from influxdb import InfluxDBClient
+from multiprocessing.pool import ThreadPool
+
+from influx_insert_line_protocol import EXPECTED_COUNTS_FILENAME
 
 NUMBER_OF_UNIQUE_METRICS = 5000
+# measurement names counted by each regex query
+NAMES_PER_QUERY = 500
+CONCURRENT_QUERIES = 8
+
+
+def count_chunk(client, names):
+    """Count every measurement in names with a single regex FROM query."""
+    regex = '^({0})$'.format('|'.join(re.escape(name) for name in names))
+    result = client.query('SELECT count(value) FROM /{0}/'.format(regex))
+    counts = {}
+    for (measurement, tags), points in result.items():
+        for point in points:
+            counts[measurement] = point['count']
+    return counts
+
+
+def get_expected_counts(metric_name, client_num):
+    expected_counts_file = EXPECTED_COUNTS_FILENAME.format(client_num)
+    if metric_name == 'KS' and os.path.exists(expected_counts_file):
+        with open(expected_counts_file) as f:
+            return json.load(f)
+    return None
 
 
 def main(host='localhost', port=8086, metric_name='KS', num_clients=4):
@@ -19,20 +48,43 @@ def main(host='localhost', port=8086, metric_name='KS', num_clients=4):
     print "Switch user: {}".format(db_user)
     client.switch_user(db_user, db_user_password)
 
+    start_time = time.time()
+    pool = ThreadPool(CONCURRENT_QUERIES)
+
     total_measurements = 0
+    total_mismatches = 0
     for i in xrange(1, num_clients + 1):
-        measurements_per_client = 0
-        for j in xrange(NUMBER_OF_UNIQUE_METRICS):
-            query = 'SELECT count(value) FROM /metric_{0}_{1}_{2}/'.format(metric_name, i, j)
-            result = client.query(query)
-            metric_point = list(result.get_points(measurement='metric_{0}_{1}_{2}'.format(
-                metric_name, i, j)))
-            count_result = metric_point[0]['count']
-            measurements_per_client += count_result
+        expected = get_expected_counts(metric_name, i)
+        if expected is None:
+            names = ['metric_{0}_{1}_{2}'.format(metric_name, i, j)
+                     for j in xrange(NUMBER_OF_UNIQUE_METRICS)]
+        else:
+            names = sorted(expected)
+
+        chunks = [names[k:k + NAMES_PER_QUERY] for k in xrange(0, len(names), NAMES_PER_QUERY)]
+        counts = {}
+        for chunk_counts in pool.map(lambda chunk: count_chunk(client, chunk), chunks):
+            counts.update(chunk_counts)
+
+        measurements_per_client = sum(counts.itervalues())
         print "{0} measurements per client # {1} = {2}".format(
             metric_name, i, measurements_per_client)
         total_measurements += measurements_per_client
+
+        if expected is not None:
+            mismatches = [(name, expected[name], counts.get(name, 0)) for name in names
+                          if counts.get(name, 0) != expected[name]]
+            for name, expected_count, count in mismatches[:20]:
+                print "  {0}: expected {1}, found {2}".format(name, expected_count, count)
+            print "client # {0}: expected {1}, {2} metrics mismatched".format(
+                i, sum(expected.itervalues()), len(mismatches))
+            total_mismatches += len(mismatches)
+
+    pool.close()
+    pool.join()
     print "total {0} measurements = {1}".format(metric_name, total_measurements)
+    print "total mismatched metrics = {0}".format(total_mismatches)
+    print "verification time: {0:.2f} sec".format(time.time() - start_time)
 
 
 def parse_args():
@@ -0,0 +1,220 @@
+import collections
+import re
+import resource
+import socket
+import time
+
+import requests
+
+""" influx_writer
+    Line protocol writer shared by the InfluxDB perf tools.
+    Every batch goes through InfluxWriter so that points accepted, rejected
+    (partial-write 400s) and retried are counted, failed batches are held in a
+    bounded retry queue and retried with exponential backoff, and goodput can
+    be reported next to raw throughput.
+    UdpWriter sends the same batches to the UDP listener for comparison.
+"""
+
+TRANSPORTS = ['http', 'udp']
+
+# max number of failed batches held for retry before new failures are dropped
+RETRY_QUEUE_MAX = 100
+# attempts per batch before it is counted as lost
+MAX_RETRIES = 3
+# seconds before the first retry of a failed batch, doubled on every further attempt
+RETRY_BACKOFF = 1.0
+MAX_RETRY_BACKOFF = 30.0
+
+# default port of the influxd [[udp]] listener
+UDP_PORT = 8089
+# line protocol payload per datagram, fits a 1500 byte MTU after IP/UDP headers
+UDP_PAYLOAD_SIZE = 1472
+
+PARTIAL_WRITE_DROPPED = re.compile(r'dropped=(\d+)')
+
+
+def get_writer(transport='http', host='localhost', port=8086, db='monasca', udp_port=UDP_PORT,
+               **kwargs):
+    if transport == 'udp':
+        return UdpWriter(host, udp_port)
+    return InfluxWriter(host, port, db, **kwargs)
+
+
+def cpu_time():
+    """User + system CPU seconds of this process and its reaped children."""
+    usage = [resource.getrusage(resource.RUSAGE_SELF),
+             resource.getrusage(resource.RUSAGE_CHILDREN)]
+    return sum(u.ru_utime + u.ru_stime for u in usage)
+
+
+class WriteStats(object):
+    fields = ['batches', 'points_sent', 'points_accepted', 'points_rejected',
+              'points_retried', 'points_lost', 'bytes_sent', 'write_time']
+
+    def __init__(self, data=None):
+        for field in WriteStats.fields:
+            setattr(self, field, 0)
+        if data:
+            self.merge(data)
+
+    def merge(self, other):
+        if isinstance(other, WriteStats):
+            other = other.as_dict()
+        for field in WriteStats.fields:
+            setattr(self, field, getattr(self, field) + other.get(field, 0))
+        return self
+
+    def as_dict(self):
+        return dict((field, getattr(self, field)) for field in WriteStats.fields)
+
+    def reconcile(self, points_counted):
+        """Replace the write side view with the number of points found in the database.
+
+        Used for UDP where nothing is acknowledged; anything missing counts as lost.
+        """
+        self.points_accepted = points_counted
+        self.points_rejected = 0
+        self.points_lost = max(self.points_sent - points_counted, 0)
+
+    def report(self, elapsed, cpu_seconds=None):
+        elapsed = float(elapsed) or 1.0
+        print("points sent: {0}".format(self.points_sent))
+        print("points accepted: {0}".format(self.points_accepted))
+        print("points rejected: {0}".format(self.points_rejected))
+        print("points retried: {0}".format(self.points_retried))
+        print("points lost: {0}".format(self.points_lost))
+        print("raw measurements per sec: {0:.2f}".format(self.points_sent / elapsed))
+        print("goodput measurements per sec: {0:.2f}".format(self.points_accepted / elapsed))
+        if self.points_sent:
+            print("loss rate: {0:.4%}".format(
+                float(self.points_rejected + self.points_lost) / self.points_sent))
+        if cpu_seconds is not None:
+            print("client cpu sec: {0:.2f} ({1:.1%} of elapsed)".format(cpu_seconds,
+                                                                      cpu_seconds / elapsed))
+
+
+class InfluxWriter(object):
+    def __init__(self, host='localhost', port=8086, db='monasca',
+                 username=None, password=None, precision=None,
+                 retention_policy=None, retry_queue_max=RETRY_QUEUE_MAX,
+                 max_retries=MAX_RETRIES, retry_backoff=RETRY_BACKOFF):
+        self.url = 'http://{0}:{1}/write'.format(host, port)
+        self.params = {'db': db}
+        if precision:
+            self.params['precision'] = precision
+        if retention_policy:
+            self.params['rp'] = retention_policy
+        self.session = requests.Session()
+        if username:
+            self.session.auth = (username, password)
+        self.retry_queue = collections.deque()
+        self.retry_queue_max = retry_queue_max
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.stats = WriteStats()
+
+    def write(self, lines):
+        """Post one batch of line protocol strings, then retry the queued batches that are due.
+
+        Returns the number of points accepted for this batch.
+        """
+        accepted = self._post(lines, attempt=0)
+        self.retry()
+        return accepted
+
+    def retry(self):
+        """Post the queued batches whose backoff has passed, the rest stay queued."""
+        now = time.time()
+        for _ in xrange(len(self.retry_queue)):
+            lines, attempt, retry_time = self.retry_queue.popleft()
+            if retry_time > now:
+                self.retry_queue.append((lines, attempt, retry_time))
+                continue
+            self.stats.points_retried += len(lines)
+            self._post(lines, attempt)
+
+    def flush(self):
+        """Keep retrying queued batches until they succeed or run out of attempts."""
+        while self.retry_queue:
+            next_retry = min(retry_time for _, _, retry_time in self.retry_queue)
+            time.sleep(max(next_retry - time.time(), 0))
+            self.retry()
+        return self.stats
+
+    def _post(self, lines, attempt):
+        data = '\n'.join(lines)
+        if attempt == 0:
+            self.stats.batches += 1
+            self.stats.points_sent += len(lines)
+            self.stats.bytes_sent += len(data)
+
+        start_time = time.time()
+        try:
+            r = self.session.post(self.url, params=self.params, data=data)
+            status, text = r.status_code, r.text
+        except requests.exceptions.RequestException as ex:
+            status, text = None, str(ex)
+        self.stats.write_time += time.time() - start_time
+
+        if status == 204:
+            self.stats.points_accepted += len(lines)
+            return len(lines)
+
+        if status == 400:
+            # a partial write reports how many points were dropped, anything
+            # else is a parse error, either way retrying the same batch can not
+            # succeed so it is never requeued
+            dropped = PARTIAL_WRITE_DROPPED.search(text)
+            rejected = int(dropped.group(1)) if dropped else len(lines)
+            rejected = min(rejected, len(lines))
+            self.stats.points_rejected += rejected
+            self.stats.points_accepted += len(lines) - rejected
+            return len(lines) - rejected
+
+        print("write failed ({0}): {1}".format(status, text[:200]))
+        if attempt + 1 >= self.max_retries or len(self.retry_queue) >= self.retry_queue_max:
+            self.stats.points_lost += len(lines)
+        else:
+            backoff = min(self.retry_backoff * 2 ** attempt, MAX_RETRY_BACKOFF)
+            self.retry_queue.append((lines, attempt + 1, time.time() + backoff))
+        return 0
+
+
+class UdpWriter(object):
+    def __init__(self, host='localhost', port=UDP_PORT, payload_size=UDP_PAYLOAD_SIZE):
+        self.address = (host, port)
+        self.payload_size = payload_size
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.stats = WriteStats()
+
+    def write(self, lines):
+        """Pack lines into datagrams of at most payload_size bytes and send them.
+
+        UDP writes are never acknowledged, so the return value is the number of
+        points sent; use WriteStats.reconcile once the run is over.
+        """
+        self.stats.batches += 1
+        self.stats.points_sent += len(lines)
+        start_time = time.time()
+        datagram = []
+        size = 0
+        for line in lines:
+            if datagram and size + len(line) + 1 > self.payload_size:
+                self._send('\n'.join(datagram))
+                datagram = []
+                size = 0
+            datagram.append(line)
+            size += len(line) + 1
+        if datagram:
+            self._send('\n'.join(datagram))
+        self.stats.write_time += time.time() - start_time
+        return len(lines)
+
+    def flush(self):
+        return self.stats
+
+    def _send(self, data):
+        try:
+            self.stats.bytes_sent += self.sock.sendto(data, self.address)
+        except socket.error as ex:
+            print("udp send failed: {0}".format(ex))
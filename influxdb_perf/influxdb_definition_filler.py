@@ -1,3 +1,4 @@
+import argparse
 import datetime
 import gc
 import random
@@ -7,6 +8,10 @@ import sys
 import time
 import uuid
 
+import influx_stats
+import influx_writer
+import results_store
+from influx_writer import WriteStats
 from multiprocessing import Pool
 
 """ vertica_definition_filler
@@ -47,6 +52,17 @@ REGION = "Region_1"
 # Database name for influx client
 DATABASE_NAME = 'monasca'
 
+# Order in which each hour's measurements are written
+#   in_order - cycle order, as the fillers always wrote them
+#   shuffled - randomly reordered within a window of SHUFFLE_WINDOW_SECONDS
+#   late     - LATE_FRACTION of points arrive LATE_MINUTES after their timestamp
+#   backfill - hours are filled newest first so every write lands in an older shard
+INGEST_MODES = ['in_order', 'shuffled', 'late', 'backfill']
+INGEST_MODE = 'in_order'
+SHUFFLE_WINDOW_SECONDS = 300
+LATE_MINUTES = 2
+LATE_FRACTION = 0.1
+
 url = 'http://localhost:8086/query'
 param = 'q=CREATE DATABASE monasca'
 requests.get(url=url, params=param)
@@ -354,7 +370,8 @@ class vmSimulator(object):
         return meas_list
 
 
-def add_measurement_batch(active_vms, filename=MEASUREMENTS_FILENAME):
+def add_measurement_batch(active_vms, filename=MEASUREMENTS_FILENAME, ingest_mode=INGEST_MODE,
+                          transport='http'):
     meas_list = []
     while True:
         new_measurements = []
@@ -364,11 +381,38 @@ def add_measurement_batch(active_vms, filename=MEASUREMENTS_FILENAME):
             break
         meas_list.extend(new_measurements)
 
+    meas_list = order_measurements(meas_list, ingest_mode)
+
+    writer = influx_writer.get_writer(transport, 'localhost', 8086, DATABASE_NAME, precision='ms')
     for i in range(0, len(meas_list), BATCH_SIZE):
-        batch_list = meas_list[i:i+BATCH_SIZE]
-        line_protocol = '\n'.join(batch_list)
-        write_url = 'http://localhost:8086/write?db=monasca'
-        requests.post(write_url, data=line_protocol)
+        writer.write(meas_list[i:i+BATCH_SIZE])
+    return writer.flush().as_dict()
+
+
+def order_measurements(meas_list, ingest_mode):
+    """Reorder cycle ordered line protocol to simulate agent arrival order.
+
+    Each line is given an arrival time based on its timestamp (the last field)
+    and the list is stably sorted by it.
+    """
+    if ingest_mode in ('in_order', 'backfill'):
+        return meas_list
+
+    if ingest_mode == 'shuffled':
+        window = SHUFFLE_WINDOW_SECONDS * 1000
+
+        def arrival(line):
+            return int(line.rsplit(' ', 1)[1]) + random.randint(0, window)
+    elif ingest_mode == 'late':
+        delay = LATE_MINUTES * 60 * 1000
+
+        def arrival(line):
+            late = delay if random.random() < LATE_FRACTION else 0
+            return int(line.rsplit(' ', 1)[1]) + late
+    else:
+        raise ValueError("Unknown ingest mode: {}".format(ingest_mode))
+
+    return sorted(meas_list, key=arrival)
 
 
 def add_full_definition(name, dimensions, tenant_id='tenant_1', region='region_1'):
@@ -383,7 +427,8 @@ def id_generator(size=32, chars=string.hexdigits):
     return ''.join(random.choice(chars) for _ in range(size))
 
 
-def fill_metrics(base_timestamp, days_to_fill, new_vms_per_hour, vms_below_probation):
+def fill_metrics(base_timestamp, days_to_fill, new_vms_per_hour, vms_below_probation,
+                 ingest_mode=INGEST_MODE, transport='http'):
     measurement_process_pool = Pool(total_measurement_processes)
 
     vm_tenant_ids = [id_generator(ID_SIZE) for _ in range(TOTAL_VM_TENANTS)]
@@ -395,51 +440,109 @@ def fill_metrics(base_timestamp, days_to_fill, new_vms_per_hour, vms_below_proba
 
     standard_lifespan = min(churn_lifespan, available_lifespan)
 
+    points_before = influx_stats.count_points(db=DATABASE_NAME) if transport == 'udp' else 0
+
+    hours_to_fill = [(x, y) for x in xrange(days_to_fill) for y in xrange(NUMBER_OF_HOURS_PER_DAY)]
+    if ingest_mode == 'backfill':
+        hours_to_fill.reverse()
+
+    results = []
     start_time = time.time()
-    for x in xrange(days_to_fill):
-        for y in xrange(NUMBER_OF_HOURS_PER_DAY):
-            timestamp = base_timestamp + datetime.timedelta(days=x, hours=y)
-            active_vms = []
-            for z in xrange(new_vms_per_hour + vms_below_probation):
-                global next_hostname_id
-                resource_id = uuid.uuid4()
-
-                if z < vms_below_probation:
-                    lifespan_cycles = 1
-                else:
-                    lifespan_cycles = standard_lifespan
-
-                active_vms.append(vmSimulator(resource_id=resource_id,
-                                              hostname='test_' + str(next_hostname_id),
-                                              admin_tenant_id=TENANT_ID,
-                                              tenant_id=random.choice(vm_tenant_ids),
-                                              region=REGION,
-                                              created_timestamp=timestamp,
-                                              lifespan_cycles=lifespan_cycles,
-                                              seconds_per_cycle=seconds_per_cycle))
-                next_hostname_id += 1
-            global measurement_process_id
-            measurement_process_pool.apply_async(add_measurement_batch,
-                                                 args=(active_vms,
-                                                       MEASUREMENTS_FILENAME +
-                                                       str(measurement_process_id,)))
-            measurement_process_id += 1
+    start_cpu = influx_writer.cpu_time()
+    for x, y in hours_to_fill:
+        timestamp = base_timestamp + datetime.timedelta(days=x, hours=y)
+        active_vms = []
+        for z in xrange(new_vms_per_hour + vms_below_probation):
+            global next_hostname_id
+            resource_id = uuid.uuid4()
+
+            if z < vms_below_probation:
+                lifespan_cycles = 1
+            else:
+                lifespan_cycles = standard_lifespan
+
+            active_vms.append(vmSimulator(resource_id=resource_id,
+                                          hostname='test_' + str(next_hostname_id),
+                                          admin_tenant_id=TENANT_ID,
+                                          tenant_id=random.choice(vm_tenant_ids),
+                                          region=REGION,
+                                          created_timestamp=timestamp,
+                                          lifespan_cycles=lifespan_cycles,
+                                          seconds_per_cycle=seconds_per_cycle))
+            next_hostname_id += 1
+        global measurement_process_id
+        results.append(measurement_process_pool.apply_async(add_measurement_batch,
+                                                            args=(active_vms,
+                                                                  MEASUREMENTS_FILENAME +
+                                                                  str(measurement_process_id,),
+                                                                  ingest_mode,
+                                                                  transport)))
+        measurement_process_id += 1
 
     print("Waiting for measurement process pool to close")
     measurement_process_pool.close()
     measurement_process_pool.join()
 
     total_time_delta = time.time() - start_time
+    cpu_seconds = influx_writer.cpu_time() - start_cpu
     print("total time: " + str(total_time_delta) + " sec")
 
-
-def influx_db_filler():
+    stats = WriteStats()
+    for result in results:
+        try:
+            stats.merge(result.get())
+        except Exception as ex:
+            print("measurement batch failed: {}".format(ex))
+    if transport == 'udp':
+        # nothing is acknowledged over udp, count what arrived to find the loss
+        print("Waiting for the udp listener to flush")
+        time.sleep(10)
+        stats.reconcile(influx_stats.count_points(db=DATABASE_NAME) - points_before)
+    stats.report(total_time_delta, cpu_seconds)
+    return stats, total_time_delta
+
+
+def influx_db_filler(ingest_mode=INGEST_MODE, transport='http'):
     collected = gc.collect()
-    print("Creating metric history for {} days".format(DAYS_TO_FILL))
-    fill_metrics(BASE_TIMESTAMP, DAYS_TO_FILL, NEW_VMS_PER_HOUR, VMS_BELOW_PROBATION)
+    print("Creating metric history for {} days, ingest mode {}, transport {}".format(
+        DAYS_TO_FILL, ingest_mode, transport))
+    before = influx_stats.snapshot(db=DATABASE_NAME)
+    stats, elapsed = fill_metrics(BASE_TIMESTAMP, DAYS_TO_FILL, NEW_VMS_PER_HOUR, VMS_BELOW_PROBATION,
+                                  ingest_mode=ingest_mode, transport=transport)
+    after = influx_stats.snapshot(db=DATABASE_NAME)
+    run = results_store.ResultsRun('influxdb_definition_filler',
+                                   {'days': DAYS_TO_FILL, 'new_vms_per_hour': NEW_VMS_PER_HOUR,
+                                    'ingest_mode': ingest_mode, 'transport': transport},
+                                   results_store.influx_version())
+    run.add_write_stats('fill', stats, elapsed)
+    influx_stats.print_stats(influx_stats.diff(before, after),
+                             "WAL/compaction activity ({})".format(ingest_mode))
     print('Finished loading InfluxDB')
     print "collected = {}".format(collected)
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='fill InfluxDB with simulated vm metric history')
+    parser.add_argument('--ingest_mode', type=str, required=False, default=INGEST_MODE,
+                        choices=INGEST_MODES, help='order in which measurements are written')
+    parser.add_argument('--shuffle_window', type=int, required=False,
+                        default=SHUFFLE_WINDOW_SECONDS,
+                        help='seconds of data shuffled together in shuffled mode')
+    parser.add_argument('--late_minutes', type=int, required=False, default=LATE_MINUTES,
+                        help='minutes late points arrive in late mode')
+    parser.add_argument('--late_fraction', type=float, required=False, default=LATE_FRACTION,
+                        help='fraction of points arriving late in late mode')
+    parser.add_argument('--transport', type=str, required=False, default='http',
+                        choices=influx_writer.TRANSPORTS,
+                        help='write over http or udp (the udp listener must use '
+                             'database monasca and precision ms)')
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
-    sys.exit(influx_db_filler())
+    args = parse_args()
+    SHUFFLE_WINDOW_SECONDS = args.shuffle_window
+    LATE_MINUTES = args.late_minutes
+    LATE_FRACTION = args.late_fraction
+    sys.exit(influx_db_filler(ingest_mode=args.ingest_mode, transport=args.transport))
@@ -0,0 +1,184 @@
+import json
+import os
+import time
+
+import results_store
+
+""" query_bench
+    Statistical benchmark engine for named query catalogues.
+    Each query is run once cold, then for warmup + N timed (warm) iterations;
+    min/median/p95/p99 latency, response bytes and row counts are reported and
+    can be saved as a JSON baseline and compared with the previous run.
+    The warm timings of every run are also appended to the results store.
+
+    A runner is any callable taking the query and returning
+    (elapsed_seconds, response_bytes, rows); it raises on a failed query. It
+    may return a fourth element, a dict of named phase timings (for example
+    time to first byte and parse time), which are summarized the same way.
+"""
+
+WARMUP_ITERATIONS = 2
+TIMED_ITERATIONS = 10
+
+# median change, as a fraction, flagged when comparing with a baseline
+REGRESSION_THRESHOLD = 0.10
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = int(round(pct / 100.0 * (len(sorted_values) - 1)))
+    return sorted_values[index]
+
+
+def summarize(timings):
+    timings = sorted(timings)
+    if not timings:
+        return {'count': 0}
+    return {'count': len(timings),
+            'min': timings[0],
+            'median': percentile(timings, 50),
+            'p95': percentile(timings, 95),
+            'p99': percentile(timings, 99),
+            'max': timings[-1],
+            'mean': sum(timings) / len(timings)}
+
+
+def bench_query(runner, query, warmup=WARMUP_ITERATIONS, iterations=TIMED_ITERATIONS):
+    result = {'errors': 0}
+    try:
+        measurement = runner(query)
+        result['cold'], result['bytes'], result['rows'] = measurement[:3]
+        if len(measurement) > 3:
+            result['cold_phases'] = measurement[3]
+    except Exception as ex:
+        result['errors'] += 1
+        result['error'] = str(ex)
+        result['cold'] = None
+
+    for _ in xrange(warmup):
+        try:
+            runner(query)
+        except Exception:
+            result['errors'] += 1
+
+    timings = []
+    phases = {}
+    for _ in xrange(iterations):
+        try:
+            measurement = runner(query)
+            elapsed, result['bytes'], result['rows'] = measurement[:3]
+            timings.append(elapsed)
+            if len(measurement) > 3:
+                for key, value in measurement[3].iteritems():
+                    phases.setdefault(key, []).append(value)
+        except Exception as ex:
+            result['errors'] += 1
+            result['error'] = str(ex)
+    result['warm'] = summarize(timings)
+    result['timings'] = timings
+    if phases:
+        result['phases'] = dict((key, summarize(values)) for key, values in phases.iteritems())
+    return result
+
+
+def run_catalogue(queries, runner, warmup=WARMUP_ITERATIONS, iterations=TIMED_ITERATIONS):
+    """Benchmark every (name, query) pair, returns an ordered list of results."""
+    results = []
+    for name, query in queries:
+        print("benchmarking: {}".format(name))
+        result = bench_query(runner, query, warmup, iterations)
+        result['name'] = name
+        results.append(result)
+    return results
+
+
+def print_report(results):
+    print("\n{:<70}| {:>8} | {:>8} | {:>8} | {:>8} | {:>8} | {:>10} | {:>8} | {:>4}".format(
+        "QUERY", "cold", "min", "median", "p95", "p99", "bytes", "rows", "err"))
+    print("-" * 156)
+    for r in results:
+        warm = r['warm']
+        if not warm['count']:
+            print("{:<70}| {}".format(r['name'][:70], "FAILED: {}".format(r.get('error', ''))[:80]))
+            continue
+        print("{:<70}| {:>8.3f} | {:>8.3f} | {:>8.3f} | {:>8.3f} | {:>8.3f} | {:>10} | {:>8} | {:>4}"
+              .format(r['name'][:70], r['cold'] or 0.0, warm['min'], warm['median'], warm['p95'],
+                      warm['p99'], r.get('bytes', 0), r.get('rows', 0), r['errors']))
+
+
+def print_phases(results):
+    """Warm median of each phase timing, for runners that return them."""
+    keys = sorted(set(key for r in results for key in r.get('phases', {})))
+    if not keys:
+        return
+    print("\n{:<70}| {}".format("QUERY (warm medians)", " | ".join("{:>17}".format(k) for k in keys)))
+    print("-" * (72 + 20 * len(keys)))
+    for r in results:
+        if 'phases' not in r:
+            continue
+        print("{:<70}| {}".format(r['name'][:70], " | ".join(
+            "{:>17.4f}".format(r['phases'][k]['median']) if k in r['phases'] else "{:>17}".format('')
+            for k in keys)))
+
+
+def save_baseline(results, path, metadata=None):
+    with open(path, 'w') as f:
+        json.dump({'time': time.time(),
+                   'metadata': metadata or {},
+                   'results': results}, f, indent=2)
+    print("baseline written to {}".format(path))
+
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(baseline, results, threshold=REGRESSION_THRESHOLD):
+    """Print the warm median change for each query against a baseline."""
+    previous = dict((r['name'], r) for r in baseline['results'])
+    print("\n{:<70}| {:>10} | {:>10} | {:>8} |".format("QUERY", "baseline", "current", "change"))
+    print("-" * 110)
+    regressions = 0
+    for r in results:
+        old = previous.get(r['name'])
+        if not old or not old['warm']['count'] or not r['warm']['count']:
+            continue
+        old_median = old['warm']['median']
+        new_median = r['warm']['median']
+        change = (new_median - old_median) / old_median if old_median else 0.0
+        flag = ''
+        if change > threshold:
+            flag = 'SLOWER'
+            regressions += 1
+        elif change < -threshold:
+            flag = 'faster'
+        print("{:<70}| {:>10.3f} | {:>10.3f} | {:>7.1%} | {}".format(
+            r['name'][:70], old_median, new_median, change, flag))
+    print("{} queries regressed by more than {:.0%}".format(regressions, threshold))
+    return regressions
+
+
+def record(results, metadata=None):
+    """Append each query's warm timings to the results store, returns the run id."""
+    params = dict(metadata or {})
+    run = results_store.ResultsRun(params.pop('tool', 'query_bench'), params, params.pop('version', None))
+    for r in results:
+        run.add(r['name'], 'latency_sec', r['timings'])
+    print("results recorded as run {}".format(run.run_id))
+    return run.run_id
+
+
+def finish(results, baseline_path=None, metadata=None):
+    """Report, compare with the previous baseline if there is one, then save."""
+    print_report(results)
+    print_phases(results)
+    record(results, metadata)
+    if baseline_path:
+        baseline = load_baseline(baseline_path)
+        if baseline:
+            compare(baseline, results)
+        save_baseline(results, baseline_path, metadata)
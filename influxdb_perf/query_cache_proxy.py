@@ -0,0 +1,293 @@
+import argparse
+import calendar
+import json
+import re
+import sys
+import threading
+import time
+import urlparse
+
+from BaseHTTPServer import BaseHTTPRequestHandler
+from BaseHTTPServer import HTTPServer
+from collections import OrderedDict
+from SocketServer import ThreadingMixIn
+
+import requests
+
+""" query_cache_proxy
+    Caching reverse proxy to put between the query benchmarks and InfluxDB or
+    the Monasca API, to measure what a result cache in the API would save.
+    Successful GET responses are cached with a TTL in an LRU of bounded size,
+    InfluxDB query errors come back as 200s and are not cached. Absolute
+    times in the request (API start_time/end_time, InfluxQL time comparisons)
+    are floored to a time bucket in the cache key, so queries whose ranges
+    differ by less than a bucket share one entry.
+    Run a benchmark directly with --baseline, then through the proxy with the
+    same baseline to see the latency change; the proxy prints the backend
+    requests and time it saved.
+"""
+
+LISTEN_PORT = 8186
+BACKEND_URL = 'http://localhost:8086'
+TTL = 60
+MAX_ENTRIES = 10000
+# seconds, absolute times in a request are floored to this in the cache key
+TIME_BUCKET = 60
+# seconds between stats lines
+STATS_INTERVAL = 30
+
+# API parameters holding ISO 8601 times
+TIME_PARAMS = ('start_time', 'end_time')
+# headers that make a response tenant or user specific
+KEY_HEADERS = ('x-auth-token', 'authorization')
+HOP_BY_HOP_HEADERS = ('connection', 'keep-alive', 'proxy-authenticate', 'proxy-authorization',
+                      'te', 'trailers', 'transfer-encoding', 'upgrade', 'content-encoding',
+                      'content-length', 'host')
+
+ISO_TIME = re.compile(r'(\d{4}-\d{2}-\d{2})[T ](\d{2}:\d{2}:\d{2})(\.\d+)?Z?')
+INFLUXQL_TIME = re.compile(r'(time\s*[<>=]+\s*)(\d+)(ns|u|ms|s)?\b')
+INFLUXQL_UNITS = {None: 1e-9, 'ns': 1e-9, 'u': 1e-6, 'ms': 1e-3, 's': 1}
+# only read-only InfluxQL statements are cached
+CACHEABLE_INFLUXQL = re.compile(r'^\s*(SELECT|SHOW)\b', re.IGNORECASE)
+
+
+def bucket(seconds, size):
+    return int(seconds // size * size)
+
+
+def bucket_iso_times(text, size):
+    def replace(match):
+        seconds = calendar.timegm(time.strptime(match.group(1) + ' ' + match.group(2),
+                                                '%Y-%m-%d %H:%M:%S'))
+        return 'bucket:{}'.format(bucket(seconds, size))
+    return ISO_TIME.sub(replace, text)
+
+
+def bucket_influxql_times(query, size):
+    def replace(match):
+        seconds = int(match.group(2)) * INFLUXQL_UNITS[match.group(3)]
+        return '{}bucket:{}'.format(match.group(1), bucket(seconds, size))
+    return INFLUXQL_TIME.sub(replace, query)
+
+
+def cache_key(path, params, headers, time_bucket):
+    """Path, sorted parameters with bucketed times, and the auth headers."""
+    key_params = []
+    for name, value in sorted(params):
+        if name in TIME_PARAMS:
+            value = bucket_iso_times(value, time_bucket)
+        elif name == 'q':
+            value = bucket_iso_times(bucket_influxql_times(value, time_bucket), time_bucket)
+        key_params.append((name, value))
+    key_headers = tuple((h, headers.get(h)) for h in KEY_HEADERS if headers.get(h))
+    return path, tuple(key_params), key_headers
+
+
+def cacheable(params):
+    for name, value in params:
+        if name == 'q' and not CACHEABLE_INFLUXQL.match(value):
+            return False
+    return True
+
+
+def query_error(content):
+    """True if a response body, plain or chunked JSON, holds an InfluxDB statement error."""
+    if '"error"' not in content:
+        return False
+    try:
+        bodies = [json.loads(content)]
+    except ValueError:
+        try:
+            bodies = [json.loads(line) for line in content.splitlines() if line.strip()]
+        except ValueError:
+            return False
+    for body in bodies:
+        if not isinstance(body, dict):
+            continue
+        if 'error' in body or any('error' in result for result in body.get('results', [])):
+            return True
+    return False
+
+
+class LRUCache(object):
+    def __init__(self, max_entries=MAX_ENTRIES, ttl=TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] < time.time():
+                self.expired += 1
+                self.misses += 1
+                return None
+            # re-insert as the most recently used
+            self.entries[key] = entry
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries.pop(key, None)
+            self.entries[key] = (time.time() + self.ttl, value)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+
+class ProxyStats(object):
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.backend_requests = 0
+        self.backend_time = 0.0
+        self.backend_bytes = 0
+        # backend time and bytes of the cached responses served again
+        self.saved_time = 0.0
+        self.saved_bytes = 0
+
+    def add_backend(self, elapsed, size):
+        with self.lock:
+            self.requests += 1
+            self.backend_requests += 1
+            self.backend_time += elapsed
+            self.backend_bytes += size
+
+    def add_hit(self, elapsed, size):
+        with self.lock:
+            self.requests += 1
+            self.saved_time += elapsed
+            self.saved_bytes += size
+
+
+def print_stats(cache, stats):
+    print("requests: {0}, backend requests: {1}, hit rate: {2:.1%}, entries: {3}, "
+          "expired: {4}, evicted: {5}".format(
+              stats.requests, stats.backend_requests,
+              cache.hits / float(cache.hits + cache.misses or 1), len(cache.entries),
+              cache.expired, cache.evictions))
+    print("backend time: {0:.1f} sec, {1} bytes; saved by the cache: {2:.1f} sec, {3} bytes".format(
+        stats.backend_time, stats.backend_bytes, stats.saved_time, stats.saved_bytes))
+    sys.stdout.flush()
+
+
+class CachingProxyHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    local = threading.local()
+
+    def session(self):
+        if not hasattr(self.local, 'session'):
+            self.local.session = requests.Session()
+        return self.local.session
+
+    def forward(self, method, body=None):
+        headers = dict((k, v) for k, v in self.headers.items() if k.lower() not in HOP_BY_HOP_HEADERS)
+        start_time = time.time()
+        r = self.session().request(method, self.server.backend_url + self.path, headers=headers,
+                                   data=body, allow_redirects=False)
+        elapsed = time.time() - start_time
+        response_headers = [(k, v) for k, v in r.headers.items() if k.lower() not in HOP_BY_HOP_HEADERS]
+        self.server.stats.add_backend(elapsed, len(r.content))
+        return r.status_code, response_headers, r.content, elapsed
+
+    def respond(self, status, headers, content, cache_status):
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(content)))
+        self.send_header('X-Cache', cache_status)
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_GET(self):
+        url = urlparse.urlsplit(self.path)
+        params = urlparse.parse_qsl(url.query, keep_blank_values=True)
+        if not cacheable(params):
+            status, headers, content, _ = self.forward('GET')
+            self.respond(status, headers, content, 'BYPASS')
+            return
+
+        key = cache_key(url.path, params, dict((k.lower(), v) for k, v in self.headers.items()),
+                        self.server.time_bucket)
+        entry = self.server.cache.get(key)
+        if entry is not None:
+            status, headers, content, elapsed = entry
+            self.server.stats.add_hit(elapsed, len(content))
+            self.respond(status, headers, content, 'HIT')
+            return
+
+        status, headers, content, elapsed = self.forward('GET')
+        if status == 200 and not query_error(content):
+            self.server.cache.put(key, (status, headers, content, elapsed))
+        self.respond(status, headers, content, 'MISS')
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        status, headers, content, _ = self.forward('POST', body)
+        self.respond(status, headers, content, 'BYPASS')
+
+    def log_message(self, format, *args):
+        pass
+
+
+class CachingProxy(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port, backend_url, cache, time_bucket):
+        HTTPServer.__init__(self, ('', port), CachingProxyHandler)
+        self.backend_url = backend_url.rstrip('/')
+        self.cache = cache
+        self.time_bucket = time_bucket
+        self.stats = ProxyStats()
+
+
+def main():
+    args = parse_args()
+    cache = LRUCache(args.max_entries, args.ttl)
+    proxy = CachingProxy(args.port, args.backend_url, cache, args.time_bucket)
+    print("caching {0} on port {1}, ttl {2} sec, {3} entries, {4} sec time buckets".format(
+        args.backend_url, args.port, args.ttl, args.max_entries, args.time_bucket))
+
+    def report():
+        while True:
+            time.sleep(args.stats_interval)
+            print_stats(cache, proxy.stats)
+    reporter = threading.Thread(target=report)
+    reporter.daemon = True
+    reporter.start()
+
+    try:
+        proxy.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print_stats(cache, proxy.stats)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='caching reverse proxy for InfluxDB or the Monasca API query benchmarks')
+    parser.add_argument('--port', type=int, required=False, default=LISTEN_PORT,
+                        help='port the proxy listens on')
+    parser.add_argument('--backend_url', type=str, required=False, default=BACKEND_URL,
+                        help='InfluxDB or Monasca API base url, example http://192.168.10.4:8070')
+    parser.add_argument('--ttl', type=int, required=False, default=TTL,
+                        help='seconds a cached response is served')
+    parser.add_argument('--max_entries', type=int, required=False, default=MAX_ENTRIES,
+                        help='least recently used responses are evicted beyond this')
+    parser.add_argument('--time_bucket', type=int, required=False, default=TIME_BUCKET,
+                        help='seconds absolute query times are floored to in the cache key')
+    parser.add_argument('--stats_interval', type=int, required=False, default=STATS_INTERVAL,
+                        help='seconds between stats lines')
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    sys.exit(main())
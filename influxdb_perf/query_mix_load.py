@@ -0,0 +1,256 @@
+import argparse
+import csv
+import os
+import random
+import sys
+import threading
+import time
+
+import requests
+
+import influx_query_test
+import query_bench
+import results_store
+
+""" query_mix_load
+    Dashboard style read load against InfluxDB or the Monasca API.
+    Worker threads pick a query class by weight (metric-list, measurement-list,
+    statistics, dimension), then a query of that class from the same catalogues
+    the query benchmarks use, and pace themselves to a target total QPS. Each
+    thread keeps its connection open. Latency percentiles are reported per class.
+
+    Pacing is open loop and latency is measured from when a query was
+    scheduled, so time a worker spends behind schedule counts against the
+    queries it delays instead of being left out of the percentiles. The time
+    from actually sending a query to its reply is kept as the service time.
+"""
+
+QUERY_CLASSES = ['metric', 'measurement', 'statistics', 'dimension']
+DEFAULT_MIX = 'metric=4,measurement=3,statistics=2,dimension=1'
+
+CONCURRENCY = 4
+TARGET_QPS = 10
+DURATION = 60
+
+INFLUX_DIMENSION_QUERIES = [
+    ('Dimension-values | hostname', 'SHOW TAG VALUES WITH KEY = "hostname"'),
+    ('Dimension-values | resource_id of a metric',
+     'SHOW TAG VALUES FROM "vm.mem.free_perc" WITH KEY = "resource_id"'),
+    ('Dimension-names | vm metric', 'SHOW TAG KEYS FROM "vm.mem.free_perc"'),
+]
+
+API_DIMENSION_QUERIES = [
+    ('Dimension-values | hostname', ('list_dimension_values', {'dimension_name': 'hostname'})),
+    ('Dimension-values | resource_id of a metric',
+     ('list_dimension_values', {'dimension_name': 'resource_id',
+                                'metric_name': 'vm.mem.free_perc'})),
+    ('Dimension-names | vm metric', ('list_dimension_names', {'metric_name': 'vm.mem.free_perc'})),
+]
+
+
+def classify(name):
+    if name.startswith('Measurement-list'):
+        return 'measurement'
+    if name.startswith('Metric-statistics'):
+        return 'statistics'
+    if name.startswith('Dimension'):
+        return 'dimension'
+    return 'metric'
+
+
+def build_catalogue(queries):
+    catalogue = dict((query_class, []) for query_class in QUERY_CLASSES)
+    for name, query in queries:
+        catalogue[classify(name)].append((name, query))
+    return catalogue
+
+
+def parse_mix(mix):
+    weights = []
+    for item in mix.split(','):
+        query_class, weight = item.split('=')
+        if query_class not in QUERY_CLASSES:
+            raise ValueError("Unknown query class: {}".format(query_class))
+        weights.append((query_class, float(weight)))
+    return weights
+
+
+def weighted_choice(weights):
+    point = random.uniform(0, sum(weight for _, weight in weights))
+    for query_class, weight in weights:
+        point -= weight
+        if point <= 0:
+            return query_class
+    return weights[-1][0]
+
+
+def influx_runner_factory(host='localhost', port=8086, db='monasca'):
+    url = 'http://{0}:{1}/query'.format(host, port)
+
+    def factory():
+        session = requests.Session()
+
+        def runner(query):
+            r = session.get(url, params={'db': db, 'q': query})
+            r.raise_for_status()
+            for result in r.json()['results']:
+                if 'error' in result:
+                    raise Exception(result['error'])
+        return runner
+
+    return factory
+
+
+def api_runner_factory(monasca_api_url=None):
+    # the Monasca API catalogue lives with the scale tests
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scale_perf'))
+    import vertica_scale_queries
+
+    if monasca_api_url:
+        vertica_scale_queries.monasca_url = monasca_api_url
+    token = vertica_scale_queries.get_token(vertica_scale_queries.keystone)
+
+    def factory():
+        mon_client = vertica_scale_queries.get_monasca_client(token)
+
+        def runner(query):
+            call, args = query
+            results = getattr(mon_client.metrics, call)(**args)
+            if not isinstance(results, list):
+                raise Exception("Query failed: {}".format(results))
+        return runner
+
+    return factory, vertica_scale_queries.get_queries()
+
+
+def worker(runner_factory, catalogue, weights, interval, end_time, samples):
+    runner = runner_factory()
+    next_time = time.time() + random.uniform(0, interval)
+    while next_time < end_time:
+        delay = next_time - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        query_class = weighted_choice(weights)
+        name, query = random.choice(catalogue[query_class])
+        start_time = time.time()
+        try:
+            runner(query)
+            ok = True
+        except Exception:
+            ok = False
+        finish_time = time.time()
+        samples.append((next_time, query_class, name, finish_time - next_time, ok,
+                        finish_time - start_time))
+        # open loop pacing, a slow query does not push the schedule back
+        next_time += interval
+
+
+def run_load(runner_factory, catalogue, weights, concurrency=CONCURRENCY, qps=TARGET_QPS,
+             duration=DURATION):
+    """Run the query mix, returns (scheduled_time, class, name, latency, ok, service_time) samples."""
+    weights = [(query_class, weight) for query_class, weight in weights
+               if weight > 0 and catalogue[query_class]]
+    samples = []
+    interval = concurrency / float(qps)
+    end_time = time.time() + duration
+    threads = [threading.Thread(target=worker,
+                                args=(runner_factory, catalogue, weights, interval,
+                                      end_time, samples))
+               for _ in xrange(concurrency)]
+    for t in threads:
+        t.daemon = True
+        t.start()
+    for t in threads:
+        t.join()
+    return samples
+
+
+def print_report(samples, duration):
+    print("\n{:<12}| {:>8} | {:>6} | {:>9} | {:>9} | {:>9} | {:>9} | {:>11}".format(
+        "CLASS", "queries", "errors", "median ms", "p95 ms", "p99 ms", "max ms", "service p95"))
+    print("-" * 94)
+    for query_class in QUERY_CLASSES:
+        class_samples = [s for s in samples if s[1] == query_class]
+        if not class_samples:
+            continue
+        stats = query_bench.summarize([s[3] * 1000 for s in class_samples if s[4]])
+        service = query_bench.summarize([s[5] * 1000 for s in class_samples if s[4]])
+        errors = len([s for s in class_samples if not s[4]])
+        if not stats['count']:
+            print("{:<12}| {:>8} | {:>6} |".format(query_class, len(class_samples), errors))
+            continue
+        print("{:<12}| {:>8} | {:>6} | {:>9.1f} | {:>9.1f} | {:>9.1f} | {:>9.1f} | {:>11.1f}".format(
+            query_class, len(class_samples), errors, stats['median'], stats['p95'],
+            stats['p99'], stats['max'], service['p95']))
+    print("achieved qps: {0:.2f}".format(len(samples) / float(duration)))
+
+
+def record_samples(run, samples, duration, prefix=''):
+    """Add per class latencies and the achieved rate to a results store run."""
+    for query_class in QUERY_CLASSES:
+        latencies = [s[3] for s in samples if s[1] == query_class and s[4]]
+        if latencies:
+            run.add(prefix + query_class, 'latency_sec', latencies)
+            run.add(prefix + query_class + ' service', 'latency_sec',
+                    [s[5] for s in samples if s[1] == query_class and s[4]])
+    run.add(prefix + 'all', 'queries_per_sec', len(samples) / float(duration))
+
+
+def write_samples(samples, output):
+    with open(output, 'w') as f:
+        samples_csv = csv.writer(f)
+        samples_csv.writerow(['scheduled_time', 'class', 'name', 'latency_sec', 'ok', 'service_sec'])
+        for sample in sorted(samples):
+            samples_csv.writerow(sample)
+
+
+def main():
+    args = parse_args()
+    if args.backend == 'api':
+        runner_factory, queries = api_runner_factory(args.monasca_api_url)
+        queries = queries + API_DIMENSION_QUERIES
+    else:
+        runner_factory = influx_runner_factory(args.host, args.port)
+        queries = influx_query_test.QUERIES + INFLUX_DIMENSION_QUERIES
+
+    print("query mix load: backend {}, mix {}, concurrency {}, target qps {}".format(
+        args.backend, args.mix, args.concurrency, args.qps))
+    samples = run_load(runner_factory, build_catalogue(queries), parse_mix(args.mix),
+                       args.concurrency, args.qps, args.duration)
+    print_report(samples, args.duration)
+    run = results_store.ResultsRun('query_mix_load',
+                                   {'backend': args.backend, 'mix': args.mix,
+                                    'concurrency': args.concurrency, 'qps': args.qps,
+                                    'duration': args.duration},
+                                   results_store.influx_version(args.host, args.port)
+                                   if args.backend == 'influx' else None)
+    record_samples(run, samples, args.duration)
+    if args.output:
+        write_samples(samples, args.output)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='weighted concurrent query mix against InfluxDB or the Monasca API')
+    parser.add_argument('--backend', type=str, required=False, default='influx',
+                        choices=['influx', 'api'], help='query InfluxDB directly or the API')
+    parser.add_argument('--host', type=str, required=False, default='localhost',
+                        help='hostname of InfluxDB http API')
+    parser.add_argument('--port', type=int, required=False, default=8086,
+                        help='port of InfluxDB http API')
+    parser.add_argument('--monasca_api_url', type=str, required=False, default=None,
+                        help='Monasca api url, example http://192.168.10.4:8070/v2.0')
+    parser.add_argument('--mix', type=str, required=False, default=DEFAULT_MIX,
+                        help='query class weights')
+    parser.add_argument('--concurrency', type=int, required=False, default=CONCURRENCY,
+                        help='number of query threads')
+    parser.add_argument('--qps', type=float, required=False, default=TARGET_QPS,
+                        help='target total queries per second')
+    parser.add_argument('--duration', type=int, required=False, default=DURATION,
+                        help='seconds to run')
+    parser.add_argument('--output', type=str, required=False, default=None,
+                        help='csv file for every query sample')
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,232 @@
+import argparse
+import csv
+import multiprocessing
+import sys
+import time
+
+import influx_query_test
+import query_bench
+import query_mix_load
+import results_store
+from influx_writer import InfluxWriter
+
+""" read_write_harness
+    Runs a steady InfluxDB ingest stream and a query mix alone and then
+    together, recording ingest throughput and query latency on one shared
+    per-second timeline, and reports how much each degrades when mixed.
+    While the ingest stream keeps up with --ingest_rate its throughput is
+    the same alone and mixed, so write latency is reported next to it, and
+    --ingest_rate 0 measures how much the queries cost ingest throughput.
+"""
+
+PHASES = ['ingest', 'query', 'mixed']
+PHASE_DURATION = 120
+
+# target points per second of the ingest stream, 0 writes as fast as possible
+INGEST_RATE = 20000
+BATCH_SIZE = 1000
+SERIES_COUNT = 10000
+
+TIMELINE_FILENAME = './read_write_timeline.csv'
+
+
+def ingest_stream(host, port, rate, duration, samples):
+    """Write agent shaped points at a steady rate, putting one sample per write on the queue."""
+    writer = InfluxWriter(host, port, 'monasca')
+    interval = BATCH_SIZE / float(rate) if rate else 0
+    value = 0
+    end_time = time.time() + duration
+    next_time = time.time()
+    while next_time < end_time:
+        delay = next_time - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        timestamp = int(time.time() * 1000000000)
+        batch_set = []
+        for j in xrange(BATCH_SIZE):
+            series_num = value % SERIES_COUNT
+            batch_set.append('vm.mem.free_perc,zone=nova,service=compute,component=vm,'
+                             'cloud_name=test_cloud,cluster=test_cluster,hostname=test_{0},'
+                             'resource_id=harness_{1} value={2} {3}'.format(series_num / 250, series_num,
+                                                                           value, timestamp + j))
+            value += 1
+        start_time = time.time()
+        accepted = writer.write(batch_set)
+        samples.put((start_time, len(batch_set), accepted, time.time() - start_time))
+        next_time = max(next_time + interval, time.time()) if interval else time.time()
+    writer.flush()
+    samples.put(None)
+
+
+def run_phase(phase, args, runner_factory, catalogue, weights):
+    print("\n-- {} phase, {} sec ------------------".format(phase, args.duration))
+    ingest_samples = []
+    query_samples = []
+    start_time = time.time()
+
+    if phase in ('ingest', 'mixed'):
+        queue = multiprocessing.Queue()
+        ingest = multiprocessing.Process(target=ingest_stream,
+                                         args=(args.host, args.port, args.ingest_rate,
+                                               args.duration, queue))
+        ingest.start()
+
+    if phase in ('query', 'mixed'):
+        query_samples = query_mix_load.run_load(runner_factory, catalogue, weights,
+                                                args.concurrency, args.qps, args.duration)
+
+    if phase in ('ingest', 'mixed'):
+        for sample in iter(queue.get, None):
+            ingest_samples.append(sample)
+        ingest.join()
+
+    return {'phase': phase,
+            'start_time': start_time,
+            'duration': time.time() - start_time,
+            'ingest': ingest_samples,
+            'query': query_samples}
+
+
+def ingest_rate(result):
+    return sum(s[2] for s in result['ingest']) / result['duration']
+
+
+def write_latencies(result):
+    return [s[3] * 1000 for s in result['ingest']]
+
+
+def query_latencies(result, query_class=None):
+    return [s[3] * 1000 for s in result['query']
+            if s[4] and (query_class is None or s[1] == query_class)]
+
+
+def degradation(alone, mixed):
+    if not alone:
+        return 0.0
+    return (mixed - alone) / alone
+
+
+def print_report(results, target_rate):
+    alone_ingest = ingest_rate(results['ingest'])
+    mixed_ingest = ingest_rate(results['mixed'])
+    alone_writes = query_bench.summarize(write_latencies(results['ingest']))
+    mixed_writes = query_bench.summarize(write_latencies(results['mixed']))
+    print("\n{:<24}| {:>12} | {:>12} | {:>8}".format("INGEST", "alone", "mixed", "change"))
+    print("-" * 64)
+    print("{:<24}| {:>12.0f} | {:>12.0f} | {:>7.1%}".format(
+        "accepted points/sec", alone_ingest, mixed_ingest, degradation(alone_ingest, mixed_ingest)))
+    if alone_writes['count'] and mixed_writes['count']:
+        for label, stat in (('write p50 (ms)', 'median'), ('write p95 (ms)', 'p95')):
+            print("{:<24}| {:>12.1f} | {:>12.1f} | {:>7.1%}".format(
+                label, alone_writes[stat], mixed_writes[stat],
+                degradation(alone_writes[stat], mixed_writes[stat])))
+    if target_rate:
+        print("ingest throttled to {} points/sec, compare write latency".format(target_rate))
+
+    print("\n{:<24}| {:>12} | {:>12} | {:>8} | {:>12} | {:>12} | {:>8}".format(
+        "QUERY", "alone p50", "mixed p50", "change", "alone p95", "mixed p95", "change"))
+    print("-" * 106)
+    for query_class in query_mix_load.QUERY_CLASSES + [None]:
+        alone = query_bench.summarize(query_latencies(results['query'], query_class))
+        mixed = query_bench.summarize(query_latencies(results['mixed'], query_class))
+        if not alone['count'] or not mixed['count']:
+            continue
+        print("{:<24}| {:>12.1f} | {:>12.1f} | {:>7.1%} | {:>12.1f} | {:>12.1f} | {:>7.1%}".format(
+            query_class or 'all (ms)', alone['median'], mixed['median'],
+            degradation(alone['median'], mixed['median']), alone['p95'], mixed['p95'],
+            degradation(alone['p95'], mixed['p95'])))
+
+
+def record_results(results, args):
+    run = results_store.ResultsRun('read_write_harness',
+                                   {'query_backend': args.query_backend, 'mix': args.mix,
+                                    'ingest_rate': args.ingest_rate, 'concurrency': args.concurrency,
+                                    'qps': args.qps, 'duration': args.duration},
+                                   results_store.influx_version(args.host, args.port))
+    for phase in PHASES:
+        result = results[phase]
+        if result['ingest']:
+            run.add(phase + ' ingest', 'points_per_sec', ingest_rate(result))
+            run.add(phase + ' ingest write', 'latency_sec', [s[3] for s in result['ingest']])
+        if result['query']:
+            query_mix_load.record_samples(run, result['query'], result['duration'], phase + ' ')
+
+
+def write_timeline(results, output):
+    """One row per phase second: ingest points sent/accepted and query count/median latency."""
+    with open(output, 'w') as f:
+        timeline = csv.writer(f)
+        timeline.writerow(['phase', 'second', 'points_sent', 'points_accepted', 'queries',
+                           'query_errors', 'query_median_ms'])
+        for phase in PHASES:
+            result = results[phase]
+            seconds = int(result['duration']) + 1
+            sent = [0] * seconds
+            accepted = [0] * seconds
+            latencies = [[] for _ in xrange(seconds)]
+            errors = [0] * seconds
+            for start_time, points, points_accepted, _ in result['ingest']:
+                second = min(int(start_time - result['start_time']), seconds - 1)
+                sent[second] += points
+                accepted[second] += points_accepted
+            for start_time, _, _, latency, ok, _ in result['query']:
+                second = min(int(start_time - result['start_time']), seconds - 1)
+                if ok:
+                    latencies[second].append(latency * 1000)
+                else:
+                    errors[second] += 1
+            for second in xrange(seconds):
+                median = query_bench.summarize(latencies[second]).get('median', '')
+                timeline.writerow([phase, second, sent[second], accepted[second],
+                                   len(latencies[second]) + errors[second], errors[second],
+                                   median])
+    print("timeline written to {}".format(output))
+
+
+def main():
+    args = parse_args()
+    if args.query_backend == 'api':
+        runner_factory, queries = query_mix_load.api_runner_factory(args.monasca_api_url)
+        queries = queries + query_mix_load.API_DIMENSION_QUERIES
+    else:
+        runner_factory = query_mix_load.influx_runner_factory(args.host, args.port)
+        queries = influx_query_test.QUERIES + query_mix_load.INFLUX_DIMENSION_QUERIES
+    catalogue = query_mix_load.build_catalogue(queries)
+    weights = query_mix_load.parse_mix(args.mix)
+
+    results = {}
+    for phase in PHASES:
+        results[phase] = run_phase(phase, args, runner_factory, catalogue, weights)
+
+    print_report(results, args.ingest_rate)
+    record_results(results, args)
+    write_timeline(results, args.output)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='measure ingest and query interference on InfluxDB')
+    parser.add_argument('--host', type=str, required=False, default='localhost',
+                        help='hostname of InfluxDB http API')
+    parser.add_argument('--port', type=int, required=False, default=8086,
+                        help='port of InfluxDB http API')
+    parser.add_argument('--query_backend', type=str, required=False, default='influx',
+                        choices=['influx', 'api'], help='query InfluxDB directly or the API')
+    parser.add_argument('--monasca_api_url', type=str, required=False, default=None,
+                        help='Monasca api url, example http://192.168.10.4:8070/v2.0')
+    parser.add_argument('--duration', type=int, required=False, default=PHASE_DURATION,
+                        help='seconds per phase')
+    parser.add_argument('--ingest_rate', type=int, required=False, default=INGEST_RATE,
+                        help='target points per second, 0 for as fast as possible')
+    parser.add_argument('--mix', type=str, required=False, default=query_mix_load.DEFAULT_MIX,
+                        help='query class weights')
+    parser.add_argument('--concurrency', type=int, required=False,
+                        default=query_mix_load.CONCURRENCY, help='number of query threads')
+    parser.add_argument('--qps', type=float, required=False, default=query_mix_load.TARGET_QPS,
+                        help='target total queries per second')
+    parser.add_argument('--output', type=str, required=False, default=TIMELINE_FILENAME,
+                        help='csv file for the shared timeline')
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,214 @@
+import argparse
+import json
+import math
+import os
+import sys
+import time
+
+import requests
+
+""" results_store
+    JSON-lines store of benchmark results shared by the perf tools, one line
+    per (run, name, metric) holding every sample, the tool, its dataset
+    parameters and the backend version. Replaces scraping numbers back out
+    of the tools' text output.
+
+        python results_store.py list
+        python results_store.py compare --tool influx_query_test
+        python results_store.py compare --run_a <run id> --run_b <run id>
+
+    compare runs a Mann-Whitney U test on the samples of each name and metric
+    present in both runs and flags changes that are both significant and
+    larger than --min_change.
+"""
+
+RESULTS_FILENAME = os.environ.get('PERF_RESULTS', './perf_results.jsonl')
+
+# metrics named *_per_sec are throughputs, everything else is a latency
+THROUGHPUT_SUFFIX = '_per_sec'
+
+SIGNIFICANCE = 0.05
+# median change, as a fraction, below which a significant change is not flagged
+MIN_CHANGE = 0.05
+# fewer samples than this on either side and the change is judged on its size alone
+MIN_SAMPLES = 5
+
+
+def influx_version(host='localhost', port=8086):
+    try:
+        return requests.get('http://{0}:{1}/ping'.format(host, port)).headers.get('X-Influxdb-Version')
+    except Exception:
+        return None
+
+
+class ResultsRun(object):
+    def __init__(self, tool, params=None, version=None, run_id=None, path=RESULTS_FILENAME):
+        self.tool = tool
+        self.params = params or {}
+        self.version = version
+        self.run_id = run_id or '{0}-{1}'.format(tool, time.strftime('%Y%m%dT%H%M%S'))
+        self.path = path
+
+    def add(self, name, metric, samples):
+        if not isinstance(samples, (list, tuple)):
+            samples = [samples]
+        record = {'run_id': self.run_id,
+                  'time': time.time(),
+                  'tool': self.tool,
+                  'name': name,
+                  'metric': metric,
+                  'params': self.params,
+                  'version': self.version,
+                  'samples': list(samples)}
+        # one short append per record, so concurrent clients can share a run id
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(record, default=str) + '\n')
+
+    def add_write_stats(self, name, stats, elapsed):
+        elapsed = float(elapsed) or 1.0
+        self.add(name, 'measurements_per_sec', stats.points_sent / elapsed)
+        self.add(name, 'goodput_per_sec', stats.points_accepted / elapsed)
+
+
+def load(path=RESULTS_FILENAME):
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def runs(records, tool=None):
+    """(run_id, tool, first record time, record count) in time order."""
+    found = {}
+    for record in records:
+        if tool and record['tool'] != tool:
+            continue
+        run = found.setdefault(record['run_id'], [record['run_id'], record['tool'], record['time'], 0])
+        run[2] = min(run[2], record['time'])
+        run[3] += 1
+    return sorted(found.values(), key=lambda run: run[2])
+
+
+def samples_by_key(records, run_id):
+    samples = {}
+    for record in records:
+        if record['run_id'] == run_id:
+            samples.setdefault((record['name'], record['metric']), []).extend(record['samples'])
+    return samples
+
+
+def median(values):
+    values = sorted(values)
+    middle = len(values) / 2
+    if len(values) % 2:
+        return values[middle]
+    return (values[middle - 1] + values[middle]) / 2.0
+
+
+def mann_whitney(a, b):
+    """Two sided p-value of the Mann-Whitney U test, normal approximation with tie correction."""
+    n1 = len(a)
+    n2 = len(b)
+    combined = sorted([(value, 0) for value in a] + [(value, 1) for value in b])
+    n = n1 + n2
+    rank_sum = 0.0
+    tie_term = 0
+    i = 0
+    while i < n:
+        j = i
+        while j + 1 < n and combined[j + 1][0] == combined[i][0]:
+            j += 1
+        rank = (i + j) / 2.0 + 1
+        rank_sum += rank * sum(1 for k in xrange(i, j + 1) if combined[k][1] == 0)
+        tie_term += (j - i + 1) ** 3 - (j - i + 1)
+        i = j + 1
+    u = rank_sum - n1 * (n1 + 1) / 2.0
+    variance = n1 * n2 / 12.0 * ((n + 1) - tie_term / float(n * (n - 1)))
+    if variance <= 0:
+        return 1.0
+    z = max(abs(u - n1 * n2 / 2.0) - 0.5, 0) / math.sqrt(variance)
+    return math.erfc(z / math.sqrt(2))
+
+
+def compare(records, run_a, run_b, alpha=SIGNIFICANCE, min_change=MIN_CHANGE):
+    """Print each shared name and metric of run_b against run_a, returns the regression count."""
+    for run_id in (run_a, run_b):
+        first = next(r for r in records if r['run_id'] == run_id)
+        print("{0}: {1}, version {2}, {3}".format(run_id, first['tool'], first['version'],
+                                                   json.dumps(first['params'], sort_keys=True)))
+    before = samples_by_key(records, run_a)
+    after = samples_by_key(records, run_b)
+
+    print("\n{:<60}| {:<20}| {:>12} | {:>12} | {:>8} | {:>7} |".format(
+        "NAME", "METRIC", "before", "after", "change", "p"))
+    print("-" * 140)
+    regressions = 0
+    for key in sorted(set(before) & set(after)):
+        name, metric = key
+        if not before[key] or not after[key]:
+            continue
+        old = median(before[key])
+        new = median(after[key])
+        change = (new - old) / old if old else 0.0
+        if min(len(before[key]), len(after[key])) >= MIN_SAMPLES:
+            p = mann_whitney(before[key], after[key])
+            significant = p < alpha
+        else:
+            p = None
+            significant = True
+        worse = change < 0 if metric.endswith(THROUGHPUT_SUFFIX) else change > 0
+        flag = ''
+        if significant and abs(change) > min_change:
+            flag = 'REGRESSION' if worse else 'improved'
+            if worse:
+                regressions += 1
+            if p is None:
+                flag += ' (few samples)'
+        print("{:<60}| {:<20}| {:>12.4f} | {:>12.4f} | {:>7.1%} | {:>7} | {}".format(
+            name[:60], metric[:20], old, new, change, '{:.4f}'.format(p) if p is not None else 'n/a',
+            flag))
+    print("{0} regressions (p < {1}, change > {2:.0%})".format(regressions, alpha, min_change))
+    return regressions
+
+
+def main():
+    args = parse_args()
+    records = load(args.results)
+    if args.command == 'list':
+        for run_id, tool, start, count in runs(records, args.tool):
+            print("{0:<60} {1:<28} {2} {3:>6} records".format(
+                run_id, tool, time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(start)), count))
+        return 0
+
+    run_a = args.run_a
+    run_b = args.run_b
+    if not run_a or not run_b:
+        found = [run[0] for run in runs(records, args.tool)]
+        if len(found) < 2:
+            print("need two runs to compare, found {}".format(len(found)))
+            return 1
+        run_a = run_a or found[-2]
+        run_b = run_b or found[-1]
+    return 1 if compare(records, run_a, run_b, args.alpha, args.min_change) else 0
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='list stored benchmark runs or compare two of them')
+    parser.add_argument('command', type=str, choices=['list', 'compare'])
+    parser.add_argument('--results', type=str, required=False, default=RESULTS_FILENAME,
+                        help='JSON-lines results file')
+    parser.add_argument('--tool', type=str, required=False, default=None,
+                        help='only runs of this tool, compare defaults to its last two runs')
+    parser.add_argument('--run_a', type=str, required=False, default=None,
+                        help='run id of the earlier run')
+    parser.add_argument('--run_b', type=str, required=False, default=None,
+                        help='run id of the later run')
+    parser.add_argument('--alpha', type=float, required=False, default=SIGNIFICANCE,
+                        help='significance level of the Mann-Whitney U test')
+    parser.add_argument('--min_change', type=float, required=False, default=MIN_CHANGE,
+                        help='smallest median change, as a fraction, that is flagged')
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,158 @@
+import argparse
+import datetime
+import itertools
+import re
+import sys
+import time
+
+from influxdb import InfluxDBClient
+
+import influx_query_test
+import influx_stats
+import influxdb_definition_filler
+import results_store
+
+""" retention_policy_matrix
+    Runs the influxdb_definition_filler workload once per cell of a
+    (shard duration x replication x retention) matrix. Each cell gets a fresh
+    database whose default retention policy has the cell's settings, then the
+    influx_query_test suite is timed against it and the on-disk size recorded.
+    InfluxDB refuses a retention shorter than its shard duration, those cells
+    are reported as invalid without being run.
+"""
+
+DATABASE_NAME = influxdb_definition_filler.DATABASE_NAME
+
+# seconds to wait after the fill so the cache is snapshotted to TSM before sizing
+SETTLE_TIME = 30
+
+SHARD_DURATIONS = '1h,1d,7d'
+REPLICATIONS = '1,3'
+RETENTIONS = '7d,90d'
+
+DURATION_UNITS = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+DURATION_PART = re.compile(r'(\d+)(ms|s|m|h|d|w)')
+
+
+def duration_seconds(duration):
+    """Seconds of an InfluxQL duration literal such as 1h or 1d12h, None for INF."""
+    if duration.upper() == 'INF':
+        return None
+    return sum(int(count) * DURATION_UNITS[unit] for count, unit in DURATION_PART.findall(duration))
+
+
+def valid_cell(shard_duration, retention):
+    retention_seconds = duration_seconds(retention)
+    return retention_seconds is None or retention_seconds >= duration_seconds(shard_duration)
+
+
+def policy_name(shard_duration, replication, retention):
+    return 'rp_{0}_{1}_r{2}'.format(retention, shard_duration, replication)
+
+
+def create_cell(client, shard_duration, replication, retention):
+    client.drop_database(DATABASE_NAME)
+    client.create_database(DATABASE_NAME)
+    policy = policy_name(shard_duration, replication, retention)
+    client.query('CREATE RETENTION POLICY "{0}" ON "{1}" DURATION {2} REPLICATION {3} '
+                 'SHARD DURATION {4} DEFAULT'.format(policy, DATABASE_NAME, retention,
+                                                     replication, shard_duration))
+    return policy
+
+
+def time_query_suite():
+    timings = []
+    failures = 0
+    for name, query in influx_query_test.QUERIES:
+        r, delta_time = influx_query_test.run_query(query)
+        if r.status_code != 200 or 'error' in r.json()['results'][0]:
+            failures += 1
+        timings.append(delta_time)
+    timings.sort()
+    return {'query_timings': timings,
+            'query_total_sec': sum(timings),
+            'query_median_sec': timings[len(timings) / 2],
+            'query_max_sec': timings[-1],
+            'query_failures': failures}
+
+
+def run_cell(client, shard_duration, replication, retention, days_to_fill):
+    if not valid_cell(shard_duration, retention):
+        policy = policy_name(shard_duration, replication, retention)
+        print("\n-- {} skipped, retention is shorter than the shard duration".format(policy))
+        return {'policy': policy, 'error': 'retention shorter than shard duration'}
+
+    policy = create_cell(client, shard_duration, replication, retention)
+    print("\n-- {} ------------------".format(policy))
+
+    base_timestamp = datetime.datetime.utcnow() - datetime.timedelta(days=days_to_fill)
+    stats, elapsed = influxdb_definition_filler.fill_metrics(
+        base_timestamp, days_to_fill,
+        influxdb_definition_filler.NEW_VMS_PER_HOUR,
+        influxdb_definition_filler.VMS_BELOW_PROBATION)
+
+    time.sleep(SETTLE_TIME)
+    disk = influx_stats.snapshot(db=DATABASE_NAME)
+
+    result = {'policy': policy,
+              'ingest_rate': stats.points_sent / elapsed,
+              'goodput': stats.points_accepted / elapsed,
+              'disk_bytes': disk['shard.diskBytes']}
+    result.update(time_query_suite())
+    return result
+
+
+def print_report(results):
+    print("\n{:<28}| {:>12} | {:>12} | {:>10} | {:>10} | {:>8} | {:>14}".format(
+        "POLICY", "ingest/s", "goodput/s", "q median", "q total", "q fail", "disk bytes"))
+    print("-" * 110)
+    for r in results:
+        if 'error' in r:
+            print("{:<28}| INVALID: {}".format(r['policy'], r['error']))
+            continue
+        print("{:<28}| {:>12.0f} | {:>12.0f} | {:>10.3f} | {:>10.3f} | {:>8} | {:>14}".format(
+            r['policy'], r['ingest_rate'], r['goodput'], r['query_median_sec'],
+            r['query_total_sec'], r['query_failures'], r['disk_bytes']))
+
+
+def main():
+    args = parse_args()
+    client = InfluxDBClient('localhost', 8086, 'root', 'root', DATABASE_NAME)
+
+    results = []
+    for shard_duration, replication, retention in itertools.product(
+            args.shard_durations.split(','),
+            [int(r) for r in args.replications.split(',')],
+            args.retentions.split(',')):
+        results.append(run_cell(client, shard_duration, replication, retention, args.days))
+
+    print_report(results)
+    run = results_store.ResultsRun('retention_policy_matrix',
+                                   {'shard_durations': args.shard_durations,
+                                    'replications': args.replications,
+                                    'retentions': args.retentions, 'days': args.days},
+                                   results_store.influx_version())
+    for r in results:
+        if 'error' in r:
+            continue
+        run.add(r['policy'], 'measurements_per_sec', r['ingest_rate'])
+        run.add(r['policy'], 'goodput_per_sec', r['goodput'])
+        run.add(r['policy'], 'latency_sec', r['query_timings'])
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='benchmark the filler workload across retention policy settings')
+    parser.add_argument('--shard_durations', type=str, required=False, default=SHARD_DURATIONS,
+                        help='comma separated shard group durations')
+    parser.add_argument('--replications', type=str, required=False, default=REPLICATIONS,
+                        help='comma separated replication factors')
+    parser.add_argument('--retentions', type=str, required=False, default=RETENTIONS,
+                        help='comma separated retention durations')
+    parser.add_argument('--days', type=int, required=False,
+                        default=influxdb_definition_filler.DAYS_TO_FILL,
+                        help='days of history to fill, ending now')
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,4 +1,6 @@
 from influxdb import InfluxDBClient
+from influx_writer import InfluxWriter
+from influx_writer import WriteStats
 from multiprocessing import Pool
 
 import sys
@@ -21,23 +23,25 @@ MEASUREMENTS_FILENAME = '/tmp/measurements.txt'
 
 
 def add_measurement_batch(meas_list, filename):
-    client1 = InfluxDBClient('localhost', 8086, 'root', 'root', DATABASE_NAME)
-    client1.switch_user(DB_USER, DB_USER_PASSWORD)
-    client1.write_points(meas_list, batch_size=len(meas_list),
-                        time_precision='ms', protocol='line')
+    writer = InfluxWriter('localhost', 8086, DATABASE_NAME, DB_USER, DB_USER_PASSWORD,
+                          precision='ms')
+    writer.write(meas_list)
+    return writer.flush().as_dict()
 
 
 def main():
     measurement_process_pool = Pool(TOTAL_MEASUREMENT_PROCESSES)
     measurement_process_id = 0
+    results = []
+    start_time = time.time()
     for i in xrange(5):
         meas_list = ['cpu.perc,cloud_name=test_cloud1 value=1,id={}'.format(measurement_process_id),
                      'cpu.avg,cloud_name=test_cloud2 value=2,id={}'.format(measurement_process_id),
                      'vswitch.out_errors_sec,tenant_id="f99DbEd937bABDaD46a8",region="Region_1",cloud_name=cloud,cluster=cluster,service=compute,resource_id=4f905288-215c-4d18-9449-3c154b978c2c,zone=nova,component=vm,hostname=test_1,lifespan=10,device=vs3 value=160550 140000000']
-        measurement_process_pool.apply_async(add_measurement_batch,
-                                             args=(meas_list,
-                                                   MEASUREMENTS_FILENAME +
-                                                   str(measurement_process_id,)))
+        results.append(measurement_process_pool.apply_async(add_measurement_batch,
+                                                            args=(meas_list,
+                                                                  MEASUREMENTS_FILENAME +
+                                                                  str(measurement_process_id,))))
         print "measurement_process_id = {}".format(measurement_process_id)
         time.sleep(1)
         measurement_process_id += 1
@@ -45,5 +49,13 @@ def main():
     measurement_process_pool.close()
     measurement_process_pool.join()
 
+    stats = WriteStats()
+    for result in results:
+        try:
+            stats.merge(result.get())
+        except Exception as ex:
+            print "measurement batch failed: {}".format(ex)
+    stats.report(time.time() - start_time)
+
 if __name__ == "__main__":
     sys.exit(main())
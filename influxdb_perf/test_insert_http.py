@@ -1,6 +1,8 @@
 import requests
 import sys
 
+from influx_writer import InfluxWriter
+
 DATABASE_NAME = 'monasca'
 DB_USER = 'admin'
 DB_USER_PASSWORD = 'my_secret_password'
@@ -12,11 +14,11 @@ print "r.url = {}".format(r.url)
 
 
 def main():
-    url1 = 'http://localhost:8086/write?db=monasca'
-    r1 = requests.post(url1, data='cpu_load_short,host=server01,region=us-west value=0.64 1434055562000000000' + '\n' + 'cpu_load_short,host=server02,region=us-west value=0.55 1434055562000000001')
-    print "r1.url = {}".format(r1.url)
-    print r1.status_code
-    print r1.text
+    writer = InfluxWriter('localhost', 8086, DATABASE_NAME)
+    accepted = writer.write(['cpu_load_short,host=server01,region=us-west value=0.64 1434055562000000000',
+                             'cpu_load_short,host=server02,region=us-west value=0.55 1434055562000000001'])
+    print "accepted = {}".format(accepted)
+    print writer.flush().as_dict()
 
 
 if __name__ == "__main__":
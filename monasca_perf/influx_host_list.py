@@ -1,49 +1,164 @@
 #!/usr/bin/env python
-import sys
-from influxdb import client as influxdb
-
-username = sys.argv[1]
-password = sys.argv[2]
-url = sys.argv[3]
-
-db = influxdb.InfluxDBClient(url, 8086, username, password, 'mon')
-series_list = db.query('list series;')
-
-hosts = set()
-hosts_amplified = {}
-total_metrics = 0
-metrics_missing_hostname = 0
-for series in db.query('list series;')[0]["points"]:
-    total_metrics += 1
-    entries = [entry for entry in series[1].split('&')]
-    series_items = {entry.split('=')[0]: entry.split('=')[1] for entry in entries if entry.find('=') != -1}
-
-    if series_items.has_key('hostname'):
-        hosts.add(series_items['hostname'])
+import argparse
+import json
+import re
+
+import requests
+
+""" influx_host_list
+    Lists the hosts with data stored on influxdb + handles agent amplification.
+    Series keys are streamed from SHOW SERIES (chunked responses, or LIMIT/OFFSET
+    pages for servers without chunking) and parsed one at a time, keeping only
+    per-host counters, so memory is bounded by the number of hosts rather than
+    the number of series.
+"""
+
+CHUNK_SIZE = 10000
+
+UNESCAPED_COMMA = re.compile(r'(?<!\\),')
+# line protocol escapes commas, equals signs and spaces in tag values
+ESCAPED_CHARACTER = re.compile(r'\\([ ,=])')
+
+
+def stream_series_chunked(query_url, db, chunk_size, auth=None):
+    r = requests.get(query_url, params={'db': db, 'q': 'SHOW SERIES', 'chunked': 'true',
+                                        'chunk_size': chunk_size}, auth=auth, stream=True)
+    r.raise_for_status()
+    for line in r.iter_lines():
+        if not line:
+            continue
+        for result in json.loads(line).get('results', []):
+            if 'error' in result:
+                raise Exception(result['error'])
+            for series in result.get('series', []):
+                for row in series.get('values', []):
+                    yield row[0]
+
+
+def stream_series_paged(query_url, db, page_size, auth=None):
+    offset = 0
+    while True:
+        r = requests.get(query_url, params={'db': db,
+                                            'q': 'SHOW SERIES LIMIT {0} OFFSET {1}'.format(
+                                                page_size, offset)}, auth=auth)
+        r.raise_for_status()
+        rows = 0
+        for result in r.json().get('results', []):
+            if 'error' in result:
+                raise Exception(result['error'])
+            for series in result.get('series', []):
+                for row in series.get('values', []):
+                    rows += 1
+                    yield row[0]
+        if rows < page_size:
+            return
+        offset += rows
+
+
+def parse_tags(series_key):
+    """Tags of a series key 'name,tag=value,...' as a dict; only what is needed is kept."""
+    escaped = '\\' in series_key
+    if escaped:
+        items = UNESCAPED_COMMA.split(series_key)
     else:
-        metrics_missing_hostname += 1
-
-    if series_items.has_key('amplifier'):  # I assume if it has a amplifier it has a hostname also
-        hostname = series_items['hostname']
-        if not hosts_amplified.has_key(hostname) or hosts_amplified[hostname] < int(series_items['amplifier']):
-            hosts_amplified[hostname] = int(series_items['amplifier'])
-
-print('Found %d hosts' % len(hosts))
-print('Found %d amplified hosts' % len(hosts_amplified))
-amplification = hosts_amplified[hosts_amplified.keys()[0]]
-virtual_hosts = len(hosts) + (amplification * len(hosts_amplified))
-print('Total + amplified hosts = %d virtual hosts - caculated with amplification %d' % (virtual_hosts, amplification))
-print('Found %d total metrics with %d metrics missing hostnames. Making an average %f metrics per host' %
-      (total_metrics, metrics_missing_hostname, float(total_metrics)/virtual_hosts))
-
-print("\nHosts in aw1 but not in the amplified list.")
-unamplified_count = 0
-not_fully_amplified_count = 0
-for host in hosts:
-    if not hosts_amplified.has_key(host) and host.find('aw1') != -1:
-        print(host)
-        unamplified_count += 1
-    if hosts_amplified.has_key(host) and hosts_amplified[host] != amplification:
-        not_fully_amplified_count += 1
-print('Total unamplified %d' % unamplified_count)
-print('Total amplified but not at reported amplification (%d) = %d' % (amplification, not_fully_amplified_count))
+        items = series_key.split(',')
+    tags = {}
+    for item in items[1:]:
+        key, sep, value = item.partition('=')
+        if sep and key in ('hostname', 'amplifier'):
+            tags[key] = ESCAPED_CHARACTER.sub(r'\1', value) if escaped else value
+    return tags
+
+
+class HostInventory(object):
+    def __init__(self):
+        self.total_series = 0
+        self.series_missing_hostname = 0
+        # hostname -> series count, hostnames are interned so each is stored once
+        self.hosts = {}
+        # hostname -> highest amplifier seen
+        self.hosts_amplified = {}
+
+    def add(self, series_key):
+        self.total_series += 1
+        tags = parse_tags(series_key)
+        hostname = tags.get('hostname')
+        if not hostname:
+            self.series_missing_hostname += 1
+            return
+        # json.loads gives unicode, intern only takes str
+        hostname = intern(hostname.encode('utf-8'))
+        self.hosts[hostname] = self.hosts.get(hostname, 0) + 1
+
+        if 'amplifier' in tags:
+            try:
+                amplifier = int(tags['amplifier'])
+            except ValueError:
+                return
+            if self.hosts_amplified.get(hostname, -1) < amplifier:
+                self.hosts_amplified[hostname] = amplifier
+
+
+def print_report(inventory, list_hosts=False):
+    hosts = inventory.hosts
+    hosts_amplified = inventory.hosts_amplified
+    print('Found %d series' % inventory.total_series)
+    print('Found %d hosts' % len(hosts))
+    print('Found %d amplified hosts' % len(hosts_amplified))
+    # the highest amplifier of any host, not that of whichever host comes first
+    amplification = max(hosts_amplified.values()) if hosts_amplified else 0
+    virtual_hosts = len(hosts) + (amplification * len(hosts_amplified))
+    print('Total + amplified hosts = %d virtual hosts - caculated with amplification %d' %
+          (virtual_hosts, amplification))
+    print('Found %d total metrics with %d metrics missing hostnames. Making an average %f metrics per host' %
+          (inventory.total_series, inventory.series_missing_hostname,
+           float(inventory.total_series) / max(virtual_hosts, 1)))
+
+    print("\nHosts in aw1 but not in the amplified list.")
+    unamplified_count = 0
+    not_fully_amplified_count = 0
+    for host in hosts:
+        if host not in hosts_amplified and host.find('aw1') != -1:
+            print(host)
+            unamplified_count += 1
+        if host in hosts_amplified and hosts_amplified[host] != amplification:
+            not_fully_amplified_count += 1
+    print('Total unamplified %d' % unamplified_count)
+    print('Total amplified but not at reported amplification (%d) = %d' %
+          (amplification, not_fully_amplified_count))
+
+    if list_hosts:
+        print("\nSeries per host")
+        for host in sorted(hosts):
+            amplifier = hosts_amplified.get(host)
+            print("%s %s%d" % (host, ':amplifier:%d ' % amplifier if amplifier is not None else '',
+                               hosts[host]))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='list the hosts with series in InfluxDB, bounded memory at any cardinality')
+    parser.add_argument('username', help='InfluxDB user')
+    parser.add_argument('password', help='InfluxDB password')
+    parser.add_argument('url', help='InfluxDB host')
+    parser.add_argument('--port', type=int, required=False, default=8086)
+    parser.add_argument('--database', type=str, required=False, default='mon')
+    parser.add_argument('--chunk_size', type=int, required=False, default=CHUNK_SIZE,
+                        help='series per chunk or page')
+    parser.add_argument('--paged', action='store_true', required=False,
+                        help='use LIMIT/OFFSET pages instead of a chunked response')
+    parser.add_argument('--list_hosts', action='store_true', required=False,
+                        help='also print every host with its series count')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    query_url = 'http://{0}:{1}/query'.format(args.url, args.port)
+    stream = stream_series_paged if args.paged else stream_series_chunked
+
+    inventory = HostInventory()
+    for series_key in stream(query_url, args.database, args.chunk_size,
+                             (args.username, args.password)):
+        inventory.add(series_key)
+    print_report(inventory, args.list_hosts)
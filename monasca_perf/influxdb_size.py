@@ -1,8 +1,14 @@
 import datetime
+import os
+import sys
 
 from monascaclient import client
 from monascaclient import ksclient
 
+# shared API fan-out helper lives with the scale tests
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scale_perf'))
+import api_fanout
+
 endpoint = "https://mon-ae1test-monasca01.useast.hpcloud.net:8080/v2.0"
 auth_url = "http://10.22.156.20:35358/v3/"
 
@@ -36,13 +42,19 @@ unique_metrics = {}
 for metric in m.list():
     unique_metrics[metric['name']] = 1
 
-for metric in sorted(unique_metrics.keys()):
+metric_names = sorted(unique_metrics.keys())
+fanout = api_fanout.ApiFanout()
+all_statistics = fanout.map(m.list_statistics,
+                            [dict(name=metric,
+                                  statistics="count",
+                                  period="1000000000",
+                                  merge_metrics=True,
+                                  start_time=start.isoformat()) for metric in metric_names],
+                            label='statistics')
+fanout.close()
+
+for metric, statistics in zip(metric_names, all_statistics):
     print metric
-    statistics = m.list_statistics(name=metric,
-                                   statistics="count",
-                                   period="1000000000",
-                                   merge_metrics=True,
-                                   start_time=start.isoformat())
     for stat in statistics:
         key = stat['name']
         count = stat['statistics'][0][1]
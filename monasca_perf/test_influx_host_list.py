@@ -0,0 +1,31 @@
+import json
+import unittest
+
+import influx_host_list
+
+SHOW_SERIES_PAGE = json.dumps({'results': [{'series': [{'columns': ['key'], 'values': [
+    ['cpu.idle_perc,hostname=aw1-host-1,service=monitoring'],
+    ['cpu.idle_perc,amplifier=3,hostname=aw1-host-1'],
+    ['vm.mem.free_perc,instance_id=vm-1,resource_id=vm-1'],
+    ['disk.space_used_perc,device=sda,hostname=h\xc3\xa9\\,2,mount=/'],
+    ['kafka.consumer_lag,component=kafka'],
+]}]}]})
+
+
+class TestHostInventory(unittest.TestCase):
+    def test_add_show_series_page(self):
+        inventory = influx_host_list.HostInventory()
+        for result in json.loads(SHOW_SERIES_PAGE)['results']:
+            for series in result['series']:
+                for row in series['values']:
+                    inventory.add(row[0])
+
+        self.assertEqual(inventory.total_series, 5)
+        self.assertEqual(inventory.series_missing_hostname, 2)
+        self.assertEqual(inventory.hosts, {'aw1-host-1': 2, 'h\xc3\xa9,2': 1})
+        self.assertEqual(inventory.hosts_amplified, {'aw1-host-1': 3})
+        for host in inventory.hosts:
+            self.assertTrue(type(host) is str)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,161 @@
+import argparse
+import datetime
+import sys
+import time
+
+import vertica_python
+
+""" alarm_transitions
+    Counts alarm state transitions in monAlarms.StateHistory per fixed
+    interval, in total and per alarm id, over one persistent connection.
+    History is read incrementally: each read covers the whole intervals from
+    the end of the previous read up to the last interval that has settled, so
+    consecutive reads neither overlap nor leave gaps, and one missed read is
+    made up by the next. Counting is done by Vertica with TIME_SLICE, only
+    one row per (interval, alarm id) comes back.
+
+    An interval is read once its end is --settle_time seconds in the past, so
+    transitions the persister commits later than that after their time_stamp
+    are not counted.
+"""
+
+CONN_INFO = {'host': '127.0.0.1',
+             'port': 5433,
+             'user': 'dbadmin',
+             'password': 'password',
+             'database': 'mon',
+             'read_timeout': 600,
+             'unicode_error': 'strict',
+             'ssl': False}
+
+INTERVAL = 60
+SETTLE_TIME = 30
+# seconds to wait before reconnecting after a failed read
+RECONNECT_DELAY = 5
+# TIME_SLICE aligns its slices to this time, the collector's intervals have to match
+SLICE_ORIGIN = datetime.datetime(2000, 1, 1)
+
+UTC_NOW_QUERY = "SELECT GETUTCDATE()"
+TRANSITIONS_QUERY = ("SELECT TIME_SLICE(time_stamp, {0}, 'SECOND'), alarm_id, COUNT(*) "
+                     "FROM monAlarms.StateHistory "
+                     "WHERE time_stamp >= :start AND time_stamp < :end "
+                     "GROUP BY 1, 2")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--vertica_password", help="Vertica dbadmin password", required=False,
+                        default=CONN_INFO['password'])
+    parser.add_argument("--vertica_host", help="Host running Vertica we will connect to", required=False,
+                        default=CONN_INFO['host'])
+    parser.add_argument("--interval", help="Length of each counted interval (in seconds)", type=int,
+                        required=False, default=INTERVAL)
+    parser.add_argument("--settle_time", help="Seconds an interval must have ended before it is read",
+                        type=int, required=False, default=SETTLE_TIME)
+    parser.add_argument("--output_directory",
+                        help="Output directory to place result files. Defaults to current directory", required=False)
+    parser.add_argument("--run_time",
+                        help="How long, in mins, collection will run. Defaults to run indefinitely until the user hits"
+                             " control c", required=False, type=int, default=None)
+    return parser.parse_args()
+
+
+def slice_start(timestamp, interval):
+    seconds = int((timestamp - SLICE_ORIGIN).total_seconds())
+    return SLICE_ORIGIN + datetime.timedelta(seconds=seconds - seconds % interval)
+
+
+def format_time(timestamp):
+    return timestamp.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def write_interval(output_file, slice_time, interval, counts):
+    total = sum(counts.values())
+    output_file.write("{0} UTC, {1} sec\n".format(format_time(slice_time), interval))
+    output_file.write("Total Alarm Transitions: {0} ({1:.2f}/min)\n".format(total, total * 60.0 / interval))
+    output_file.write("Alarm Transitions By ID\n")
+    for alarm_id, count in sorted(counts.items(), key=lambda item: item[1], reverse=True):
+        output_file.write("{:>40} {:>8} {:>10.2f}/min\n".format(alarm_id, count, count * 60.0 / interval))
+    output_file.flush()
+
+
+def write_summary(output_file, totals, seconds):
+    if not seconds:
+        return
+    total = sum(totals.values())
+    output_file.write("Summary over {0} sec\n".format(seconds))
+    output_file.write("Total Alarm Transitions: {0} ({1:.2f}/min)\n".format(total, total * 60.0 / seconds))
+    output_file.write("Alarm Transitions By ID\n")
+    for alarm_id, count in sorted(totals.items(), key=lambda item: item[1], reverse=True):
+        output_file.write("{:>40} {:>8} {:>10.2f}/min\n".format(alarm_id, count, count * 60.0 / seconds))
+    output_file.flush()
+
+
+def read_transitions(cursor, window_start, window_end, interval):
+    """{slice start: {alarm_id: count}} for the whole intervals in [window_start, window_end)."""
+    cursor.execute(TRANSITIONS_QUERY.format(interval),
+                   {'start': format_time(window_start), 'end': format_time(window_end)})
+    slices = {}
+    for slice_time, alarm_id, count in cursor.fetchall():
+        slices.setdefault(slice_time, {})[alarm_id] = count
+    return slices
+
+
+def collect(conn_info, output_file, interval=INTERVAL, settle_time=SETTLE_TIME, run_time=None):
+    connection = None
+    window_start = None
+    totals = {}
+    collected_seconds = 0
+    end_time = time.time() + run_time * 60 if run_time is not None else None
+    try:
+        while end_time is None or time.time() < end_time:
+            try:
+                if connection is None:
+                    connection = vertica_python.connect(**conn_info)
+                cursor = connection.cursor()
+                cursor.execute(UTC_NOW_QUERY)
+                now = cursor.fetchone()[0]
+                window_end = slice_start(now - datetime.timedelta(seconds=settle_time), interval)
+                if window_start is None:
+                    # count from the first whole interval of the collection on
+                    window_start = window_end
+                if window_end > window_start:
+                    slices = read_transitions(cursor, window_start, window_end, interval)
+                    slice_time = window_start
+                    while slice_time < window_end:
+                        counts = slices.get(slice_time, {})
+                        write_interval(output_file, slice_time, interval, counts)
+                        for alarm_id, count in counts.items():
+                            totals[alarm_id] = totals.get(alarm_id, 0) + count
+                        slice_time += datetime.timedelta(seconds=interval)
+                    collected_seconds += int((window_end - window_start).total_seconds())
+                    window_start = window_end
+            except vertica_python.errors.Error as e:
+                print('Vertica read failed: {0}'.format(e))
+                if connection is not None:
+                    try:
+                        connection.close()
+                    except Exception:
+                        pass
+                    connection = None
+                time.sleep(RECONNECT_DELAY)
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+    write_summary(output_file, totals, collected_seconds)
+    if connection is not None:
+        connection.close()
+
+
+def main():
+    args = parse_args()
+    conn_info = dict(CONN_INFO, host=args.vertica_host, password=args.vertica_password)
+    output_file_name = "alarm_transitions"
+    if args.output_directory:
+        output_file_name = args.output_directory + output_file_name
+    with open(output_file_name, 'w') as output_file:
+        collect(conn_info, output_file, args.interval, args.settle_time, args.run_time)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
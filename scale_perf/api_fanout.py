@@ -0,0 +1,65 @@
+import json
+import threading
+import time
+
+from multiprocessing.pool import ThreadPool
+
+""" api_fanout
+    Runs many Monasca API queries on a thread pool with a per-run response
+    cache keyed by the query parameters, printing progress as results arrive.
+"""
+
+WORKERS = 8
+# seconds between progress lines
+PROGRESS_INTERVAL = 5
+
+
+def cache_key(func, kwargs):
+    return getattr(func, '__name__', str(func)), json.dumps(kwargs, sort_keys=True, default=str)
+
+
+class ApiFanout(object):
+    def __init__(self, workers=WORKERS):
+        self.pool = ThreadPool(workers)
+        self.cache = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def call(self, func, **kwargs):
+        """func(**kwargs), answered from the cache if the same query was already run."""
+        key = cache_key(func, kwargs)
+        with self.lock:
+            if key in self.cache:
+                self.hits += 1
+                return self.cache[key]
+            self.misses += 1
+        result = func(**kwargs)
+        with self.lock:
+            self.cache[key] = result
+        return result
+
+    def map(self, func, kwargs_list, label='queries'):
+        """Run func once per kwargs dict in parallel, results come back in order."""
+        total = len(kwargs_list)
+        start_time = time.time()
+        last_report = [start_time]
+        done = [0]
+
+        def run(kwargs):
+            result = self.call(func, **kwargs)
+            with self.lock:
+                done[0] += 1
+                now = time.time()
+                if now - last_report[0] >= PROGRESS_INTERVAL or done[0] == total:
+                    last_report[0] = now
+                    print("{0}: {1}/{2} ({3:.0%}) in {4:.1f}s".format(
+                        label, done[0], total, done[0] / float(total or 1), now - start_time))
+            return result
+
+        return self.pool.map(run, kwargs_list)
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+        print("api cache: {0} hits, {1} misses".format(self.hits, self.misses))
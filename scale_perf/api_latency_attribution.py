@@ -0,0 +1,288 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+import requests
+import vertica_python
+
+import vertica_scale_queries
+
+# shared query benchmark engine and the InfluxDB query catalogue live in influxdb_perf
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'influxdb_perf'))
+import influx_query_test
+import query_bench
+
+""" api_latency_attribution
+    Splits the latency of each Monasca query shape between the API and its
+    database. Every iteration runs the shape of vertica_scale_queries through
+    the Monasca API and the equivalent query straight against the backend,
+    InfluxQL or Vertica SQL built from the same API arguments, alternating
+    which goes first so neither always runs on a cache the other warmed.
+    Reports per shape:
+
+        backend        direct query, executed and fully fetched
+        api_ttfb       API request to the first response byte
+        api_overhead   api_ttfb - backend, the API's own processing and encoding
+        transfer       first to last response byte
+        serialization  JSON decode plus re-encode of the API response, timed
+                       locally as an estimate of how much of api_overhead
+                       goes to serializing the payload
+
+    The API is called over plain HTTP with a Keystone token, not through
+    monascaclient, so the response phases can be timed separately.
+"""
+
+BACKENDS = ['influxdb', 'vertica']
+
+monasca_url = vertica_scale_queries.monasca_url
+
+API_PATHS = {'list': '/metrics',
+             'list_measurements': '/metrics/measurements',
+             'list_statistics': '/metrics/statistics'}
+
+VERTICA_CONN_INFO = {'host': '127.0.0.1',
+                     'port': 5433,
+                     'user': 'dbadmin',
+                     'password': 'password',
+                     'database': 'mon',
+                     'read_timeout': 600,
+                     'unicode_error': 'strict',
+                     'ssl': False}
+
+# rows the direct measurement queries return, matches the API page size
+DIRECT_LIMIT = 10000
+# statistics period the API uses when none is given
+STATISTICS_PERIOD = 300
+STATISTIC_FUNCTIONS = {'avg': 'AVG', 'min': 'MIN', 'max': 'MAX', 'sum': 'SUM', 'count': 'COUNT'}
+INFLUX_STATISTIC_FUNCTIONS = {'avg': 'mean', 'min': 'min', 'max': 'max', 'sum': 'sum', 'count': 'count'}
+# bytes read per socket read of an API response
+READ_SIZE = 65536
+
+PHASES = ['backend', 'api_overhead', 'transfer', 'serialization']
+
+
+def quote(value):
+    return "'{}'".format(str(value).replace("'", "''"))
+
+
+def sql_time(iso_time):
+    return quote(iso_time.replace('T', ' ').rstrip('Z'))
+
+
+def def_dim_conditions(args):
+    """Conditions over dd (DefinitionDimensions) and def (Definitions) for a name and dimensions."""
+    conditions = []
+    if 'name' in args:
+        conditions.append('def.name = {}'.format(quote(args['name'])))
+    for key, value in sorted(args.get('dimensions', {}).items()):
+        conditions.append('dd.dimension_set_id IN (SELECT dimension_set_id FROM MonMetrics.Dimensions '
+                          'WHERE name = {0} AND value = {1})'.format(quote(key), quote(value)))
+    return conditions
+
+
+def where_clause(conditions):
+    return ' WHERE ' + ' AND '.join(conditions) if conditions else ''
+
+
+def def_dim_ids(args):
+    return ('SELECT dd.id FROM MonMetrics.DefinitionDimensions dd '
+            'JOIN MonMetrics.Definitions def ON def.id = dd.definition_id' +
+            where_clause(def_dim_conditions(args)))
+
+
+def vertica_query(call, args):
+    """Direct Vertica equivalent of a monasca client metrics call."""
+    if call == 'list':
+        conditions = def_dim_conditions(args)
+        if 'start_time' in args:
+            conditions.append('dd.id IN (SELECT definition_dimensions_id FROM MonMetrics.Measurements '
+                              'WHERE time_stamp >= {})'.format(sql_time(args['start_time'])))
+        return ('SELECT dd.id, def.name, dims.name, dims.value FROM MonMetrics.DefinitionDimensions dd '
+                'JOIN MonMetrics.Definitions def ON def.id = dd.definition_id '
+                'LEFT JOIN MonMetrics.Dimensions dims ON dims.dimension_set_id = dd.dimension_set_id' +
+                where_clause(conditions) + ' ORDER BY dd.id')
+
+    measurements = ('FROM MonMetrics.Measurements m WHERE m.definition_dimensions_id IN ({0}) '
+                    'AND m.time_stamp >= {1}').format(def_dim_ids(args), sql_time(args['start_time']))
+    if call == 'list_measurements':
+        order = 'm.time_stamp' if args.get('merge_metrics') else 'm.definition_dimensions_id, m.time_stamp'
+        return 'SELECT m.definition_dimensions_id, m.time_stamp, m.value {0} ORDER BY {1} LIMIT {2}'.format(
+            measurements, order, DIRECT_LIMIT)
+
+    statistics = ', '.join('{0}(m.value)'.format(STATISTIC_FUNCTIONS[statistic])
+                           for statistic in args['statistics'].split(','))
+    period = args.get('period', STATISTICS_PERIOD)
+    return ("SELECT TIME_SLICE(m.time_stamp, {0}, 'SECOND'), {1} {2} GROUP BY 1 ORDER BY 1 LIMIT {3}"
+            .format(period, statistics, measurements, DIRECT_LIMIT))
+
+
+def influx_tag_value(value):
+    return "'{}'".format(str(value).replace('\\', '\\\\').replace("'", "\\'"))
+
+
+def influx_conditions(args, measurement_time=True):
+    """InfluxQL WHERE conditions for the dimensions and start time, dimensions are tags."""
+    conditions = ['"{0}" = {1}'.format(key, influx_tag_value(value))
+                  for key, value in sorted(args.get('dimensions', {}).items())]
+    if measurement_time and 'start_time' in args:
+        conditions.append("time >= '{}'".format(args['start_time']))
+    return conditions
+
+
+def influx_query(call, args):
+    """Direct InfluxDB equivalent of a monasca client metrics call, metric names are measurements."""
+    source = ' FROM "{}"'.format(args['name']) if 'name' in args else ''
+    if call == 'list':
+        # SHOW SERIES takes no time condition, so a metric-list start time is not applied
+        return 'SHOW SERIES{0}{1} LIMIT {2}'.format(
+            source, where_clause(influx_conditions(args, measurement_time=False)), DIRECT_LIMIT)
+
+    where = where_clause(influx_conditions(args))
+    if call == 'list_measurements':
+        group_by = ' GROUP BY *' if args.get('group_by') == '*' else ''
+        return 'SELECT value, value_meta{0}{1}{2} LIMIT {3}'.format(source, where, group_by, DIRECT_LIMIT)
+
+    statistics = ', '.join('{0}(value)'.format(INFLUX_STATISTIC_FUNCTIONS[statistic])
+                           for statistic in args['statistics'].split(','))
+    period = args.get('period', STATISTICS_PERIOD)
+    return 'SELECT {0}{1}{2} GROUP BY time({3}s) LIMIT {4}'.format(
+        statistics, source, where, period, DIRECT_LIMIT)
+
+
+def attribution_queries(backend):
+    """(name, ((call, args), direct query)) for every shape of vertica_scale_queries."""
+    direct_query = influx_query if backend == 'influxdb' else vertica_query
+    return [(name, ((call, args), direct_query(call, args)))
+            for name, (call, args) in vertica_scale_queries.get_queries()]
+
+
+def api_params(args):
+    params = dict(args)
+    if 'dimensions' in params:
+        params['dimensions'] = ','.join('{0}:{1}'.format(key, value)
+                                        for key, value in sorted(params['dimensions'].items()))
+    return params
+
+
+def timed_api_request(token, call, args):
+    start_time = time.time()
+    r = requests.get(monasca_url + API_PATHS[call], params=api_params(args), stream=True,
+                     headers={'X-Auth-Token': token, 'Accept': 'application/json'})
+    ttfb = None
+    body = []
+    for data in r.iter_content(READ_SIZE):
+        if ttfb is None:
+            ttfb = time.time() - start_time
+        body.append(data)
+    ttlb = time.time() - start_time
+    body = ''.join(body)
+    if r.status_code != 200:
+        raise Exception('HTTP {0}: {1}'.format(r.status_code, body[:200]))
+
+    decode_start = time.time()
+    response = json.loads(body)
+    decode = time.time() - decode_start
+    encode_start = time.time()
+    json.dumps(response)
+    encode = time.time() - encode_start
+    return {'ttfb': ttfb if ttfb is not None else ttlb,
+            'ttlb': ttlb,
+            'serialization': decode + encode,
+            'bytes': len(body),
+            'rows': vertica_scale_queries.count_rows(response.get('elements', []))}
+
+
+def get_attribution_runner(backend, vertica_conn_info):
+    token = vertica_scale_queries.get_token(vertica_scale_queries.keystone)
+    cursor = vertica_python.connect(**vertica_conn_info).cursor() if backend == 'vertica' else None
+
+    def direct(query):
+        if backend == 'influxdb':
+            timing = influx_query_test.timed_query(query)
+            if timing['error']:
+                raise Exception(timing['error'])
+            return timing['ttlb']
+        start_time = time.time()
+        cursor.execute(query)
+        cursor.fetchall()
+        return time.time() - start_time
+
+    runs = [0]
+
+    def runner(query):
+        (call, args), direct_query = query
+        runs[0] += 1
+        if runs[0] % 2:
+            backend_sec = direct(direct_query)
+            api = timed_api_request(token, call, args)
+        else:
+            api = timed_api_request(token, call, args)
+            backend_sec = direct(direct_query)
+        phases = {'backend': backend_sec,
+                  'api_ttfb': api['ttfb'],
+                  'api_overhead': api['ttfb'] - backend_sec,
+                  'transfer': api['ttlb'] - api['ttfb'],
+                  'serialization': api['serialization']}
+        return api['ttlb'], api['bytes'], api['rows'], phases
+
+    return runner
+
+
+def print_attribution(results):
+    """Warm median of each phase as a share of the warm median API time."""
+    print("\n{:<70}| {:>9} | {}".format("QUERY (share of api median)", "api sec",
+                                        " | ".join("{:>13}".format(phase) for phase in PHASES)))
+    print("-" * (84 + 16 * len(PHASES)))
+    for r in results:
+        if 'phases' not in r or not r['warm']['count']:
+            print("{:<70}| FAILED: {}".format(r['name'][:70], r.get('error', '')))
+            continue
+        total = r['warm']['median']
+        print("{:<70}| {:>9.4f} | {}".format(r['name'][:70], total, " | ".join(
+            "{:>13.1%}".format(r['phases'][phase]['median'] / total if total else 0.0)
+            for phase in PHASES)))
+
+
+def run_attribution(backend, iterations, warmup, baseline, vertica_conn_info):
+    results = query_bench.run_catalogue(attribution_queries(backend),
+                                        get_attribution_runner(backend, vertica_conn_info),
+                                        warmup, iterations)
+    query_bench.finish(results, baseline, {'tool': 'api_latency_attribution',
+                                           'backend': backend,
+                                           'monasca_url': monasca_url})
+    print_attribution(results)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='attribute Monasca query latency to the API and to its database')
+    parser.add_argument('--backend', type=str, required=False, default='influxdb', choices=BACKENDS,
+                        help='database behind the API, queried directly for comparison')
+    parser.add_argument('--iterations', type=int, required=False,
+                        default=query_bench.TIMED_ITERATIONS,
+                        help='timed iterations per query shape')
+    parser.add_argument('--warmup', type=int, required=False,
+                        default=query_bench.WARMUP_ITERATIONS,
+                        help='untimed iterations after the cold run')
+    parser.add_argument('--baseline', type=str, required=False, default=None,
+                        help='json baseline to compare against and then replace')
+    parser.add_argument('--monasca_url', type=str, required=False, default=monasca_url,
+                        help='Monasca api url')
+    parser.add_argument('--influx_url', type=str, required=False, default=influx_query_test.influx_url,
+                        help='InfluxDB query url')
+    parser.add_argument('--vertica_host', type=str, required=False, default=VERTICA_CONN_INFO['host'],
+                        help='Vertica host')
+    parser.add_argument('--vertica_password', type=str, required=False,
+                        default=VERTICA_CONN_INFO['password'],
+                        help='Vertica dbadmin password')
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = parse_args()
+    monasca_url = args.monasca_url
+    influx_query_test.influx_url = args.influx_url
+    sys.exit(run_attribution(args.backend, args.iterations, args.warmup, args.baseline,
+                             dict(VERTICA_CONN_INFO, host=args.vertica_host,
+                                  password=args.vertica_password)))
@@ -0,0 +1,231 @@
+import bisect
+import heapq
+import itertools
+import math
+import mmap
+import os
+import struct
+import tempfile
+
+""" digest_set
+    Set of 20 byte binary sha1 digests in a fixed memory budget, used by the
+    Vertica filler to dedupe definition, dimension set and def-dim ids.
+    Recent digests live in an open addressing table packed into one
+    bytearray. When the table is full its digests are written out as a
+    sorted run file and the table is cleared. Once there are more than a few
+    runs they are merged into one, so a lookup searches a bounded number of
+    them. A Bloom filter in front of the runs, sized for the expected number
+    of digests at a target false positive rate, means a lookup only goes to
+    disk when the digest was probably spilled.
+    The table stays at the memory budget however many digests are added.
+"""
+
+DIGEST_SIZE = 20
+EMPTY_DIGEST = '\0' * DIGEST_SIZE
+
+MEMORY_BUDGET = 64 * 1024 * 1024
+# digests the Bloom filter is sized for, and its false positive rate at that count
+EXPECTED_COUNT = 10 * 1000 * 1000
+FP_RATE = 0.01
+# table slots used before the table is spilled to disk
+MAX_LOAD = 0.7
+# a spill is sorted one leading byte range at a time, bounding the memory it needs
+SPILL_PARTITIONS = 16
+# runs kept before they are all merged into one
+MAX_RUNS = 4
+# digests read per block when merging runs
+MERGE_BLOCK = 4096
+
+DIGEST_WORDS = struct.Struct('<5I')
+BLOOM_WORDS = struct.Struct('<QQ')
+
+
+class SortedRun(object):
+    """Sorted digests in a file, searched in place through mmap."""
+
+    def __init__(self, sorted_digests, directory=None):
+        fd, self.path = tempfile.mkstemp(prefix='digest_run_', dir=directory)
+        with os.fdopen(fd, 'wb') as f:
+            for data in sorted_digests:
+                f.write(data)
+        self.file = open(self.path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.count = len(self.map) / DIGEST_SIZE
+
+    @classmethod
+    def from_unsorted(cls, digests, directory=None):
+        parts = [tempfile.TemporaryFile(dir=directory) for _ in xrange(SPILL_PARTITIONS)]
+        for digest in digests:
+            parts[ord(digest[0]) * SPILL_PARTITIONS >> 8].write(digest)
+
+        def sorted_parts():
+            for part in parts:
+                part.seek(0)
+                data = part.read()
+                part.close()
+                yield ''.join(sorted(data[i:i + DIGEST_SIZE] for i in xrange(0, len(data), DIGEST_SIZE)))
+
+        return cls(sorted_parts(), directory)
+
+    @classmethod
+    def merged(cls, runs, directory=None):
+        digests = heapq.merge(*runs)
+
+        def blocks():
+            while True:
+                block = ''.join(itertools.islice(digests, MERGE_BLOCK))
+                if not block:
+                    return
+                yield block
+
+        return cls(blocks(), directory)
+
+    def __getitem__(self, index):
+        return self.map[index * DIGEST_SIZE:(index + 1) * DIGEST_SIZE]
+
+    def __iter__(self):
+        for start in xrange(0, self.count, MERGE_BLOCK):
+            block = self.map[start * DIGEST_SIZE:(start + MERGE_BLOCK) * DIGEST_SIZE]
+            for offset in xrange(0, len(block), DIGEST_SIZE):
+                yield block[offset:offset + DIGEST_SIZE]
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, digest):
+        index = bisect.bisect_left(self, digest)
+        return index < self.count and self[index] == digest
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+        os.remove(self.path)
+
+
+class DigestSet(object):
+    def __init__(self, memory_budget=MEMORY_BUDGET, spill_dir=None, expected_count=EXPECTED_COUNT,
+                 fp_rate=FP_RATE):
+        # optimal Bloom filter size and hash count for expected_count keys at fp_rate
+        expected_count = max(expected_count, 1)
+        self.bloom_bits = max(int(math.ceil(-expected_count * math.log(fp_rate) / math.log(2) ** 2)), 64)
+        self.bloom_hashes = max(int(round(self.bloom_bits / float(expected_count) * math.log(2))), 1)
+        self.bloom = bytearray((self.bloom_bits + 7) / 8)
+
+        # largest power of two number of slots that fits the budget
+        slots = 1
+        while slots * 2 * DIGEST_SIZE <= memory_budget:
+            slots *= 2
+        self.slots = slots
+        self.mask = slots - 1
+        self.max_count = int(slots * MAX_LOAD)
+        self.table = bytearray(slots * DIGEST_SIZE)
+        self.count = 0
+
+        self.spill_dir = spill_dir
+        self.runs = []
+        self.spilled = 0
+        self.merges = 0
+        # lookups checked against the Bloom filter, those that went on to disk,
+        # and those that went to disk for a digest that was not there
+        self.bloom_checks = 0
+        self.disk_lookups = 0
+        self.false_positives = 0
+
+    def __len__(self):
+        return self.count + self.spilled
+
+    def _find(self, digest):
+        """Slot holding digest, or the empty slot where it would go."""
+        slot = DIGEST_WORDS.unpack(digest)[0] & self.mask
+        table = self.table
+        while True:
+            offset = slot * DIGEST_SIZE
+            stored = table[offset:offset + DIGEST_SIZE]
+            if stored == digest or stored == EMPTY_DIGEST:
+                return offset, stored == digest
+            slot = (slot + 1) & self.mask
+
+    def _bloom_positions(self, digest):
+        # double hashing over two independent 64 bit words of the digest
+        first, second = BLOOM_WORDS.unpack(digest[4:20])
+        second |= 1
+        return [(first + i * second) % self.bloom_bits for i in xrange(self.bloom_hashes)]
+
+    def _spilled(self, digest):
+        self.bloom_checks += 1
+        for position in self._bloom_positions(digest):
+            if not self.bloom[position >> 3] & (1 << (position & 7)):
+                return False
+        self.disk_lookups += 1
+        for run in self.runs:
+            if digest in run:
+                return True
+        self.false_positives += 1
+        return False
+
+    def __contains__(self, digest):
+        if self._find(digest)[1]:
+            return True
+        return bool(self.runs) and self._spilled(digest)
+
+    def add(self, digest):
+        """Add a binary digest, returns True if it was not already in the set."""
+        offset, found = self._find(digest)
+        if found or (self.runs and self._spilled(digest)):
+            return False
+        self.table[offset:offset + DIGEST_SIZE] = digest
+        self.count += 1
+        if self.count >= self.max_count:
+            self._spill()
+        return True
+
+    def _stored_digests(self):
+        table = self.table
+        for offset in xrange(0, len(table), DIGEST_SIZE):
+            stored = str(table[offset:offset + DIGEST_SIZE])
+            if stored != EMPTY_DIGEST:
+                for position in self._bloom_positions(stored):
+                    self.bloom[position >> 3] |= 1 << (position & 7)
+                yield stored
+
+    def _spill(self):
+        self.runs.append(SortedRun.from_unsorted(self._stored_digests(), self.spill_dir))
+        self.spilled += self.count
+        # free the full table before allocating the empty one
+        self.table = None
+        self.table = bytearray(self.slots * DIGEST_SIZE)
+        self.count = 0
+        if len(self.runs) > MAX_RUNS:
+            merged = SortedRun.merged(self.runs, self.spill_dir)
+            for run in self.runs:
+                run.close()
+            self.runs = [merged]
+            self.merges += 1
+
+    def memory_bytes(self):
+        return len(self.table) + len(self.bloom)
+
+    def stats(self):
+        negative_checks = self.bloom_checks - (self.disk_lookups - self.false_positives)
+        return {'ids': len(self),
+                'spilled': self.spilled,
+                'runs': len(self.runs),
+                'merges': self.merges,
+                'bloom_bits': self.bloom_bits,
+                'bloom_hashes': self.bloom_hashes,
+                'bloom_checks': self.bloom_checks,
+                'disk_lookups': self.disk_lookups,
+                'false_positives': self.false_positives,
+                'fp_rate': self.false_positives / float(negative_checks) if negative_checks else 0.0,
+                'memory_bytes': self.memory_bytes()}
+
+    def describe(self):
+        stats = self.stats()
+        return ("{ids} ids, {spilled} spilled to {runs} runs ({merges} merges), {disk_lookups} disk "
+                "lookups, Bloom {bloom_hashes} hashes measured fp rate {fp_rate:.4f}, "
+                "{memory_mb:.1f} MB in memory").format(memory_mb=stats['memory_bytes'] / 1048576.0, **stats)
+
+    def close(self):
+        for run in self.runs:
+            run.close()
+        self.runs = []
@@ -29,7 +29,7 @@ def parse_args():
                         help="Output directory to place result files. Defaults to current directory", default='',
                         required=False)
     parser.add_argument("--vertica_password",
-                        help="Vertica password for disk.sh and alarm_transitions.sh", default='password',
+                        help="Vertica password for disk.sh and alarm_transitions.py", default='password',
                         required=False)
     parser.add_argument("--mysql_password", help="Password for monapi user for the query alarm states", required=False,
                         default='password')
@@ -56,8 +56,11 @@ def main():
     top_process = subprocess.Popen("exec top -b -d 1 > " + args.output_directory + 'system_info', shell=True)
 
     if args.query_alarm_transitions:
-        test_processes.append(subprocess.Popen("exec ./alarm_transitions.sh " + args.output_directory +
-                                               'alarm_transitions ' + args.vertica_password, shell=True))
+        cmd_line = "python alarm_transitions.py --output_directory " + args.output_directory + \
+                   " --vertica_password " + args.vertica_password
+        if args.run_time:
+            cmd_line += " --run_time " + str(args.run_time)
+        test_processes.append(subprocess.Popen(cmd_line, shell=True))
 
     if args.query_api:
         cmd_line = "python query_alarms.py --monasca_api_url " + args.monasca_api_url
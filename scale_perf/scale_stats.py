@@ -5,6 +5,8 @@ from monascaclient import client
 from monascaclient.common import utils
 from monascaclient import ksclient
 
+import api_fanout
+
 # Reported processes
 monitoring = ['monasca-api',
               'monasca-persister',
@@ -56,6 +58,15 @@ keystone = {
 
 errors = []
 
+fanout = api_fanout.ApiFanout()
+
+# (metric, statistics type) pairs used by the report, fetched in parallel up front
+REPORT_STATISTICS = [('process.cpu_perc', 'avg'),
+                     ('process.mem.rss_mbytes', 'avg'),
+                     ('cpu.idle_perc', 'avg'),
+                     ('mem.usable_mb', 'min'),
+                     ('mem.used_mb', 'max')]
+
 
 class StatsResult(object):
     def __init__(self, data):
@@ -91,14 +102,24 @@ def get_mml_nodes():
     return sorted(mml_nodes)
 
 
-def statistics(metric, stats_type, group_by):
-    return StatsResult(mon_client.metrics.list_statistics(
-                start_time=args.starttime,
+def statistics_args(metric, stats_type, group_by):
+    return dict(start_time=args.starttime,
                 end_time=args.endtime,
                 statistics=stats_type,
                 name=metric,
                 group_by=group_by,
-                period=10000000))
+                period=10000000)
+
+
+def statistics(metric, stats_type, group_by):
+    return StatsResult(fanout.call(mon_client.metrics.list_statistics,
+                                   **statistics_args(metric, stats_type, group_by)))
+
+
+def prefetch_statistics():
+    fanout.map(mon_client.metrics.list_statistics,
+               [statistics_args(metric, stats_type, '*') for metric, stats_type in REPORT_STATISTICS],
+               label='statistics')
 
 
 def get_process_average():
@@ -221,6 +242,7 @@ def process_group_report(processes, nodes, cpu, mem):
 
 
 def generate_report():
+    prefetch_statistics()
     mml_nodes = get_mml_nodes()
 
     host_report(mml_nodes)
@@ -250,6 +272,8 @@ def generate_report():
     for e in errors:
         print(e)
 
+    fanout.close()
+
 
 if __name__ == "__main__":
     args = parse_args()
@@ -0,0 +1,234 @@
+import argparse
+import binascii
+import datetime
+from multiprocessing import Pool
+import os
+import sys
+import time
+
+import vertica_python
+
+from vertica_db_filler import RowStream
+
+# shared results store lives with the InfluxDB perf tools
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'influxdb_perf'))
+import results_store
+
+""" vertica_copy_matrix
+    Sweeps the COPY settings a Vertica measurement loader can choose:
+    rows per COPY, DIRECT (straight to ROS) versus WOS loading, and the
+    number of concurrent loaders, each on its own connection. Every cell
+    loads the same number of measurement rows into an empty copy of
+    MonMetrics.Measurements, built with its projections, then waits for the
+    tuple mover and reports rows/sec, the ROS container count right after
+    the load and after settling, and the Moveout/Mergeout operations run on
+    the table. The copy table is dropped at the end.
+
+        python vertica_copy_matrix.py --batch_sizes 10000,100000,1000000 \\
+            --methods direct,wos --loaders 1,4
+"""
+
+CONN_INFO = {'host': '127.0.0.1',
+             'port': 5433,
+             'user': 'dbadmin',
+             'password': 'password',
+             'database': 'mon',
+             'read_timeout': 600,
+             'unicode_error': 'strict',
+             'ssl': False}
+
+SOURCE_TABLE = 'MonMetrics.Measurements'
+BENCH_SCHEMA = 'MonMetrics'
+BENCH_TABLE = 'Measurements_copy_matrix'
+
+# direct - write straight to ROS containers
+# wos    - AUTO, load into the WOS while it has room and let Moveout write the ROS
+# trickle - WOS only, the load fails once the WOS is full
+LOAD_METHODS = {'direct': 'DIRECT',
+                'wos': 'AUTO',
+                'trickle': 'TRICKLE'}
+
+BATCH_SIZES = '10000,100000,1000000'
+METHODS = 'direct,wos'
+LOADERS = '1,4'
+# measurement rows loaded by each cell, split over its loaders
+CELL_ROWS = 2000000
+# definition dimension ids the rows are spread over, one row each per 30 seconds
+DEFINITIONS = 10000
+MEASUREMENT_INTERVAL = 30
+# seconds to wait after each cell's load for the tuple mover
+SETTLE_TIME = 60
+
+COPY_QUERY = "COPY {0}.{1}(" \
+             "def_dim_hex FILLER VARCHAR(64), " \
+             "definition_dimensions_id AS HEX_TO_BINARY(def_dim_hex), " \
+             "time_stamp, value) " \
+             "FROM STDIN DELIMITER ',' {2} NO COMMIT"
+
+ROS_QUERY = "SELECT COALESCE(SUM(ros_count), 0), COALESCE(SUM(wos_used_bytes), 0) " \
+            "FROM projection_storage WHERE anchor_table_schema = :schema AND anchor_table_name = :table"
+TUPLE_MOVER_QUERY = "SELECT operation_name, COUNT(DISTINCT transaction_id) FROM tuple_mover_operations " \
+                    "WHERE table_schema = :schema AND table_name = :table " \
+                    "AND operation_start_timestamp >= :start GROUP BY operation_name"
+
+
+def measurement_rows(def_dim_ids, row_count, end_timestamp):
+    """row_count rows cycling over the ids, one round per MEASUREMENT_INTERVAL back from end_timestamp."""
+    rounds = (row_count + len(def_dim_ids) - 1) / len(def_dim_ids)
+    for n in xrange(row_count):
+        round_number, index = divmod(n, len(def_dim_ids))
+        timestamp = end_timestamp - datetime.timedelta(
+            seconds=(rounds - round_number) * MEASUREMENT_INTERVAL)
+        yield '{0},{1},{2}\n'.format(def_dim_ids[index], timestamp.strftime('%Y-%m-%d %H:%M:%S'), n)
+
+
+def load_rows(task):
+    """Loader process, COPY its rows in batches on its own connection, returns (rows, secs) per batch."""
+    conn_info, method, batch_size, def_dim_ids, row_count, end_timestamp = task
+    connection = vertica_python.connect(**conn_info)
+    cursor = connection.cursor()
+    query = COPY_QUERY.format(BENCH_SCHEMA, BENCH_TABLE, LOAD_METHODS[method])
+    rows = measurement_rows(def_dim_ids, row_count, end_timestamp)
+    batches = []
+    loaded = 0
+    while loaded < row_count:
+        stream = RowStream(rows, batch_size)
+        start_time = time.time()
+        cursor.copy(query, stream)
+        connection.commit()
+        batches.append((stream.row_count, time.time() - start_time))
+        loaded += stream.row_count
+        if not stream.row_count:
+            break
+    connection.close()
+    return batches
+
+
+def storage(cursor):
+    cursor.execute(ROS_QUERY, {'schema': BENCH_SCHEMA, 'table': BENCH_TABLE})
+    ros_count, wos_bytes = cursor.fetchone()
+    return int(ros_count), int(wos_bytes)
+
+
+def tuple_mover_operations(cursor, start):
+    cursor.execute(TUPLE_MOVER_QUERY, {'schema': BENCH_SCHEMA, 'table': BENCH_TABLE,
+                                       'start': start.strftime('%Y-%m-%d %H:%M:%S')})
+    return dict((name.strip(), int(count)) for name, count in cursor.fetchall())
+
+
+def create_bench_table(cursor):
+    cursor.execute('DROP TABLE IF EXISTS {0}.{1} CASCADE'.format(BENCH_SCHEMA, BENCH_TABLE))
+    cursor.execute('CREATE TABLE {0}.{1} LIKE {2} INCLUDING PROJECTIONS'.format(
+        BENCH_SCHEMA, BENCH_TABLE, SOURCE_TABLE))
+
+
+def run_cell(conn_info, cursor, method, batch_size, loaders, cell_rows, def_dim_ids, settle_time):
+    name = '{0} batch={1} loaders={2}'.format(method, batch_size, loaders)
+    print("\n-- {} ------------------".format(name))
+    cursor.execute('TRUNCATE TABLE {0}.{1}'.format(BENCH_SCHEMA, BENCH_TABLE))
+    cursor.execute('SELECT GETDATE()')
+    cell_start = cursor.fetchone()[0]
+
+    end_timestamp = datetime.datetime.utcnow()
+    tasks = [(conn_info, method, batch_size, def_dim_ids[i::loaders],
+              cell_rows / loaders + (1 if i < cell_rows % loaders else 0), end_timestamp)
+             for i in xrange(loaders)]
+    pool = Pool(loaders)
+    start_time = time.time()
+    batches = [batch for loader_batches in pool.map(load_rows, tasks) for batch in loader_batches]
+    elapsed = time.time() - start_time
+    pool.close()
+    pool.join()
+
+    result = {'name': name,
+              'rows': sum(rows for rows, _ in batches),
+              'elapsed': elapsed,
+              'batch_rates': [rows / secs for rows, secs in batches if secs > 0]}
+    result['rows_per_sec'] = result['rows'] / elapsed
+    result['ros_after_load'], result['wos_bytes_after_load'] = storage(cursor)
+    print("{0} rows in {1:.2f} secs, {2:.0f} rows/sec, {3} ROS containers, {4} WOS bytes".format(
+        result['rows'], elapsed, result['rows_per_sec'], result['ros_after_load'],
+        result['wos_bytes_after_load']))
+
+    time.sleep(settle_time)
+    result['ros_after_settle'], result['wos_bytes_after_settle'] = storage(cursor)
+    operations = tuple_mover_operations(cursor, cell_start)
+    result['moveouts'] = operations.get('Moveout', 0)
+    result['mergeouts'] = operations.get('Mergeout', 0)
+    print("after {0} secs: {1} ROS containers, {2} WOS bytes, {3} moveouts, {4} mergeouts".format(
+        settle_time, result['ros_after_settle'], result['wos_bytes_after_settle'],
+        result['moveouts'], result['mergeouts']))
+    return result
+
+
+def print_report(results):
+    print("\n{:<40}| {:>12} | {:>10} | {:>10} | {:>12} | {:>9} | {:>9}".format(
+        "CELL", "rows/sec", "ROS load", "ROS settle", "WOS bytes", "moveouts", "mergeouts"))
+    print("-" * 118)
+    for r in results:
+        print("{:<40}| {:>12.0f} | {:>10} | {:>10} | {:>12} | {:>9} | {:>9}".format(
+            r['name'], r['rows_per_sec'], r['ros_after_load'], r['ros_after_settle'],
+            r['wos_bytes_after_load'], r['moveouts'], r['mergeouts']))
+
+
+def record(results, params):
+    run = results_store.ResultsRun('vertica_copy_matrix', params)
+    for r in results:
+        run.add(r['name'], 'rows_per_sec', r['rows_per_sec'])
+        run.add(r['name'] + ' batch', 'rows_per_sec', r['batch_rates'])
+        for metric in ('ros_after_load', 'ros_after_settle', 'moveouts', 'mergeouts'):
+            run.add(r['name'], metric, r[metric])
+    print("results recorded as run {}".format(run.run_id))
+
+
+def main():
+    args = parse_args()
+    conn_info = dict(CONN_INFO, host=args.vertica_host, password=args.vertica_password)
+    def_dim_ids = [binascii.hexlify(os.urandom(20)) for _ in xrange(args.definitions)]
+
+    connection = vertica_python.connect(**conn_info)
+    cursor = connection.cursor()
+    create_bench_table(cursor)
+    results = []
+    try:
+        for method in args.methods.split(','):
+            for batch_size in [int(size) for size in args.batch_sizes.split(',')]:
+                for loaders in [int(count) for count in args.loaders.split(',')]:
+                    results.append(run_cell(conn_info, cursor, method, batch_size, loaders,
+                                            args.rows, def_dim_ids, args.settle_time))
+    finally:
+        cursor.execute('DROP TABLE IF EXISTS {0}.{1} CASCADE'.format(BENCH_SCHEMA, BENCH_TABLE))
+        connection.close()
+
+    print_report(results)
+    record(results, {'rows': args.rows, 'definitions': args.definitions,
+                     'settle_time': args.settle_time})
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='sweep Vertica COPY batch size, load method and loader concurrency')
+    parser.add_argument('--batch_sizes', type=str, required=False, default=BATCH_SIZES,
+                        help='comma separated rows per COPY')
+    parser.add_argument('--methods', type=str, required=False, default=METHODS,
+                        help='comma separated load methods, of ' + ', '.join(sorted(LOAD_METHODS)))
+    parser.add_argument('--loaders', type=str, required=False, default=LOADERS,
+                        help='comma separated concurrent loader counts')
+    parser.add_argument('--rows', type=int, required=False, default=CELL_ROWS,
+                        help='measurement rows loaded by each cell')
+    parser.add_argument('--definitions', type=int, required=False, default=DEFINITIONS,
+                        help='definition dimension ids the rows are spread over')
+    parser.add_argument('--settle_time', type=int, required=False, default=SETTLE_TIME,
+                        help='seconds to wait for the tuple mover after each load')
+    parser.add_argument('--vertica_host', type=str, required=False, default=CONN_INFO['host'],
+                        help='Vertica host')
+    parser.add_argument('--vertica_password', type=str, required=False, default=CONN_INFO['password'],
+                        help='Vertica dbadmin password')
+    args = parser.parse_args()
+    for method in args.methods.split(','):
+        if method not in LOAD_METHODS:
+            parser.error('unknown load method {}'.format(method))
+    return args
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,5 +1,7 @@
+import argparse
 import datetime
 import sys
+import time
 import vertica_python
 
 """ vertica_db_filler
@@ -8,13 +10,17 @@ import vertica_python
     that has the desired number of metric definitions.
     This will use the existing dimensions in the DB to add measurements for each metric definition.
 
+    All definition dimension ids are read with one query, then the measurement rows are generated
+    as a stream and loaded with COPY FROM STDIN in large batches over the same connection.
+
 """
-SELECT_DIMENSIONS_QUERY = "SELECT TO_HEX(id) AS id,TO_HEX(dimension_set_id) AS dimension_set_id " \
-                          "FROM MonMetrics.DefinitionDimensions WHERE TO_HEX(definition_id) = '{}';"
-#INSERT_MEASUREMENT_QUERY = "INSERT /*+ direct */ INTO MonMetrics.Measurements " \
-INSERT_MEASUREMENT_QUERY = "INSERT INTO MonMetrics.Measurements " \
-                           "(definition_dimensions_id,time_stamp,value) " \
-                           "VALUES (HEX_TO_BINARY('0x{}'),'{}',{});"
+SELECT_DEFINITION_DIMENSIONS_QUERY = "SELECT TO_HEX(id) FROM MonMetrics.DefinitionDimensions;"
+# ids arrive as hex text and are converted back to binary by the COPY itself
+MEASUREMENT_COPY_QUERY = "COPY MonMetrics.Measurements(" \
+                         "def_dim_hex FILLER VARCHAR(64), " \
+                         "definition_dimensions_id AS HEX_TO_BINARY(def_dim_hex), " \
+                         "time_stamp, value) " \
+                         "FROM STDIN DELIMITER ',' DIRECT NO COMMIT;"
 
 #conn_info = {'host': '127.0.0.1',
 conn_info = {'host': '192.168.245.3',
@@ -33,42 +39,93 @@ conn_info = {'host': '192.168.245.3',
 measurements_per_day = 1
 # will fill x number days from current day including current day
 number_of_days = 1
+# measurement rows per COPY, each COPY is committed on its own
+copy_batch_size = 1000000
 
 
-def create_measurements(current_timestamp, def_dim_id, connection):
-    cur = connection.cursor()
-    days = number_of_days
-    while (days >= 0):
-        new_timestamp = current_timestamp - datetime.timedelta(days=days)
-        formatted_timestamp = new_timestamp.strftime('%Y-%m-%d %H:%M:%S')
-        for x in range(measurements_per_day):
-            query = INSERT_MEASUREMENT_QUERY.format(def_dim_id, formatted_timestamp, x)
-            cur.execute(query)
-        days -= 1
-    connection.commit()
+class RowStream(object):
+    """File-like read() over a row generator, so a COPY never holds its whole batch in memory."""
+
+    def __init__(self, rows, max_rows):
+        self.rows = rows
+        self.max_rows = max_rows
+        self.row_count = 0
+        self.buffer = ''
+
+    def read(self, size=-1):
+        pieces = [self.buffer]
+        length = len(self.buffer)
+        while self.row_count < self.max_rows and (size < 0 or length < size):
+            try:
+                row = next(self.rows)
+            except StopIteration:
+                self.max_rows = self.row_count
+                break
+            pieces.append(row)
+            length += len(row)
+            self.row_count += 1
+        data = ''.join(pieces)
+        if size < 0:
+            size = length
+        self.buffer = data[size:]
+        return data[:size]
+
 
+def measurement_rows(def_dim_ids, current_timestamp, days, per_day):
+    timestamps = [(current_timestamp - datetime.timedelta(days=day)).strftime('%Y-%m-%d %H:%M:%S')
+                  for day in xrange(days, -1, -1)]
+    for def_dim_id in def_dim_ids:
+        for formatted_timestamp in timestamps:
+            for x in xrange(per_day):
+                yield '{0},{1},{2}\n'.format(def_dim_id, formatted_timestamp, x)
 
-def vertica_db_filler():
+
+def vertica_db_filler(days=number_of_days, per_day=measurements_per_day, batch_size=copy_batch_size):
 
     connection = vertica_python.connect(**conn_info)
+    cur = connection.cursor()
 
-    cur = connection.cursor('dict')
-    cur.execute("SELECT TO_HEX(id) as id,name from MonMetrics.Definitions")
-    id_list = cur.fetchall()
+    start_time = time.time()
+    cur.execute(SELECT_DEFINITION_DIMENSIONS_QUERY)
+    def_dim_ids = [row[0] for row in cur.iterate()]
+    print("Read {0} definition dimensions in {1:.2f} secs".format(len(def_dim_ids),
+                                                                  time.time() - start_time))
 
-    for id_dict in id_list:
-        # find all definition dimensions and dimension sets
-        print id_dict['name']
-        query = SELECT_DIMENSIONS_QUERY.format(str(id_dict['id']))
-        cur = connection.cursor('dict')
-        cur.execute(query)
-        dim_list = cur.fetchall()
-        for dim in dim_list:
-            create_measurements(datetime.datetime.utcnow(), dim['id'], connection)
+    total_rows = len(def_dim_ids) * (days + 1) * per_day
+    rows = measurement_rows(def_dim_ids, datetime.datetime.utcnow(), days, per_day)
+    loaded = 0
+    start_time = time.time()
+    while loaded < total_rows:
+        stream = RowStream(rows, batch_size)
+        batch_start = time.time()
+        cur.copy(MEASUREMENT_COPY_QUERY, stream)
+        connection.commit()
+        loaded += stream.row_count
+        now = time.time()
+        print("{0}/{1} measurements ({2:.1%}), batch {3:.0f} rows/sec, total {4:.0f} rows/sec".format(
+            loaded, total_rows, loaded / float(total_rows), stream.row_count / (now - batch_start),
+            loaded / (now - start_time)))
+        if not stream.row_count:
+            break
 
     connection.close()
+    print("Loaded {0} measurements in {1:.2f} secs".format(loaded, time.time() - start_time))
     print('Finished loading DB')
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='add measurements to every existing metric definition in Vertica')
+    parser.add_argument('--days', type=int, required=False, default=number_of_days,
+                        help='days back from today to fill, today included')
+    parser.add_argument('--measurements_per_day', type=int, required=False,
+                        default=measurements_per_day,
+                        help='measurements per day for each definition dimension')
+    parser.add_argument('--batch_size', type=int, required=False, default=copy_batch_size,
+                        help='measurement rows per COPY')
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
-    sys.exit(vertica_db_filler())
+    args = parse_args()
+    sys.exit(vertica_db_filler(args.days, args.measurements_per_day, args.batch_size))
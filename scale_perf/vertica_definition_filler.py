@@ -1,16 +1,31 @@
+import argparse
+import binascii
 import datetime
 import hashlib
 from multiprocessing import Pool
 import random
 import os
+import Queue
 import string
 import subprocess
 import sys
+import threading
 import time
 import uuid
 
+import vertica_python
+
+from digest_set import DigestSet
+
+# shared results store lives with the InfluxDB perf tools
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'influxdb_perf'))
+import results_store
+
 """ vertica_definition_filler
     This will simulate a number of days worth of metric definition history.
+    Rows are loaded with COPY FROM STDIN over one persistent connection per
+    process, or with the original temp file + vsql COPY (--loader vsql); the
+    time of every flush is reported so the two can be compared.
 """
 
 # Clear the current metrics from the DB for testing
@@ -34,7 +49,10 @@ BASE_TIMESTAMP = datetime.datetime.utcnow() - datetime.timedelta(days=45)
 # number of days to fill
 DAYS_TO_FILL = 4
 
-CONN_INFO = {'user': 'dbadmin',
+CONN_INFO = {'host': '127.0.0.1',
+             'port': 5433,
+             'database': 'mon',
+             'user': 'dbadmin',
              'password': 'password'
              }
 
@@ -49,6 +67,17 @@ TOTAL_VM_TENANTS = 256
 
 # number of definitions to store in memory before writing to vertica
 LOCAL_STORAGE_MAX = 1000000
+# load definitions in a background thread while the next buffer is generated
+BACKGROUND_FLUSH = True
+
+# memory for each id dedupe set, ids beyond it are spilled to sorted files on disk
+DEF_ID_MEMORY = 16 * 1024 * 1024
+DIM_ID_MEMORY = 64 * 1024 * 1024
+DEF_DIM_ID_MEMORY = 256 * 1024 * 1024
+# directory for the spilled id files, None uses the system temp directory
+ID_SPILL_DIR = None
+# false positive rate of the Bloom filters in front of the spilled ids, sized for the expected fill
+ID_FP_RATE = 0.01
 
 
 DEF_DIMS_FILENAME = '/tmp/defdims.dat'
@@ -59,18 +88,44 @@ DIMENSIIONS_FILENAME = '/tmp/dimensions.dat'
 
 MEASUREMENTS_FILENAME = '/tmp/measurements.dat'
 
-DEFINITION_COPY_QUERY = "COPY MonMetrics.DefinitionDimensions(id,definition_id,dimension_set_id) FROM '{}' " \
+# ids arrive as 40 character hex text and are converted back to BINARY(20) by the COPY itself
+DEF_DIMS_COLUMNS = "id_hex FILLER VARCHAR(40), id AS HEX_TO_BINARY(id_hex), " \
+                   "definition_id_hex FILLER VARCHAR(40), definition_id AS HEX_TO_BINARY(definition_id_hex), " \
+                   "dimension_set_id_hex FILLER VARCHAR(40), " \
+                   "dimension_set_id AS HEX_TO_BINARY(dimension_set_id_hex)"
+DEFINITIONS_COLUMNS = "id_hex FILLER VARCHAR(40), id AS HEX_TO_BINARY(id_hex), name, tenant_id, region"
+DIMENSIONS_COLUMNS = "dimension_set_id_hex FILLER VARCHAR(40), " \
+                     "dimension_set_id AS HEX_TO_BINARY(dimension_set_id_hex), name, value"
+MEASUREMENTS_COLUMNS = "def_dim_hex FILLER VARCHAR(40), definition_dimensions_id AS HEX_TO_BINARY(def_dim_hex), " \
+                       "time_stamp, value"
+
+DEFINITION_COPY_QUERY = "COPY MonMetrics.DefinitionDimensions(" + DEF_DIMS_COLUMNS + ") FROM '{}' " \
                         "DELIMITER ',' DIRECT COMMIT; " \
-                        "COPY MonMetrics.Definitions(id,name,tenant_id,region) FROM '{}' " \
+                        "COPY MonMetrics.Definitions(" + DEFINITIONS_COLUMNS + ") FROM '{}' " \
                         "DELIMITER ',' DIRECT COMMIT; " \
-                        "COPY MonMetrics.Dimensions(dimension_set_id,name,value) FROM '{}' " \
+                        "COPY MonMetrics.Dimensions(" + DIMENSIONS_COLUMNS + ") FROM '{}' " \
                         "DELIMITER ',' DIRECT COMMIT; "
-MEASUREMENT_COPY_QUERY = "COPY MonMetrics.Measurements(definition_dimensions_id,time_stamp,value) FROM '{}' " \
+MEASUREMENT_COPY_QUERY = "COPY MonMetrics.Measurements(" + MEASUREMENTS_COLUMNS + ") FROM '{}' " \
                          "DELIMITER ',' DIRECT COMMIT; "
 
-def_id_set = set()
-dim_id_set = set()
-def_dim_id_set = set()
+# stdin - COPY FROM STDIN over a persistent vertica_python connection
+# vsql  - write a temp file and run COPY through /opt/vertica/bin/vsql
+LOADERS = ['stdin', 'vsql']
+LOADER = 'stdin'
+
+DEF_DIMS_STDIN_QUERY = "COPY MonMetrics.DefinitionDimensions(" + DEF_DIMS_COLUMNS + ") " \
+                       "FROM STDIN DELIMITER ',' DIRECT"
+DEFINITIONS_STDIN_QUERY = "COPY MonMetrics.Definitions(" + DEFINITIONS_COLUMNS + ") " \
+                          "FROM STDIN DELIMITER ',' DIRECT"
+DIMENSIONS_STDIN_QUERY = "COPY MonMetrics.Dimensions(" + DIMENSIONS_COLUMNS + ") " \
+                         "FROM STDIN DELIMITER ',' DIRECT"
+MEASUREMENTS_STDIN_QUERY = "COPY MonMetrics.Measurements(" + MEASUREMENTS_COLUMNS + ") " \
+                           "FROM STDIN DELIMITER ',' DIRECT"
+
+# id dedupe sets, created by create_id_sets once the size of the fill is known
+def_id_set = None
+dim_id_set = None
+def_dim_id_set = None
 def_list = []
 dims_list = []
 def_dims_list = []
@@ -79,6 +134,20 @@ measurement_process_id = 0
 total_measurement_processes = 5
 
 next_hostname_id = 1
+
+# (rows, seconds) of each definition flush
+definition_flush_times = []
+# DefinitionFlusher of the current fill, None flushes inline
+definition_flusher = None
+
+# sha1 state after each metric name, definition ids continue from copies of it
+name_hashes = {}
+# (name, tenant_id, region) -> (binary digest, hex) definition id
+definition_ids = {}
+
+# connection of this process, pool workers open their own on first use
+connection = None
+connection_pid = None
 measurements_per_hour = 120 if FULL_MEASUREMENTS else 1
 
 ID_SIZE = 20
@@ -264,81 +333,53 @@ class vmSimulator(object):
         self.preload_metrics()
 
     def preload_metrics(self):
-        for name in vmSimulator.metric_names:
-            dimensions = self.base_dimensions.copy()
-            tenant_id = self.vm_tenant_id
+        # every metric's dimensions are the base dimensions plus at most a tenant and a
+        # device, so hash the base once and continue from copies of that state
+        base_hash = dimensions_hash(self.base_dimensions)
+        dimension_set_ids = {}
 
-            if name.startswith('vm.'):
-                dimensions['tenant_id'] = self.vm_tenant_id
-                tenant_id = self.admin_tenant_id
-
-            metric_id = add_full_definition(name=name,
-                                            dimensions=dimensions,
-                                            tenant_id=tenant_id,
-                                            region=REGION)
-            self.metric_ids.add(metric_id)
+        for name in vmSimulator.metric_names:
+            self.metric_ids.add(self.add_metric(name, None, base_hash, dimension_set_ids))
 
         for name in vmSimulator.disk_agg_metric_names:
-            dimensions = self.base_dimensions.copy()
-            tenant_id = self.vm_tenant_id
-
-            if name.startswith('vm.'):
-                dimensions['tenant_id'] = self.vm_tenant_id
-                tenant_id = self.admin_tenant_id
-
-            metric_id = add_full_definition(name=name,
-                                            dimensions=dimensions,
-                                            tenant_id=tenant_id,
-                                            region=REGION)
-            self.disk_metric_ids.add(metric_id)
+            self.disk_metric_ids.add(self.add_metric(name, None, base_hash, dimension_set_ids))
 
         for name in vmSimulator.disk_metric_names:
             for disk in vmSimulator.disks:
-                dimensions = self.base_dimensions.copy()
-                tenant_id = self.vm_tenant_id
-
-                if name.startswith('vm.'):
-                    dimensions['tenant_id'] = self.vm_tenant_id
-                    tenant_id = self.admin_tenant_id
-
-                dimensions['device'] = disk
-                metric_id = add_full_definition(name=name,
-                                                dimensions=dimensions,
-                                                tenant_id=tenant_id,
-                                                region=REGION)
-                self.disk_metric_ids.add(metric_id)
+                self.disk_metric_ids.add(self.add_metric(name, disk, base_hash, dimension_set_ids))
 
         for name in vmSimulator.network_metric_names:
             for device in vmSimulator.network_devices:
-                dimensions = self.base_dimensions.copy()
-                tenant_id = self.vm_tenant_id
-
-                if name.startswith('vm.'):
-                    dimensions['tenant_id'] = self.vm_tenant_id
-                    tenant_id = self.admin_tenant_id
-
-                dimensions['device'] = device
-                metric_id = add_full_definition(name=name,
-                                                dimensions=dimensions,
-                                                tenant_id=tenant_id,
-                                                region=REGION)
-                self.metric_ids.add(metric_id)
+                self.metric_ids.add(self.add_metric(name, device, base_hash, dimension_set_ids))
 
         for name in vmSimulator.vswitch_metric_names:
             for switch in vmSimulator.vswitches:
-                dimensions = self.base_dimensions.copy()
-                tenant_id = self.vm_tenant_id
-
-                if name.startswith('vm.'):
-                    dimensions['tenant_id'] = self.vm_tenant_id
-                    tenant_id = self.admin_tenant_id
+                self.vswitch_metric_ids.add(self.add_metric(name, switch, base_hash, dimension_set_ids))
+
+    def add_metric(self, name, device, base_hash, dimension_set_ids):
+        tenant_id = self.vm_tenant_id
+        extra_dimensions = {}
+        if name.startswith('vm.'):
+            extra_dimensions['tenant_id'] = self.vm_tenant_id
+            tenant_id = self.admin_tenant_id
+        if device is not None:
+            extra_dimensions['device'] = device
+
+        # the dimension rows are only needed the first time this vm sees the set
+        dimensions = None
+        key = (name.startswith('vm.'), device)
+        dimension_set_id = dimension_set_ids.get(key)
+        if dimension_set_id is None:
+            dimension_set_id = digest_id(dimensions_hash(extra_dimensions, base_hash))
+            dimension_set_ids[key] = dimension_set_id
+            dimensions = self.base_dimensions.copy()
+            dimensions.update(extra_dimensions)
 
-                dimensions['device'] = switch
-                metric_id = add_full_definition(name=name,
-                                                dimensions=dimensions,
-                                                tenant_id=tenant_id,
-                                                region=REGION)
-                self.vswitch_metric_ids.add(metric_id)
+        return add_full_definition(name=name,
+                                   dimensions=dimensions,
+                                   tenant_id=tenant_id,
+                                   region=REGION,
+                                   dimension_set_id=dimension_set_id)
 
     def get_metric_ids(self, cycle=None):
         result = set()
@@ -387,6 +428,17 @@ class vmSimulator(object):
 
         return base_defs + disk_agg_defs + disk_defs + network_defs + vswitch_defs
 
+    @staticmethod
+    def get_total_dimension_sets():
+        """Distinct dimension sets of one vm, keyed the same way as in add_metric."""
+        keys = set((name.startswith('vm.'), None)
+                   for name in vmSimulator.metric_names + vmSimulator.disk_agg_metric_names)
+        for names, devices in ((vmSimulator.disk_metric_names, vmSimulator.disks),
+                               (vmSimulator.network_metric_names, vmSimulator.network_devices),
+                               (vmSimulator.vswitch_metric_names, vmSimulator.vswitches)):
+            keys.update((name.startswith('vm.'), device) for name in names for device in devices)
+        return len(keys)
+
 
 def add_measurement_batch(vm_list, filename=MEASUREMENTS_FILENAME):
     meas_list = []
@@ -399,39 +451,62 @@ def add_measurement_batch(vm_list, filename=MEASUREMENTS_FILENAME):
             break
         meas_list.extend(new_measurements)
 
-    flush_measurement_data(meas_list, filename)
+    return len(meas_list), flush_measurement_data(meas_list, filename)
+
+
+def digest_id(id_hash):
+    """(binary digest, hex) of a finished sha1, COPY rows carry the hex form into HEX_TO_BINARY."""
+    digest = id_hash.digest()
+    return digest, binascii.hexlify(digest)
+
+
+def get_definition_id(name, tenant_id, region):
+    key = (name, tenant_id, region)
+    definition_id = definition_ids.get(key)
+    if definition_id is None:
+        name_hash = name_hashes.get(name)
+        if name_hash is None:
+            name_hash = name_hashes[name] = hashlib.sha1(str(name))
+        id_hash = name_hash.copy()
+        id_hash.update(str(tenant_id) + str(region))
+        definition_id = definition_ids[key] = digest_id(id_hash)
+    return definition_id
+
+
+def dimensions_hash(dimensions, base_hash=None):
+    """sha1 of the dimensions as sorted ',key=value' items, continuing a copy of base_hash if given."""
+    id_hash = base_hash.copy() if base_hash is not None else hashlib.sha1()
+    id_hash.update(''.join([',' + str(key) + '=' + str(dimensions[key]) for key in sorted(dimensions)]))
+    return id_hash
 
 
 def add_full_definition(name, dimensions, tenant_id='tenant_1', region='region_1',
                         def_dim_id=None, definition_id=None, dimension_set_id=None):
+    """Queue the rows of a new definition, dimension set and definition dimension.
+
+    Ids are (binary digest, hex) pairs, hashed here when not given. With a
+    dimension_set_id and no dimensions the caller has already added that set.
+    Returns the hex definition dimension id used by the measurement rows.
+    """
     if definition_id is None:
-        id_hash = hashlib.sha1()
-        id_hash.update(str(name) + str(tenant_id) + str(region))
-        definition_id = id_hash.hexdigest()
+        definition_id = get_definition_id(name, tenant_id, region)
 
-    if definition_id not in def_id_set:
-        def_list.append(','.join([definition_id, name, tenant_id, region]))
-        def_id_set.add(definition_id)
+    if def_id_set.add(definition_id[0]):
+        def_list.append(','.join([definition_id[1], name, tenant_id, region]))
 
     if dimension_set_id is None:
-        id_hash = hashlib.sha1()
-        id_hash.update(','.join([str(key) + '=' + str(dimensions[key]) for key in dimensions.keys()]))
-        dimension_set_id = id_hash.hexdigest()
+        dimension_set_id = digest_id(dimensions_hash(dimensions))
 
-    if dimension_set_id not in dim_id_set:
-        dims_list.append(get_dimension_set_str(dimensions, dimension_set_id))
-        dim_id_set.add(dimension_set_id)
+    if dimensions is not None and dim_id_set.add(dimension_set_id[0]):
+        dims_list.append(get_dimension_set_str(dimensions, dimension_set_id[1]))
 
     if def_dim_id is None:
-        id_hash = hashlib.sha1()
-        id_hash.update(str(definition_id) + str(dimension_set_id))
-        def_dim_id = id_hash.hexdigest()
+        def_dim_id = digest_id(hashlib.sha1(definition_id[0] + dimension_set_id[0]))
 
-    if def_dim_id not in def_dim_id_set:
-        def_dims_list.append(','.join([def_dim_id, definition_id, dimension_set_id]))
-        def_dim_id_set.add(def_dim_id)
+    if def_dim_id_set.add(def_dim_id[0]):
+        def_dims_list.append(','.join([def_dim_id[1], definition_id[1], dimension_set_id[1]]))
 
-    return def_dim_id
+    return def_dim_id[1]
 
 
 def get_dimension_set_str(dimensions, dimension_set_id):
@@ -449,24 +524,60 @@ def set_dimension_values(active_dimensions, base_dimensions, day, hour, definiti
                                                              definition=definition)
 
 
+def get_connection():
+    global connection, connection_pid
+    if connection is None or connection_pid != os.getpid():
+        connection = vertica_python.connect(**CONN_INFO)
+        connection_pid = os.getpid()
+    return connection
+
+
+def copy_stdin(query, data):
+    conn = get_connection()
+    conn.cursor().copy(query, data)
+    conn.commit()
+
+
 def flush_definition_data():
-    global def_dims_list
+    """Hand the filled definition buffers to the loader and start new ones."""
+    global def_dims_list, def_list, dims_list
+    buffers = (def_dims_list, def_list, dims_list)
+    def_dims_list = []
+    def_list = []
+    dims_list = []
+    if definition_flusher is not None:
+        definition_flusher.submit(buffers)
+    else:
+        load_definition_data(*buffers)
+
+
+def load_definition_data(def_dims, defs, dims):
+    start_time = time.time()
+    if LOADER == 'stdin':
+        load_definition_data_stdin(def_dims, defs, dims)
+    else:
+        load_definition_data_vsql(def_dims, defs, dims)
+    definition_flush_times.append((len(def_dims), time.time() - start_time))
+
+
+def load_definition_data_stdin(def_dims, defs, dims):
+    copy_stdin(DEF_DIMS_STDIN_QUERY, '\n'.join(def_dims) + '\n')
+    copy_stdin(DEFINITIONS_STDIN_QUERY, '\n'.join(defs) + '\n')
+    copy_stdin(DIMENSIONS_STDIN_QUERY, '\n'.join(dims) + '\n')
+
+
+def load_definition_data_vsql(def_dims, defs, dims):
     def_dims_temp = open(DEF_DIMS_FILENAME, 'w')
-    def_dims_temp.write('\n'.join(def_dims_list) + '\n')
+    def_dims_temp.write('\n'.join(def_dims) + '\n')
     def_dims_temp.close()
-    def_dims_list = []
 
-    global def_list
     def_temp = open(DEFINITIONS_FILENAME, 'w')
-    def_temp.write('\n'.join(def_list) + '\n')
+    def_temp.write('\n'.join(defs) + '\n')
     def_temp.close()
-    def_list = []
 
-    global dims_list
     dims_temp = open(DIMENSIIONS_FILENAME, 'w')
-    dims_temp.write('\n'.join(dims_list) + '\n')
+    dims_temp.write('\n'.join(dims) + '\n')
     dims_temp.close()
-    dims_list = []
 
     query = DEFINITION_COPY_QUERY.format(DEF_DIMS_FILENAME,
                                          DEFINITIONS_FILENAME,
@@ -474,9 +585,68 @@ def flush_definition_data():
     run_query(query)
 
 
+class DefinitionFlusher(object):
+    """Loads one set of definition buffers in a thread while generation fills the next.
+
+    Only one set is ever queued or loading, so when generation fills its
+    buffers before the previous load is done, submit() blocks until it is.
+    """
+
+    def __init__(self):
+        self.queue = Queue.Queue(maxsize=1)
+        self.start_time = time.time()
+        # seconds the loader spent loading, and generation spent blocked on it
+        self.load_time = 0.0
+        self.wait_time = 0.0
+        self.error = None
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def run(self):
+        while True:
+            buffers = self.queue.get()
+            if buffers is None:
+                self.queue.task_done()
+                return
+            start_time = time.time()
+            try:
+                load_definition_data(*buffers)
+            except Exception as ex:
+                self.error = ex
+            self.load_time += time.time() - start_time
+            self.queue.task_done()
+
+    def submit(self, buffers):
+        start_time = time.time()
+        self.queue.join()
+        self.wait_time += time.time() - start_time
+        if self.error:
+            raise self.error
+        self.queue.put(buffers)
+
+    def close(self):
+        self.queue.join()
+        self.queue.put(None)
+        self.thread.join()
+        if self.error:
+            raise self.error
+
+    def utilization(self):
+        elapsed = (time.time() - self.start_time) or 1.0
+        return "generator {0:.1%} busy, loader {1:.1%} busy".format(
+            (elapsed - self.wait_time) / elapsed, self.load_time / elapsed)
+
+
 def flush_measurement_data(meas_list, filename):
+    """Load one batch of measurement rows, each already newline terminated, returns the seconds taken."""
+    start_time = time.time()
+    if LOADER == 'stdin':
+        copy_stdin(MEASUREMENTS_STDIN_QUERY, ''.join(meas_list))
+        return time.time() - start_time
+
     meas_temp = open(filename, 'w')
-    meas_temp.write('\n'.join(meas_list) + '\n')
+    meas_temp.write(''.join(meas_list))
     meas_temp.close()
 
     query = MEASUREMENT_COPY_QUERY.format(filename)
@@ -484,6 +654,34 @@ def flush_measurement_data(meas_list, filename):
     run_query(query)
 
     os.remove(filename)
+    return time.time() - start_time
+
+
+def report_flush_times(measurement_flush_times):
+    run = results_store.ResultsRun('vertica_definition_filler',
+                                   {'loader': LOADER, 'background_flush': BACKGROUND_FLUSH,
+                                    'days': DAYS_TO_FILL,
+                                    'new_vms_per_hour': NEW_VMS_PER_HOUR,
+                                    'full_measurements': FULL_MEASUREMENTS})
+    for name, flush_times in (('definitions', definition_flush_times),
+                              ('measurements', measurement_flush_times)):
+        rows = sum(r for r, _ in flush_times)
+        seconds = sum(s for _, s in flush_times)
+        print("{0} loader {1}: {2} flushes, {3} rows in {4:.2f} secs, {5:.0f} rows/sec".format(
+            name, LOADER, len(flush_times), rows, seconds, rows / seconds if seconds else 0))
+        run.add(name + ' flush', 'rows_per_sec', [r / s for r, s in flush_times if s > 0])
+
+
+def create_id_sets(total_vms):
+    """Create the id dedupe sets, their Bloom filters sized for a fill of total_vms."""
+    global def_id_set, dim_id_set, def_dim_id_set
+    metrics_per_vm = vmSimulator.get_total_metric_defs()
+    def_id_set = DigestSet(DEF_ID_MEMORY, ID_SPILL_DIR,
+                           metrics_per_vm * (TOTAL_VM_TENANTS + 1), ID_FP_RATE)
+    dim_id_set = DigestSet(DIM_ID_MEMORY, ID_SPILL_DIR,
+                           total_vms * vmSimulator.get_total_dimension_sets(), ID_FP_RATE)
+    def_dim_id_set = DigestSet(DEF_DIM_ID_MEMORY, ID_SPILL_DIR,
+                               total_vms * metrics_per_vm, ID_FP_RATE)
 
 
 def id_generator(size=32, chars=string.hexdigits):
@@ -506,7 +704,12 @@ def fill_metrics(base_timestamp, days_to_fill, new_vms_per_hour, vms_below_proba
 
     standard_lifespan = min(churn_lifespan, available_lifespan)
 
+    if def_dim_id_set is None:
+        create_id_sets(days_to_fill * 24 * (new_vms_per_hour + vms_below_probation))
     initial_id_set_size = len(def_dim_id_set)
+    results = []
+    global definition_flusher
+    definition_flusher = DefinitionFlusher() if BACKGROUND_FLUSH else None
     start_time = time.time()
     for x in xrange(days_to_fill):
         for y in xrange(24):
@@ -535,9 +738,9 @@ def fill_metrics(base_timestamp, days_to_fill, new_vms_per_hour, vms_below_proba
             #     active_vms = active_vms[new_vms_per_hour:]
 
             global measurement_process_id
-            measurement_process_pool.apply_async(add_measurement_batch,
-                                                 args=(active_vms,
-                                                       MEASUREMENTS_FILENAME + str(measurement_process_id,)))
+            results.append(measurement_process_pool.apply_async(
+                add_measurement_batch,
+                args=(active_vms, MEASUREMENTS_FILENAME + str(measurement_process_id,))))
             measurement_process_id += 1
 
             # submit definitions in batches to avoid
@@ -547,6 +750,8 @@ def fill_metrics(base_timestamp, days_to_fill, new_vms_per_hour, vms_below_proba
                 flush_definition_data()
                 delta_def_dim_ids = len(def_dim_id_set) - initial_id_set_size
                 print("{0:.2f} %".format(delta_def_dim_ids / float(expected_definitions) * 100))
+                if definition_flusher is not None:
+                    print(definition_flusher.utilization())
 
     # insert any remaining definitions
     if len(def_dims_list) > 0:
@@ -554,6 +759,10 @@ def fill_metrics(base_timestamp, days_to_fill, new_vms_per_hour, vms_below_proba
         flush_definition_data()
         delta_def_dim_ids = len(def_dim_id_set) - initial_id_set_size
         print("{0:.2f} %".format(delta_def_dim_ids / float(expected_definitions) * 100))
+    if definition_flusher is not None:
+        definition_flusher.close()
+        print("Definition flush: {}".format(definition_flusher.utilization()))
+        definition_flusher = None
 
     print("Waiting for measurement process pool to close")
     measurement_process_pool.close()
@@ -562,6 +771,17 @@ def fill_metrics(base_timestamp, days_to_fill, new_vms_per_hour, vms_below_proba
     total_time_delta = time.time() - start_time
     print("Loaded {0} definitions in {1:.2f} secs".format(len(def_dim_id_set), total_time_delta))
     print("{0:.0f} def/sec\n".format(len(def_dim_id_set) / total_time_delta))
+    for name, id_set in (('definition', def_id_set), ('dimension set', dim_id_set),
+                         ('definition dimension', def_dim_id_set)):
+        print("{0} ids: {1}".format(name, id_set.describe()))
+
+    measurement_flush_times = []
+    for result in results:
+        try:
+            measurement_flush_times.append(result.get())
+        except Exception as ex:
+            print("measurement batch failed: {}".format(ex))
+    report_flush_times(measurement_flush_times)
 
 
 def run_query(query):
@@ -584,6 +804,8 @@ def vertica_db_filler():
         run_query(query)
     print("Creating metric history for {} days".format(DAYS_TO_FILL))
     fill_metrics(BASE_TIMESTAMP, DAYS_TO_FILL, NEW_VMS_PER_HOUR, VMS_BELOW_PROBATION)
+    for id_set in (def_id_set, dim_id_set, def_dim_id_set):
+        id_set.close()
 
     print("Checking if data arrived...")
     print("DefinitionDimensions")
@@ -596,5 +818,18 @@ def vertica_db_filler():
     print('Finished loading VDB')
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='fill Vertica with simulated vm metric definition history')
+    parser.add_argument('--loader', type=str, required=False, default=LOADER, choices=LOADERS,
+                        help='COPY FROM STDIN on a persistent connection, or temp files and vsql')
+    parser.add_argument('--inline_flush', action='store_true', required=False,
+                        help='load definitions inline instead of in a background thread')
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
+    args = parse_args()
+    LOADER = args.loader
+    BACKGROUND_FLUSH = not args.inline_flush
     sys.exit(vertica_db_filler())
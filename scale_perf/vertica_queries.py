@@ -1,74 +1,179 @@
-import sys
 import argparse
-from subprocess import Popen, PIPE
-from time import sleep
+import csv
+import datetime
+import decimal
+import json
+import os
+import sys
+import time
 
+import vertica_python
 
-def parse_args():
-    parser = argparse.ArgumentParser()
-    parser.add_argument("--vertica_password",
-                        help="Vertica password for disk.sh and alarm_transitions.sh", default='password',
-                        required=False)
-    return parser.parse_args()
+""" vertica_queries
+    Samples the Vertica resource tables at a fixed interval over one
+    persistent connection and writes them out as typed time series, so WOS/ROS
+    pressure and mergeout activity can be lined up with the ingest rate of a
+    load test. Every row gets the sample time as epoch seconds and as UTC ISO
+    8601, the same clock the other scale_perf tools report in.
+
+    --format jsonl writes one JSON object per row to --output, tagged with its
+    table. --format csv writes one <output>_<table>.csv per table, since the
+    tables do not share columns.
+"""
+
+CONN_INFO = {'host': '127.0.0.1',
+             'port': 5433,
+             'user': 'dbadmin',
+             'password': 'password',
+             'database': 'mon',
+             'read_timeout': 600,
+             'unicode_error': 'strict',
+             'ssl': False}
+
+SAMPLE_INTERVAL = 60
+OUTPUT_FORMATS = ['jsonl', 'csv']
+OUTPUT = './vertica_resources'
+# seconds to wait before reconnecting after a failed sample
+RECONNECT_DELAY = 5
+
+QUERIES = [('resource_usage',
+            "SELECT node_name, request_queue_depth, active_thread_count, open_file_handle_count, "
+            "wos_used_bytes, ros_used_bytes, resource_request_reject_count, "
+            "resource_request_timeout_count, disk_space_request_reject_count, "
+            "failed_volume_reject_count FROM resource_usage"),
+           ('projection_storage',
+            "SELECT node_name, projection_name, projection_schema, wos_used_bytes, ros_used_bytes, "
+            "ros_count FROM projection_storage"),
+           ('tuple_mover_operations',
+            "SELECT operation_start_timestamp, node_name, operation_name, table_schema, table_name, "
+            "projection_name, ros_count, total_ros_used_bytes FROM tuple_mover_operations "
+            "WHERE is_executing = true AND operation_name IN ('Moveout', 'Mergeout')"),
+           ('resource_rejections',
+            "SELECT node_name, pool_name, reason, resource_type, rejection_count, "
+            "first_rejected_timestamp, last_rejected_timestamp FROM resource_rejections")]
+# WANT TO ADD TO MONITORING LATER
+# disk_resource_rejections, io_usage, cpu_usage, network_usage, resource_queues
+
+
+def typed_value(value):
+    """Column value as a JSON/CSV friendly type, numbers stay numbers."""
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    return value
+
+
+class JsonLinesWriter(object):
+    def __init__(self, output):
+        self.file = open(output if output.endswith('.jsonl') else output + '.jsonl', 'a')
 
+    def write(self, table, sample_time, columns, rows):
+        for row in rows:
+            record = {'time': sample_time, 'timestamp': iso_time(sample_time), 'table': table}
+            record.update(zip(columns, [typed_value(value) for value in row]))
+            self.file.write(json.dumps(record) + '\n')
+        self.file.flush()
 
-def split_result(results):
-    result_dict = []
-    results = results.split("\n")
-    column_names = results.pop(0).split(",")
-    for result in results:
-        result_dict.append(zip(column_names, result.split(",")))
-    return result_dict
+    def close(self):
+        self.file.close()
 
 
-def run_query(vertica_base_query, vertica_query):
-    vertica_base_query.append(vertica_query)
-    query = Popen(vertica_base_query, stdout=PIPE, stderr=PIPE)
-    result, error_output = query.communicate()
-    print vertica_query
-    return result
+class CsvWriter(object):
+    def __init__(self, output):
+        self.output = output
+        self.files = {}
+
+    def write(self, table, sample_time, columns, rows):
+        if table not in self.files:
+            path = '{0}_{1}.csv'.format(self.output, table)
+            new_file = not os.path.exists(path)
+            f = open(path, 'ab')
+            writer = csv.writer(f)
+            if new_file:
+                writer.writerow(['time', 'timestamp'] + columns)
+            self.files[table] = (f, writer)
+        f, writer = self.files[table]
+        for row in rows:
+            writer.writerow([sample_time, iso_time(sample_time)] + [typed_value(value) for value in row])
+        f.flush()
+
+    def close(self):
+        for f, writer in self.files.values():
+            f.close()
+
+
+def iso_time(sample_time):
+    return datetime.datetime.utcfromtimestamp(sample_time).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def sample(cursor, writer):
+    """Run every query once under a single sample time, returns the row count per table."""
+    sample_time = time.time()
+    counts = {}
+    for table, query in QUERIES:
+        cursor.execute(query)
+        rows = cursor.fetchall()
+        writer.write(table, sample_time, [column.name for column in cursor.description], rows)
+        counts[table] = len(rows)
+    return counts
+
+
+def monitor(conn_info, writer, interval=SAMPLE_INTERVAL, run_time=None):
+    connection = None
+    end_time = time.time() + run_time if run_time else None
+    next_sample = time.time()
+    while end_time is None or next_sample < end_time:
+        try:
+            if connection is None:
+                connection = vertica_python.connect(**conn_info)
+            counts = sample(connection.cursor(), writer)
+            print("{0} {1}".format(iso_time(time.time()),
+                                   ', '.join('{0}={1}'.format(table, counts[table])
+                                             for table, query in QUERIES)))
+        except Exception as e:
+            print("{0} sample failed: {1}".format(iso_time(time.time()), e))
+            if connection is not None:
+                try:
+                    connection.close()
+                except Exception:
+                    pass
+                connection = None
+            time.sleep(RECONNECT_DELAY)
+        # keep to the interval schedule however long the queries take
+        next_sample += interval
+        time.sleep(max(next_sample - time.time(), 0))
+    if connection is not None:
+        connection.close()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='sample Vertica resource tables into a time series')
+    parser.add_argument("--vertica_password",
+                        help="Vertica dbadmin password", default=CONN_INFO['password'],
+                        required=False)
+    parser.add_argument('--host', type=str, required=False, default=CONN_INFO['host'],
+                        help='Vertica host')
+    parser.add_argument('--interval', type=float, required=False, default=SAMPLE_INTERVAL,
+                        help='seconds between samples')
+    parser.add_argument('--run_time', type=float, required=False, default=None,
+                        help='seconds to sample for, forever by default')
+    parser.add_argument('--format', type=str, required=False, default='jsonl', choices=OUTPUT_FORMATS,
+                        help='one JSON-lines file, or one CSV file per table')
+    parser.add_argument('--output', type=str, required=False, default=OUTPUT,
+                        help='output path prefix, .jsonl or _<table>.csv is appended')
+    return parser.parse_args()
 
 
 def main():
     args = parse_args()
-    # USE THIS QUERY IF PARSING RESULTS RETURNS THEM AS CSV
-    # vertica_base_query =["/opt/vertica/bin/vsql", "-U", "dbadmin", "-w",  args.vertica_password, "-A", "-F", ",", "-c"]
-    vertica_base_query = ["/opt/vertica/bin/vsql", "-U", "dbadmin", "-w", args.vertica_password, "-c"]
-    while True:
-        print run_query(list(vertica_base_query), "SELECT node_name, projection_name, projection_schema, "
-                                                  "wos_used_bytes, ros_used_bytes, ros_count FROM "
-                                                  "projection_storage")
-        print run_query(list(vertica_base_query), "SELECT * from resource_rejections")
-        print run_query(list(vertica_base_query), "SELECT node_name, request_queue_depth, "
-                                                  "active_thread_count, open_file_handle_count, "
-                                                  "wos_used_bytes, ros_used_bytes, "
-                                                  "resource_request_reject_count, "
-                                                  "resource_request_timeout_count, "
-                                                  "disk_space_request_reject_count, "
-                                                  "failed_volume_reject_count FROM resource_usage")
-        # WANT TO ADD TO MONITORING LATER
-        # print run_query(list(vertica_base_query), "SELECT * FROM disk_resource_rejections;")
-        # print run_query(list(vertica_base_query), "SELECT * FROM io_usage;")
-        # print run_query(list(vertica_base_query), "SELECT * FROM cpu_usage;")
-        # print run_query(list(vertica_base_query), "SELECT * FROM network_usage;")
-
-        # print run_query(list(vertica_base_query), "SELECT event_timestamp, node_name, request_id, transaction_id, "
-        #                                           "statement_id, error_level, message, detail, hint from error_messages "
-        #                                           "WHERE error_level in ('ERROR', 'WARNING', 'FATAL', 'PANIC')"
-        #                                           "ORDER BY error_level")
-
-        print run_query(list(vertica_base_query), "SELECT * FROM resource_queues;")
-
-        print run_query(list(vertica_base_query), "SELECT operation_start_timestamp, node_name, operation_name, "
-                                                  "table_schema, table_name, projection_name, ros_count, "
-                                                  "total_ros_used_bytes FROM tuple_mover_operations "
-                                                  "WHERE is_executing = true AND operation_name = 'Moveout';")
-
-        print run_query(list(vertica_base_query), "SELECT operation_start_timestamp, node_name, operation_name, "
-                                                  "table_schema, table_name, projection_name, ros_count, "
-                                                  "total_ros_used_bytes FROM tuple_mover_operations "
-                                                  "WHERE is_executing = true AND operation_name = 'Mergeout';")
-        sleep(60)
+    conn_info = dict(CONN_INFO, host=args.host, password=args.vertica_password)
+    writer = JsonLinesWriter(args.output) if args.format == 'jsonl' else CsvWriter(args.output)
+    try:
+        monitor(conn_info, writer, args.interval, args.run_time)
+    finally:
+        writer.close()
 
 
 if __name__ == "__main__":
@@ -1,4 +1,6 @@
+import argparse
 import datetime
+import json
 import time
 import os
 import sys
@@ -6,6 +8,10 @@ import sys
 from monascaclient import client
 from monascaclient import ksclient
 
+# shared query benchmark engine lives with the InfluxDB query tools
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'influxdb_perf'))
+import query_bench
+
 keystone = {
     'username': os.environ.get('OS_USERNAME', 'admin'),
     'password': os.environ.get('OS_PASSWORD', 'secretadmin'),
@@ -15,6 +21,21 @@ keystone = {
 
 monasca_url = "http://192.168.10.6:8070/v2.0"
 
+METRIC_NAME = 'vm.mem.free_perc'
+RESOURCE_ID = "12"
+MAX_DIMENSIONS = {'zone': 'nova',
+                  'service': 'compute',
+                  'cloud_name': 'test_cloud',
+                  'component': 'vm',
+                  'cluster': 'test_cluster'}
+
+# trailing windows of the range sweep, the filler spreads its data up to 45 days back
+RANGE_WINDOWS = [('5m', datetime.timedelta(minutes=5)),
+                 ('1h', datetime.timedelta(hours=1)),
+                 ('1d', datetime.timedelta(days=1)),
+                 ('7d', datetime.timedelta(days=7)),
+                 ('45d', datetime.timedelta(days=45))]
+
 
 def get_token(keystone):
     try:
@@ -77,172 +98,240 @@ def print_results(results):
         print("Total time: {}s".format(results['end_time'] - results['start_time']))
 
 
-def run_queries():
-    args = {}
-    metric_list(args)
+def get_queries():
+    """Named query catalogue, mirrors influxdb_perf/influx_query_test.py.
 
-    metric_name = 'vm.mem.free_perc'
-    resource_id = "12"
+    Each entry is (name, (monasca client metrics call, args)).
+    """
+    metric_name = METRIC_NAME
+    resource_id = RESOURCE_ID
     device = "sda"
+    time_stamp = datetime.datetime.utcnow() - datetime.timedelta(minutes=300)
+    max_dimensions = MAX_DIMENSIONS
+
+    return [
+        ("No filters query",
+         ('list', {})),
+        ("Metric-list | Name only",
+         ('list', {'name': metric_name})),
+        ("Metric-list | Name and start time",
+         ('list', {'name': metric_name,
+                   'start_time': time_stamp.isoformat()})),
+        ("Metric-list | Name and max dimensions (single result)",
+         ('list', {'name': metric_name,
+                   "dimensions": {
+                       "hostname": "test_vm_host_" + resource_id,
+                       "zone": "nova",
+                       "service": "compute",
+                       "cloud_name": "test_cloud",
+                       "resource_id": resource_id,
+                       "component": "vm",
+                       "cluster": "test_cluster"
+                   }})),
+        ("Metric-list | Name and max dimensions (max results)",
+         ('list', {'name': metric_name,
+                   'dimensions': max_dimensions})),
+        ("Metric-list | Dimensions only, resource_id (single vm results)",
+         ('list', {'dimensions': {
+             "resource_id": resource_id
+         }})),
+        ("Metric-list | Dimensions only, resource_id and device (single device result)",
+         ('list', {'dimensions': {
+             "resource_id": resource_id,
+             "device": device
+         }})),
+        ("Metric-list | Dimensions only, device (multiple devices over multiple vms result)",
+         ('list', {'dimensions': {
+             "device": device
+         }})),
+        ("Measurement-list | Name only merged (non-vm metric)",
+         ('list_measurements', {'name': 'cpu.idle_perc',
+                                'start_time': '2016-01-01T00:00:00.000Z',
+                                'merge_metrics': 'true'})),
+        ("Measurement-list | Name only grouped (non-vm metric)",
+         ('list_measurements', {'name': 'cpu.idle_perc',
+                                'start_time': '2016-01-01T00:00:00.000Z',
+                                'group_by': '*'})),
+        ("Measurement-list | Name only merged (vm metric)",
+         ('list_measurements', {'name': 'vm.mem.free_perc',
+                                'start_time': '2016-01-01T00:00:00.000Z',
+                                'merge_metrics': 'true'})),
+        ("Measurement-list | Name only grouped (vm metric)",
+         ('list_measurements', {'name': 'vm.mem.free_perc',
+                                'start_time': '2016-01-01T00:00:00.000Z',
+                                'group_by': '*'})),
+        ("Measurement-list | Name and resource_id (single result)",
+         ('list_measurements', {'name': 'vm.mem.free_perc',
+                                'dimensions': {
+                                    'resource_id': resource_id
+                                },
+                                'start_time': '2016-01-01T00:00:00.000Z',
+                                'merge_metrics': 'true'})),
+        ("Measurement-list | Name and max dimensions query (max results)",
+         ('list_measurements', {'name': metric_name,
+                                'dimensions': max_dimensions,
+                                'start_time': '2016-01-01T00:00:00.000Z',
+                                'merge_metrics': 'true'})),
+        ("Metric-statistics | name only merged (non-vm metric)",
+         ('list_statistics', {'name': 'cpu.idle_perc',
+                              'statistics': 'max',
+                              'start_time': '2016-01-01T00:00:00.000Z',
+                              'merge_metrics': 'true'})),
+        ("Metric-statistics | name only merged (vm metric)",
+         ('list_statistics', {'name': 'vm.mem.free_perc',
+                              'statistics': 'max',
+                              'start_time': '2016-01-01T00:00:00.000Z',
+                              'merge_metrics': 'true'})),
+        ("Metric-statistics | name and resource_id (single result)",
+         ('list_statistics', {'name': 'vm.mem.free_perc',
+                              'dimensions': {
+                                  'resource_id': resource_id
+                              },
+                              'statistics': 'max',
+                              'start_time': '2016-01-01T00:00:00.000Z',
+                              'merge_metrics': 'true'})),
+        ("Metric-statistics | name and max dimensions query (max results)",
+         ('list_statistics', {'name': metric_name,
+                              'dimensions': max_dimensions,
+                              'statistics': 'max',
+                              'start_time': '2016-01-01T00:00:00.000Z',
+                              'merge_metrics': 'true'})),
+    ]
+
+
+def get_range_queries(windows=RANGE_WINDOWS):
+    """Measurement and statistics shapes, with and without dimension filters, over each trailing window.
+
+    Names are '<shape> | last <window>', so print_range_report can line the windows up.
+    """
+    shapes = [("Measurement-list | Name only merged",
+               ('list_measurements', {'name': METRIC_NAME,
+                                      'merge_metrics': 'true'})),
+              ("Measurement-list | Name and resource_id",
+               ('list_measurements', {'name': METRIC_NAME,
+                                      'dimensions': {'resource_id': RESOURCE_ID},
+                                      'merge_metrics': 'true'})),
+              ("Measurement-list | Name and max dimensions",
+               ('list_measurements', {'name': METRIC_NAME,
+                                      'dimensions': MAX_DIMENSIONS,
+                                      'merge_metrics': 'true'})),
+              ("Metric-statistics | name only merged",
+               ('list_statistics', {'name': METRIC_NAME,
+                                    'statistics': 'max',
+                                    'merge_metrics': 'true'})),
+              ("Metric-statistics | name and max dimensions",
+               ('list_statistics', {'name': METRIC_NAME,
+                                    'dimensions': MAX_DIMENSIONS,
+                                    'statistics': 'max',
+                                    'merge_metrics': 'true'}))]
+    now = datetime.datetime.utcnow()
+    queries = []
+    for shape, (call, args) in shapes:
+        for window, delta in windows:
+            window_args = dict(args, start_time=(now - delta).strftime('%Y-%m-%dT%H:%M:%S.000Z'))
+            queries.append(("{0} | last {1}".format(shape, window), (call, window_args)))
+    return queries
+
+
+def print_range_report(results, windows=RANGE_WINDOWS):
+    """Warm median of each shape per window, and how much slower the widest window is than the narrowest."""
+    by_name = dict((r['name'], r) for r in results)
+    shapes = []
+    for r in results:
+        shape = r['name'].rsplit(' | last ', 1)[0]
+        if shape not in shapes:
+            shapes.append(shape)
+
+    print("\n{:<50}| {} | {:>8}".format("SHAPE (warm median sec)",
+                                        " | ".join("{:>9}".format(window) for window, _ in windows),
+                                        "{0}/{1}".format(windows[-1][0], windows[0][0])))
+    print("-" * (64 + 12 * len(windows)))
+    for shape in shapes:
+        medians = []
+        for window, _ in windows:
+            r = by_name.get("{0} | last {1}".format(shape, window))
+            medians.append(r['warm']['median'] if r and r['warm']['count'] else None)
+        growth = medians[-1] / medians[0] if medians[0] and medians[-1] is not None else None
+        print("{:<50}| {} | {:>8}".format(
+            shape[:50], " | ".join("{:>9.4f}".format(m) if m is not None else "{:>9}".format('FAILED')
+                                   for m in medians),
+            "{:.1f}x".format(growth) if growth is not None else 'n/a'))
+
+
+QUERY_FUNCTIONS = {'list': metric_list,
+                   'list_measurements': measurement_list,
+                   'list_statistics': statistics_list}
+
+
+def count_rows(data):
+    rows = 0
+    for element in data:
+        rows += len(element.get('measurements', element.get('statistics', [None])))
+    return rows
+
+
+def get_bench_runner():
+    """Runner for query_bench that authenticates once and times only the API call."""
+    mon_client = get_monasca_client(get_token(keystone))
+
+    def runner(query):
+        call, args = query
+        start_time = time.time()
+        results = getattr(mon_client.metrics, call)(**args)
+        elapsed = time.time() - start_time
+        if not isinstance(results, list):
+            raise Exception("Query failed: {}".format(results))
+        return elapsed, len(json.dumps(results)), count_rows(results)
+
+    return runner
 
-    print("No filters query")
-    args = {}
-    results = metric_list(args)
-    print_results(results)
 
-    print("\nMetric-list | Name only ")
-    args = {'name': metric_name}
-    results = metric_list(args)
-    print_results(results)
+def run_queries():
+    args = {}
+    metric_list(args)
 
-    time_stamp = datetime.datetime.utcnow() - datetime.timedelta(minutes=300)
-    print("\nMetric-list | Name and start time")
-    args = {'name': metric_name,
-            'start_time': time_stamp.isoformat()}
-    results = metric_list(args)
-    print_results(results)
-
-    print("\nMetric-list | Name and max dimensions (single result)")
-    args = {'name': metric_name,
-            "dimensions": {
-                "hostname": "test_vm_host_" + resource_id,
-                "zone": "nova",
-                "service": "compute",
-                "cloud_name": "test_cloud",
-                "resource_id": resource_id,
-                "component": "vm",
-                "cluster": "test_cluster"
-            }}
-    results = metric_list(args)
-    print_results(results)
-
-    print("\nMetric-list | Name and max dimensions (max results)")
-    args = {'name': metric_name,
-            'dimensions': {
-                'zone': 'nova',
-                'service': 'compute',
-                'cloud_name': 'test_cloud',
-                'component': 'vm',
-                'cluster': 'test_cluster'
-            }}
-    results = metric_list(args)
-    print_results(results)
-
-    print("\nMetric-list | Dimensions only, resource_id (single vm results)")
-    args = {'dimensions': {
-        "resource_id": resource_id
-    }}
-    results = metric_list(args)
-    print_results(results)
-
-    print("\nMetric-list | Dimensions only, resource_id and device (single device result)")
-    args = {'dimensions': {
-        "resource_id": resource_id,
-        "device": device
-    }}
-    results = metric_list(args)
-    print_results(results)
-
-    print("\nMetric-list | Dimensions only, device (multiple devices over multiple vms result)")
-    args = {'dimensions': {
-        "device": device
-    }}
-    results = metric_list(args)
-    print_results(results)
-
-    print("\nMeasurement-list | Name only merged (non-vm metric)")
-    args = {'name': 'cpu.idle_perc',
-            'start_time': '2016-01-01T00:00:00.000Z',
-            'merge_metrics': 'true'}
-    results = measurement_list(args)
-    print_results(results)
-
-    print("\nMeasurement-list | Name only grouped (non-vm metric)")
-    args = {'name': 'cpu.idle_perc',
-            'start_time': '2016-01-01T00:00:00.000Z',
-            'group_by': '*'}
-    results = measurement_list(args)
-    print_results(results)
-
-    print("\nMeasurement-list | Name only merged (vm metric)")
-    args = {'name': 'vm.mem.free_perc',
-            'start_time': '2016-01-01T00:00:00.000Z',
-            'merge_metrics': 'true'}
-    results = measurement_list(args)
-    print_results(results)
-
-    print("\nMeasurement-list | Name only grouped (vm metric)")
-    args = {'name': 'vm.mem.free_perc',
-            'start_time': '2016-01-01T00:00:00.000Z',
-            'group_by': '*'}
-    results = measurement_list(args)
-    print_results(results)
-
-    print("\nMeasurement-list | Name and resource_id (single result)")
-    args = {'name': 'vm.mem.free_perc',
-            'dimensions': {
-                'resource_id': resource_id
-            },
-            'start_time': '2016-01-01T00:00:00.000Z',
-            'merge_metrics': 'true'}
-    results = measurement_list(args)
-    print_results(results)
-
-    print("\nMeasurement-list | Name and max dimensions query (max results)")
-    args = {'name': metric_name,
-            'dimensions': {
-                'zone': 'nova',
-                'service': 'compute',
-                'cloud_name': 'test_cloud',
-                'component': 'vm',
-                'cluster': 'test_cluster'
-            },
-            'start_time': '2016-01-01T00:00:00.000Z',
-            'merge_metrics': 'true'}
-    results = measurement_list(args)
-    print_results(results)
-
-    print("\nMetric-statistics | name only merged (non-vm metric)")
-    args = {'name': 'cpu.idle_perc',
-            'statistics': 'max',
-            'start_time': '2016-01-01T00:00:00.000Z',
-            'merge_metrics': 'true'}
-    results = statistics_list(args)
-    print_results(results)
-
-    print("\nMetric-statistics | name only merged (vm metric)")
-    args = {'name': 'vm.mem.free_perc',
-            'statistics': 'max',
-            'start_time': '2016-01-01T00:00:00.000Z',
-            'merge_metrics': 'true'}
-    results = statistics_list(args)
-    print_results(results)
-
-    print("\nMetric-statistics | name and resource_id (single result)")
-    args = {'name': 'vm.mem.free_perc',
-            'dimensions': {
-                'resource_id': resource_id
-            },
-            'statistics': 'max',
-            'start_time': '2016-01-01T00:00:00.000Z',
-            'merge_metrics': 'true'}
-    results = statistics_list(args)
-    print_results(results)
-
-    print("\nMetric-statistics | name and max dimensions query (max results)")
-    args = {'name': metric_name,
-            'dimensions': {
-                'zone': 'nova',
-                'service': 'compute',
-                'cloud_name': 'test_cloud',
-                'component': 'vm',
-                'cluster': 'test_cluster'
-            },
-            'statistics': 'max',
-            'start_time': '2016-01-01T00:00:00.000Z',
-            'merge_metrics': 'true'}
-    results = statistics_list(args)
-    print_results(results)
+    for name, (call, args) in get_queries():
+        print("\n{}".format(name))
+        results = QUERY_FUNCTIONS[call](args)
+        print_results(results)
+
+
+def run_benchmark(iterations, warmup, baseline):
+    results = query_bench.run_catalogue(get_queries(), get_bench_runner(), warmup, iterations)
+    query_bench.finish(results, baseline, {'tool': 'vertica_scale_queries',
+                                           'monasca_url': monasca_url})
+
+
+def run_range_sweep(iterations, warmup, baseline):
+    results = query_bench.run_catalogue(get_range_queries(), get_bench_runner(), warmup, iterations)
+    query_bench.finish(results, baseline, {'tool': 'vertica_scale_queries_range',
+                                           'monasca_url': monasca_url})
+    print_range_report(results)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='time the Monasca metric, measurement and statistics queries')
+    parser.add_argument('--iterations', type=int, required=False, default=0,
+                        help='timed iterations per query, 0 runs each query once')
+    parser.add_argument('--warmup', type=int, required=False,
+                        default=query_bench.WARMUP_ITERATIONS,
+                        help='untimed iterations after the cold run')
+    parser.add_argument('--baseline', type=str, required=False, default=None,
+                        help='json baseline to compare against and then replace')
+    parser.add_argument('--range_sweep', action='store_true', required=False,
+                        help='time the measurement shapes over trailing windows from 5m to 45d '
+                             'instead of the fixed catalogue')
+    parser.add_argument('--monasca_url', type=str, required=False, default=monasca_url,
+                        help='Monasca api url, point it at query_cache_proxy to measure caching')
+    return parser.parse_args()
 
 if __name__ == "__main__":
+    args = parse_args()
+    monasca_url = args.monasca_url
+    if args.range_sweep:
+        sys.exit(run_range_sweep(args.iterations or query_bench.TIMED_ITERATIONS, args.warmup,
+                                 args.baseline))
+    if args.iterations:
+        sys.exit(run_benchmark(args.iterations, args.warmup, args.baseline))
     sys.exit(run_queries())